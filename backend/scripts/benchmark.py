@@ -0,0 +1,293 @@
+import argparse
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from command_set import compile_commands
+from feedback_decoder import FeedbackDecoder
+from serial_feedback import feedback_timeout
+from simulators import start_simulator
+from tester_logging import LOG_MODES
+from tester_registry import DEFAULT_COMMANDS, TESTER_CLASSES, load_tester_class, normalize_commands
+
+BENCH_TESTERS = ('qtap', 'qba', 'qswipe')
+
+
+def peak_rss_kb():
+    import resource  # POSIX only
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss  # macOS reports bytes
+
+
+def command_set(hardware_type, size):
+    # Repeat the type's default commands until the set has `size` entries
+    return list(itertools.islice(itertools.cycle(DEFAULT_COMMANDS[hardware_type]), size))
+
+
+def run_case(case, port, results):
+    # Runs in a fresh spawned process so CPU time and peak RSS belong to this case only
+    os.chdir(case['workdir'])
+    sys.stdout = open(os.devnull, 'w')  # Keep tester console output out of the results
+
+    tester_class = load_tester_class(case['tester'])
+    tester = tester_class(port, 115200, case['cycles'], normalize_commands(command_set(case['tester'], case['commands'])),
+                          case['delay'], f"bench_{case['tester']}", 'benchmark', log_mode=case['log_mode'])
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    tester.run()
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    count = tester.count
+    latencies = [h.summary() for h in tester.latency.histograms.values()]
+    results.put({
+        'logging_us_per_command': tester.log_handler.summary(count)['cost_us_per_command'],
+        'commands_completed': count,
+        'errors': tester.error,
+        'timeouts': tester.timeout,
+        'wall_sec': wall,
+        'cpu_sec': cpu,
+        'p50_latency_ms': max((s['p50'] for s in latencies), default=0.0),
+        'peak_rss_kb': peak_rss_kb()
+    })
+
+
+def benchmark_case(case, latency):
+    simulator = start_simulator(case['tester'], latency=latency, seed=1)
+    try:
+        ctx = multiprocessing.get_context('spawn')
+        results = ctx.Queue()
+        process = ctx.Process(target=run_case, args=(case, simulator.path, results))
+        process.start()
+        result = results.get()
+        process.join()
+        device_latency = simulator.device.latency.mean()
+    finally:
+        simulator.stop()
+
+    count = result['commands_completed']
+    wall_per_command = result['wall_sec'] / count if count else 0.0
+    # Every successful command is followed by COMMAND_DELAY, whatever is left over
+    # beyond delay and device latency is time spent in the tester itself
+    overhead = wall_per_command - case['delay'] - device_latency
+    return {
+        **{k: v for k, v in case.items() if k != 'workdir'},
+        **result,
+        'commands_per_sec': round(count / result['wall_sec'], 3) if result['wall_sec'] else 0.0,
+        'cpu_ms_per_command': round(result['cpu_sec'] * 1000 / count, 4) if count else 0.0,
+        'device_latency_ms': round(device_latency * 1000, 3),
+        'overhead_ms_per_command': round(overhead * 1000, 4),
+        'wall_sec': round(result['wall_sec'], 4),
+        'cpu_sec': round(result['cpu_sec'], 4)
+    }
+
+
+class NullSerial:
+    # Swallows writes so the microbenchmark times only the tester's own send path
+    def write(self, data):
+        return len(data)
+
+
+def send_path_microbenchmark(iterations):
+    # Per-command cost of the send path with str commands (encode and format on every
+    # send, as the testers used to) versus compiled commands. Logging goes to a
+    # NullHandler so record creation is counted but disk and console are not; with
+    # INFO disabled only the f-strings and encoding are left in the str version.
+    logger = logging.getLogger('benchmark_send_path')
+    logger.handlers = [logging.NullHandler()]
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    conn = NullSerial()
+    commands = normalize_commands(DEFAULT_COMMANDS['qtap'])
+    timeouts = {}
+    compiled = compile_commands(SimpleNamespace(FEEDBACK_TIMEOUTS=timeouts), commands)
+
+    def legacy():
+        for i, command in enumerate(commands):
+            logger.info(f"Sending command: {command}")
+            conn.write(command.encode())
+            feedback_timeout(command, timeouts)
+            logger.info(f"Command {i+1}/{len(commands)} succeeded with valid feedback.")
+
+    def precompiled():
+        for command in compiled:
+            logger.info(command.send_label)
+            conn.write(command.payload)
+            command.feedback_timeout
+            logger.info(command.success_label)
+
+    results = {}
+    for level_name, level in (('info', logging.INFO), ('quiet', logging.WARNING)):
+        logger.setLevel(level)
+        for name, send_all in (('str', legacy), ('compiled', precompiled)):
+            send_all()  # Warm up
+            start = time.perf_counter_ns()
+            for _ in range(iterations):
+                send_all()
+            results[f'{level_name}_{name}'] = round((time.perf_counter_ns() - start) / (iterations * len(commands)), 1)
+    return results
+
+
+def legacy_decode(fb):
+    # The try/except chain and comparisons qtap_test ran on each reply before feedback_decoder
+    if not fb:
+        return 'timeout', None, "Received empty feedback or timeout."
+    try:
+        feedback_value = int(fb.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        try:
+            feedback_value = int.from_bytes(fb, "little")
+        except (ValueError, TypeError):
+            feedback_value = None
+    if feedback_value == 0:
+        return 'success', feedback_value, "Success: Received valid success code (0)."
+    elif feedback_value == 13:
+        return 'timeout', feedback_value, "Timeout occurred."
+    return 'error', feedback_value, f"Error occurred. Feedback value: {feedback_value}"
+
+
+def synthetic_corpus(size, seed=1):
+    # Mostly success codes, with timeouts, other codes, blank and garbled replies mixed in
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        roll = rng.random()
+        if roll < 0.85:
+            corpus.append(rng.choice((b'0', b'48')))
+        elif roll < 0.90:
+            corpus.append(rng.choice((b'13', b'50')))
+        elif roll < 0.94:
+            corpus.append(b'')
+        elif roll < 0.97:
+            corpus.append(str(rng.randrange(100)).encode())
+        else:
+            corpus.append(bytes(rng.randrange(256) for _ in range(rng.randrange(1, 6))))
+    return corpus
+
+
+def decoder_microbenchmark(size, corpus_path=None):
+    # ns per reply for each tester's decoder over a reply corpus: a captured one
+    # (one raw reply per line) or a synthetic mix
+    if corpus_path:
+        with open(corpus_path, 'rb') as f:
+            corpus = [line.strip() for line in f.read().split(b'\n')]
+    else:
+        corpus = synthetic_corpus(size)
+
+    def time_per_reply(decode):
+        best = None
+        for _ in range(3):  # Best of three, the first pass also fills the decoder cache
+            start = time.perf_counter_ns()
+            for fb in corpus:
+                decode(fb)
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return round(best / len(corpus), 1)
+
+    results = {'replies': len(corpus), 'distinct': len(set(corpus)), 'legacy': time_per_reply(legacy_decode)}
+    for hardware_type, (module_name, _) in TESTER_CLASSES.items():
+        decoder = FeedbackDecoder(importlib.import_module(module_name).FEEDBACK_TABLE)
+        results[hardware_type] = time_per_reply(decoder.decode)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def case_key(result):
+    return (result['tester'], result['cycles'], result['delay'], result['commands'], result.get('log_mode', 'sync'))
+
+
+def print_table(results, baseline=None):
+    baseline = {case_key(r): r for r in (baseline or [])}
+    header = f"{'tester':<8}{'log':>6}{'cycles':>8}{'delay':>8}{'cmds':>6}{'cmd/s':>11}{'cpu ms/cmd':>12}{'overhead ms':>13}{'log us/cmd':>12}{'rss MB':>9}"
+    if baseline:
+        header += f"{'vs base':>9}"
+    print(header)
+    for r in results:
+        line = (f"{r['tester']:<8}{r['log_mode']:>6}{r['cycles']:>8}{r['delay']:>8}{r['commands']:>6}{r['commands_per_sec']:>11.1f}"
+                f"{r['cpu_ms_per_command']:>12.3f}{r['overhead_ms_per_command']:>13.3f}{r['logging_us_per_command']:>12.1f}{r['peak_rss_kb'] / 1024:>9.1f}")
+        base = baseline.get(case_key(r))
+        if base and base['commands_per_sec']:
+            line += f"{r['commands_per_sec'] / base['commands_per_sec']:>8.2f}x"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the tester scripts against simulated devices')
+    parser.add_argument('--testers', type=str, nargs='+', default=list(BENCH_TESTERS), choices=sorted(DEFAULT_COMMANDS),
+                        help='Hardware types to benchmark')
+    parser.add_argument('--cycles', type=int, nargs='+', default=[20, 100], help='Cycle counts')
+    parser.add_argument('--delays', type=float, nargs='+', default=[0.0, 0.005], help='Command delays in seconds')
+    parser.add_argument('--command-counts', type=int, nargs='+', default=[2, 8], help='Command set sizes')
+    parser.add_argument('--log-modes', type=str, nargs='+', default=['sync'], choices=LOG_MODES, help='Tester log modes')
+    parser.add_argument('--latency', type=str, default='fixed:2ms', help='Simulated device latency (see simulators)')
+    parser.add_argument('--output', type=str, default=None, help='Write JSON results to this file')
+    parser.add_argument('--send-path', type=int, default=None, metavar='ITERATIONS',
+                        help='Only run the send path microbenchmark for this many command-set iterations')
+    parser.add_argument('--decoder', type=int, default=None, metavar='REPLIES',
+                        help='Only run the feedback decoder benchmark on a synthetic corpus of this many replies')
+    parser.add_argument('--corpus', type=str, default=None, help='Captured replies for --decoder, one per line')
+    parser.add_argument('--compare', type=str, default=None, help='Earlier JSON results to compare commands/sec against')
+
+    args = parser.parse_args()
+
+    if args.send_path:
+        micro = send_path_microbenchmark(args.send_path)
+        for level_name in ('info', 'quiet'):
+            before, after = micro[f'{level_name}_str'], micro[f'{level_name}_compiled']
+            print(f"Send path ({level_name} logging), ns per command: str {before}, compiled {after} "
+                  f"({before - after:.1f} ns saved)")
+        sys.exit(0)
+
+    if args.decoder or args.corpus:
+        micro = decoder_microbenchmark(args.decoder or 0, args.corpus)
+        print(f"Feedback decoding over {micro.pop('replies')} replies ({micro.pop('distinct')} distinct), ns per reply:")
+        for name, ns in micro.items():
+            print(f"  {name:<8}{ns:>10}")
+        sys.exit(0)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for tester, log_mode, cycles, delay, commands in itertools.product(args.testers, args.log_modes, args.cycles,
+                                                                           args.delays, args.command_counts):
+            case = {'tester': tester, 'log_mode': log_mode, 'cycles': cycles, 'delay': delay, 'commands': commands,
+                    'workdir': workdir}
+            results.append(benchmark_case(case, args.latency))
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency': args.latency,
+        'results': results
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
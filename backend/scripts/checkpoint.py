@@ -0,0 +1,149 @@
+import json
+import os
+import time
+
+from early_stop import early_stop_decided
+from latency_histogram import LatencyStats
+from tester_clock import SYSTEM_CLOCK
+
+CHECKPOINT_DIR = os.path.join('logs', 'checkpoints')  # Not under a date, a soak can span several days
+CHECKPOINT_INTERVAL = 0.0  # Seconds between checkpoints, off unless asked for (server.js does for long runs)
+CHECKPOINT_VERSION = 1
+
+# Tester attributes carried over to a resumed run, besides the latency histograms
+COUNTERS = ('count', 'error', 'timeout', 'latency_saved')
+
+
+def checkpoint_path(tester):
+    return os.path.join(CHECKPOINT_DIR, f'{tester.PROJECT_NAME}_{tester.INSTANCE_ID}.json')
+
+
+def write_atomic(path, data):
+    # Write to a temporary file, fsync it and rename it over the old checkpoint, so
+    # a crash or power cut at any point leaves either the old or the new one whole
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, separators=(',', ':'))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    if hasattr(os, 'O_DIRECTORY'):
+        # Make the rename itself durable (POSIX only)
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class Checkpointer:
+    # Snapshots a tester at cycle boundaries: the next cycle to run, its counters
+    # and latency histograms. Written at most every `interval` seconds and once
+    # more from cleanup(), always as of the last completed cycle.
+
+    def __init__(self, path, interval=CHECKPOINT_INTERVAL, clock=SYSTEM_CLOCK):
+        self.path = path
+        self.interval = interval
+        self.clock = clock  # The tester's, so a virtual run checkpoints every `interval` simulated seconds
+        self.boundary = None  # (next_cycle, counters) as of the last completed cycle
+        self.saved_cycle = None
+        self.writes = 0
+        self.write_ms = 0.0
+        self.last_write = self.clock.monotonic()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def cycle_completed(self, tester, next_cycle):
+        counters = {name: getattr(tester, name) for name in COUNTERS if hasattr(tester, name)}
+        pipeline = getattr(tester, 'pipeline', None)
+        if pipeline is not None:
+            # Pipelined runs report a cycle with later ones in flight; their commands
+            # run again on resume, so they must not be counted here yet
+            for name, value in pipeline.in_flight(counters).items():
+                counters[name] -= value
+        self.boundary = (next_cycle, counters)
+        if self.clock.monotonic() - self.last_write >= self.interval:
+            try:
+                self.save(tester)
+            except OSError as e:
+                self.last_write = self.clock.monotonic()  # Try again next interval
+                tester.logger.error(f"Failed to write checkpoint {self.path}: {e}")
+
+    def save(self, tester):
+        if self.boundary is None or self.boundary[0] == self.saved_cycle:
+            return
+        next_cycle, counters = self.boundary
+        start = self.clock.perf_counter()
+        write_atomic(self.path, {
+            'version': CHECKPOINT_VERSION,
+            'instance_id': tester.INSTANCE_ID,
+            'project_name': tester.PROJECT_NAME,
+            'commands': [command.strip() for command in tester.COMMANDS],
+            'num_cycles': tester.NUM_CYCLES,
+            'next_cycle': next_cycle,
+            'finished': next_cycle >= tester.NUM_CYCLES or early_stop_decided(tester),
+            'saved_at': time.time(),
+            'counters': counters,
+            # Histograms are taken at save time, a partly run cycle (or the cycles in flight) adds a few samples
+            'latency': tester.latency.to_dict()
+        })
+        self.saved_cycle = next_cycle
+        self.writes += 1
+        self.write_ms = (self.clock.perf_counter() - start) * 1000
+        self.last_write = self.clock.monotonic()
+
+    def log_summary(self, logger):
+        if self.saved_cycle is not None:
+            logger.info(f"Checkpoint: cycle {self.saved_cycle} saved to {self.path} "
+                        f"({self.writes} writes, last took {self.write_ms:.1f} ms)")
+
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    if data.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}: {data.get('version')}")
+    return data
+
+
+def open_checkpointer(tester, interval, resume=False):
+    # Returns (checkpointer or None, first cycle to run). With resume the tester's
+    # counters and histograms are restored from the checkpoint it left last time.
+    path = checkpoint_path(tester)
+    start_cycle = 0
+    if resume:
+        try:
+            data = load_checkpoint(path)
+        except ValueError as e:
+            tester.logger.error(f"Failed to read checkpoint: {e}")
+            data = None
+        if data is None:
+            tester.logger.warning(f"No checkpoint at {path}, starting from cycle 1")
+        elif data['commands'] != [command.strip() for command in tester.COMMANDS]:
+            tester.logger.warning(f"Checkpoint {path} was written for other commands, starting from cycle 1")
+        elif data['finished']:
+            tester.logger.warning(f"Checkpoint {path} is from a finished run, starting from cycle 1")
+        else:
+            start_cycle = data['next_cycle']
+            for name, value in data['counters'].items():
+                setattr(tester, name, value)
+            tester.latency = LatencyStats.from_dict(data['latency'], tester.clock)
+            tester.logger.info(f"Resuming from checkpoint {path} at cycle {start_cycle + 1}/{tester.NUM_CYCLES} "
+                               f"({tester.count} commands, {tester.error} errors, {tester.timeout} timeouts so far)")
+    if interval <= 0:
+        return None, start_cycle
+    return Checkpointer(path, interval, tester.clock), start_cycle
+
+
+def close_checkpointer(tester):
+    checkpointer = tester.checkpointer
+    if checkpointer is None:
+        return
+    try:
+        checkpointer.save(tester)
+    except OSError as e:
+        tester.logger.error(f"Failed to write checkpoint {checkpointer.path}: {e}")
+        return
+    checkpointer.log_summary(tester.logger)
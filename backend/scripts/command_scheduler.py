@@ -0,0 +1,85 @@
+from latency_histogram import LatencyHistogram
+from tester_clock import SYSTEM_CLOCK
+
+# A send that starts more than this far past its deadline counts as an overrun
+# (the previous command's round trip or logging ate into this slot)
+OVERRUN_TOLERANCE = 0.002
+
+
+def target_rate(rate=None, cycles_per_hour=None, num_commands=1):
+    # Commands/sec from either form of the CLI option, None keeps the COMMAND_DELAY pacing
+    if rate and cycles_per_hour:
+        raise ValueError("Use either a command rate or cycles per hour, not both")
+    if cycles_per_hour:
+        return cycles_per_hour * max(1, num_commands) / 3600.0
+    return rate or None
+
+
+class DeadlineScheduler:
+    # Paces sends against absolute deadlines start + slot * period on the monotonic
+    # clock, so time spent waiting for replies and logging doesn't push the schedule
+    # back. Slot n is command n of the whole run (cycle * len(COMMANDS) + index), a
+    # cycle that stops early doesn't shift the cycles after it.
+
+    def __init__(self, rate, clock=SYSTEM_CLOCK):
+        if rate <= 0:
+            raise ValueError(f"Invalid command rate: {rate}")
+        self.RATE = rate
+        self.PERIOD = 1.0 / rate
+        self.clock = clock
+        self.start = None
+        self.jitter = LatencyHistogram()  # Send time minus deadline, in ns
+        self.overruns = 0
+        self.last_slot = None
+        self.last_lateness = 0.0
+
+    def deadline(self, slot):
+        if self.start is None:
+            # First command goes out immediately, also when a resumed run starts past slot 0
+            self.start = self.clock.monotonic() - slot * self.PERIOD
+        return self.start + slot * self.PERIOD
+
+    def delay(self, slot):
+        # Seconds to wait before `slot` is due, 0 when already late
+        return max(0.0, self.deadline(slot) - self.clock.monotonic())
+
+    def wait(self, slot):
+        remaining = self.delay(slot)
+        if remaining > 0:
+            self.clock.sleep(remaining)
+        self.mark(slot)
+
+    def mark(self, slot):
+        # Call right before the command for `slot` is written
+        lateness = self.clock.monotonic() - self.deadline(slot)
+        self.jitter.record(max(0.0, lateness) * 1e9)
+        if lateness > OVERRUN_TOLERANCE:
+            self.overruns += 1
+        self.last_slot = slot
+        self.last_lateness = lateness
+
+    def summary(self):
+        return {
+            'rate': round(self.RATE, 6),
+            'period_ms': round(self.PERIOD * 1000, 3),
+            'jitter_ms': self.jitter.summary(),
+            'overruns': self.overruns,
+            'drift_ms': round(self.last_lateness * 1000, 3)
+        }
+
+    def log_summary(self, logger):
+        s = self.summary()
+        j = s['jitter_ms']
+        logger.info(f"Schedule: {s['rate']} commands/sec, period {s['period_ms']} ms, {s['overruns']} overruns, "
+                    f"jitter (ms) p50={j['p50']} p99={j['p99']} max={j['max']}")
+
+
+def make_scheduler(rate, clock=SYSTEM_CLOCK):
+    return DeadlineScheduler(rate, clock) if rate else None
+
+
+def schedule_progress(tester):
+    scheduler = getattr(tester, 'scheduler', None)
+    if scheduler is None:
+        return {}
+    return {'schedule': scheduler.summary()}
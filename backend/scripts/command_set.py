@@ -0,0 +1,27 @@
+from collections import namedtuple
+
+from serial_feedback import tester_feedback_timeout
+
+# A command with everything the send path needs worked out up front: the bytes to
+# write, the latency key, its feedback timeout and the log lines, so sending it
+# does no encoding, parsing or string formatting.
+CompiledCommand = namedtuple('CompiledCommand', ['index', 'text', 'key', 'payload', 'feedback_timeout',
+                                                 'send_label', 'success_label', 'failure_label'])
+
+
+def compile_command(tester, index, count, text):
+    return CompiledCommand(
+        index=index,
+        text=text,
+        key=text.strip(),
+        payload=text.encode(),
+        feedback_timeout=tester_feedback_timeout(tester, text),
+        send_label=f"Sending command: {text}",
+        success_label=f"Command {index + 1}/{count} succeeded with valid feedback.",
+        failure_label=f"Command {index + 1}/{count} failed to receive valid feedback. Stopping command sequence for this cycle."
+    )
+
+
+def compile_commands(tester, commands):
+    # Call once the tester's feedback timeouts are set
+    return tuple(compile_command(tester, i, len(commands), text) for i, text in enumerate(commands))
@@ -0,0 +1,192 @@
+import json
+import os
+import signal
+import threading
+import time
+
+from tester_registry import normalize_commands
+
+CONTROL_OPS = ('pause', 'resume', 'stop', 'set')
+
+# Protocol: one request per line on the control fd (server.js passes the tester's
+# stdin as --control-fd 0), either JSON or just the op name from a terminal:
+#   {"op": "pause"}   {"op": "resume"}   {"op": "stop"}
+#   {"op": "set", "delay": 0.5, "commands": ["i:", "r:"]}
+# stop ends the run before the next command and still writes the summary. pause,
+# resume and set take effect at the next cycle boundary, so a cycle always runs
+# with one delay and one command set.
+
+
+class TesterControl:
+    # Requests from outside the run loop: the control fd reader, signal handlers
+    # and the tester daemon. The run loop only reads `pending` at each cycle
+    # boundary and calls at_cycle_boundary() when it's set.
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.paused = False
+        self.stop_requested = False
+        self.changes = {}
+        self.pending = False
+        self.pauses = 0
+        self.paused_time = 0.0
+        self.applied = 0
+        self.reader = None
+        self.signalled = []  # Requests from signal handlers, logged later from the run loop
+
+    def request(self, tester, message, from_signal=False):
+        # Raises ValueError for an unknown op or a bad set request
+        op = message.get('op')
+        if op not in CONTROL_OPS:
+            raise ValueError(f"Unknown control op: {op}")
+        changes = parse_changes(message) if op == 'set' else {}
+        if from_signal:
+            # Logging from a signal handler can re-enter a log write in progress
+            self.signalled.append(op)
+        else:
+            tester.logger.info(f"Control: {op} requested" + (f" {changes}" if changes else ""))
+        with self.condition:
+            if op == 'pause':
+                self.paused = True
+            elif op == 'resume':
+                self.paused = False
+            elif op == 'stop':
+                self.stop_requested = True
+                tester.is_running = False
+            else:
+                self.changes.update(changes)
+            self.pending = self.paused or self.stop_requested or bool(self.changes)
+            self.condition.notify_all()
+
+    def log_signalled(self, logger):
+        while self.signalled:
+            logger.info(f"Control: {self.signalled.pop(0)} requested by signal")
+
+    def at_cycle_boundary(self, tester, cycle):
+        # Applies queued changes and blocks while paused. Returns True when the
+        # delay or command set changed.
+        changed = False
+        paused_at = None
+        while True:
+            self.log_signalled(tester.logger)
+            with self.condition:
+                changes, self.changes = self.changes, {}
+                waiting = self.paused and not self.stop_requested
+                if not changes and waiting:
+                    if paused_at is None:
+                        paused_at = time.monotonic()
+                        self.pauses += 1
+                        tester.logger.info(f"Paused before cycle {cycle + 1}/{tester.NUM_CYCLES}")
+                    self.condition.wait()
+                    continue
+                self.pending = self.paused or self.stop_requested or bool(self.changes)
+            if changes:
+                apply_changes(tester, changes, cycle)
+                self.applied += 1
+                changed = True
+            if not waiting:
+                break
+
+        if paused_at is not None:
+            paused_for = time.monotonic() - paused_at
+            self.paused_time += paused_for
+            tester.logger.info(f"Resumed after {paused_for:.1f} s paused")
+            if getattr(tester, 'scheduler', None) is not None:
+                tester.scheduler.start = None  # Pick the schedule up from now rather than catching up
+        return changed
+
+    def start_reader(self, tester, fd):
+        self.reader = threading.Thread(target=self.read_requests, args=(tester, fd), name=f'{tester.INSTANCE_ID}-control',
+                                       daemon=True)
+        self.reader.start()
+
+    def read_requests(self, tester, fd):
+        try:
+            stream = os.fdopen(fd, 'r', closefd=False)
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self.request(tester, json.loads(line) if line.startswith('{') else {'op': line})
+                except ValueError as e:
+                    tester.logger.error(f"Invalid control request {line!r}: {e}")
+        except OSError as e:
+            tester.logger.error(f"Control channel closed: {e}")
+        # EOF (e.g. the server went away) leaves the run going as it is
+
+    def summary(self):
+        return {
+            'paused': self.paused,
+            'pauses': self.pauses,
+            'paused_sec': round(self.paused_time, 3),
+            'changes_applied': self.applied
+        }
+
+    def log_summary(self, logger):
+        self.log_signalled(logger)
+        if self.pauses or self.applied:
+            s = self.summary()
+            logger.info(f"Control: paused {s['pauses']} times for {s['paused_sec']} s, "
+                        f"{s['changes_applied']} live changes applied")
+
+
+def parse_changes(message):
+    changes = {}
+    if message.get('delay') is not None:
+        delay = float(message['delay'])
+        if delay < 0:
+            raise ValueError(f"Invalid delay: {delay}")
+        changes['delay'] = delay
+    if message.get('commands') is not None:
+        commands = message['commands']
+        if not isinstance(commands, list) or not commands or not all(isinstance(c, str) and c.strip() for c in commands):
+            raise ValueError("commands must be a non-empty list of strings")
+        changes['commands'] = normalize_commands(commands)
+    if not changes:
+        raise ValueError("set needs a delay or commands")
+    return changes
+
+
+def apply_changes(tester, changes, cycle):
+    if 'delay' in changes:
+        tester.COMMAND_DELAY = changes['delay']
+        tester.DELAY_LABEL = f"Waiting for {tester.COMMAND_DELAY} seconds before sending next command..."
+        tester.logger.info(f"Command delay set to {tester.COMMAND_DELAY} seconds from cycle {cycle + 1}")
+    if 'commands' in changes:
+        tester.COMMANDS = changes['commands']
+        tester.COMMAND_SET = tester.compile_command_set(tester.COMMANDS)
+        if getattr(tester, 'scheduler', None) is not None:
+            tester.scheduler.start = None  # Slots are numbered per command, restart the schedule from here
+        tester.logger.info(f"Command set changed to {[command.strip() for command in tester.COMMANDS]} "
+                           f"from cycle {cycle + 1}")
+
+
+def open_control(tester, control_fd=None):
+    control = TesterControl()
+    if control_fd is not None:
+        control.start_reader(tester, control_fd)
+    return control
+
+
+def install_signal_handlers(tester):
+    # From a script's __main__ only (signal handlers belong to the main thread).
+    # SIGTERM (what node's process.kill() sends) stops after the current command
+    # and still runs cleanup(); a second SIGTERM interrupts right away. On POSIX
+    # SIGUSR1 pauses and SIGUSR2 resumes at the next cycle boundary.
+    def on_term(signum, frame):
+        if tester.control.stop_requested:
+            raise KeyboardInterrupt
+        tester.control.request(tester, {'op': 'stop'}, from_signal=True)
+
+    signal.signal(signal.SIGTERM, on_term)
+    if hasattr(signal, 'SIGUSR1'):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: tester.control.request(tester, {'op': 'pause'}, True))
+        signal.signal(signal.SIGUSR2, lambda signum, frame: tester.control.request(tester, {'op': 'resume'}, True))
+
+
+def control_progress(tester):
+    control = getattr(tester, 'control', None)
+    if control is None or not (control.pauses or control.applied):
+        return {}
+    return {'control': {**control.summary(), 'command_delay': tester.COMMAND_DELAY, 'commands': len(tester.COMMANDS)}}
@@ -0,0 +1,115 @@
+import math
+from statistics import NormalDist
+
+SPRT_ALPHA = 0.05  # Chance of failing a unit whose failure rate is really p0
+SPRT_BETA = 0.05  # Chance of passing a unit whose failure rate is really p1
+
+
+class SequentialTest:
+    # Wald's sequential probability ratio test on the per-command failure rate
+    # (errors + timeouts over commands). H0: rate = p0 (acceptable), H1: rate = p1
+    # (unacceptable). Checked after every cycle from the tester's counters, so it
+    # works the same in stop-and-wait, pipelined and resumed runs. The run stops
+    # as soon as the log-likelihood ratio leaves (lower, upper).
+
+    def __init__(self, p0, p1, alpha=SPRT_ALPHA, beta=SPRT_BETA, min_cycles=0):
+        if not 0 < p0 < p1 < 1:
+            raise ValueError(f"SPRT needs 0 < p0 < p1 < 1, got p0={p0} p1={p1}")
+        if not (0 < alpha < 0.5 and 0 < beta < 0.5):
+            raise ValueError(f"SPRT needs alpha and beta between 0 and 0.5, got {alpha} and {beta}")
+        self.p0 = p0
+        self.p1 = p1
+        self.alpha = alpha
+        self.beta = beta
+        self.min_cycles = min_cycles  # Don't decide before this many cycles
+        self.failure_step = math.log(p1 / p0)
+        self.success_step = math.log((1 - p1) / (1 - p0))
+        self.upper = math.log((1 - beta) / alpha)  # At or above: fail
+        self.lower = math.log(beta / (1 - alpha))  # At or below: pass
+        self.trials = 0
+        self.failures = 0
+        self.llr = 0.0
+        self.decision = None
+        self.decided_at = None
+
+    def update(self, trials, failures, cycle):
+        # Returns 'pass' or 'fail' once decided, None while the evidence is inconclusive
+        self.trials = trials
+        self.failures = min(failures, trials)
+        self.llr = self.failures * self.failure_step + (trials - self.failures) * self.success_step
+        if self.decision is None and cycle >= self.min_cycles:
+            if self.llr >= self.upper:
+                self.decision = 'fail'
+            elif self.llr <= self.lower:
+                self.decision = 'pass'
+            if self.decision:
+                self.decided_at = cycle
+        return self.decision
+
+    def interval(self):
+        # Wilson score interval on the failure rate at the test's confidence
+        if not self.trials:
+            return 0.0, 1.0
+        z = NormalDist().inv_cdf(1 - min(self.alpha, self.beta) / 2)
+        n = self.trials
+        rate = self.failures / n
+        centre = (rate + z * z / (2 * n)) / (1 + z * z / n)
+        spread = z * math.sqrt(rate * (1 - rate) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(0.0, centre - spread), min(1.0, centre + spread)
+
+    def summary(self):
+        low, high = self.interval()
+        return {
+            'decision': self.decision or 'undecided',
+            'decided_at_cycle': self.decided_at,
+            'commands': self.trials,
+            'failures': self.failures,
+            'failure_rate': round(self.failures / self.trials, 6) if self.trials else 0.0,
+            'rate_interval': [round(low, 6), round(high, 6)],
+            'llr': round(self.llr, 4),
+            'bounds': [round(self.lower, 4), round(self.upper, 4)],
+            'p0': self.p0,
+            'p1': self.p1,
+            'alpha': self.alpha,
+            'beta': self.beta
+        }
+
+    def log_summary(self, logger):
+        s = self.summary()
+        confidence = round((1 - min(self.alpha, self.beta)) * 100, 2)
+        logger.info(f"Early stop (SPRT p0={s['p0']} p1={s['p1']} alpha={s['alpha']} beta={s['beta']}): "
+                    f"{s['decision'].upper()}" + (f" at cycle {s['decided_at_cycle']}" if s['decided_at_cycle'] else ""))
+        logger.info(f"Evidence: {s['failures']}/{s['commands']} commands failed (rate {s['failure_rate']}, "
+                    f"{confidence}% interval {s['rate_interval'][0]}-{s['rate_interval'][1]}), "
+                    f"log-likelihood ratio {s['llr']} against bounds {s['bounds'][0]} / {s['bounds'][1]}")
+
+
+def make_early_stop(early_stop):
+    # A SequentialTest, or its keyword arguments as a dict (from the tester daemon's JSON options)
+    if isinstance(early_stop, dict):
+        return SequentialTest(**early_stop)
+    return early_stop
+
+
+def check_early_stop(tester, cycle):
+    # Called once per completed cycle; True when the run should stop here
+    test = tester.early_stop
+    decided = test.decision is not None
+    decision = test.update(tester.count, tester.error + tester.timeout, cycle)
+    if decision is None or decided:
+        return decision is not None
+    tester.logger.info(f"Early stop: {decision.upper()} decided after cycle {cycle}/{tester.NUM_CYCLES} "
+                       f"({test.failures}/{test.trials} commands failed)")
+    return True
+
+
+def early_stop_decided(tester):
+    test = getattr(tester, 'early_stop', None)
+    return test is not None and test.decision is not None
+
+
+def early_stop_progress(tester):
+    test = getattr(tester, 'early_stop', None)
+    if test is None:
+        return {}
+    return {'early_stop': test.summary()}
@@ -0,0 +1,86 @@
+import enum
+import logging
+from collections import namedtuple
+
+
+class Outcome(enum.Enum):
+    SUCCESS = 'success'
+    TIMEOUT = 'timeout'
+    ERROR = 'error'
+
+
+# outcome: how the tester counts the reply, value: the parsed feedback code
+# (None when the reply isn't a number), level/message: the log line to write
+Decoded = namedtuple('Decoded', ['outcome', 'value', 'level', 'message'])
+
+# One row per known feedback code: code -> (outcome, log level, log message).
+# 'empty' covers a blank reply, 'other' any other code ({value} is filled in) and
+# 'invalid' a reply that can't be parsed at all ({error} is filled in).
+FeedbackTable = namedtuple('FeedbackTable', ['codes', 'empty', 'other', 'invalid', 'parse'])
+
+# How a raw reply becomes a number:
+#   text_or_bytes - decimal text, else the bytes as a little-endian integer
+#   text          - decimal text only
+PARSERS = ('text_or_bytes', 'text')
+DECODE_CACHE_SIZE = 4096  # Distinct replies remembered, common ones are prefilled
+
+
+class FeedbackDecoder:
+    # Maps raw reply bytes to a Decoded row with one dict lookup. Known codes are
+    # compiled into the table up front; anything else is parsed once and cached.
+
+    def __init__(self, table, cache_size=DECODE_CACHE_SIZE):
+        if table.parse not in PARSERS:
+            raise ValueError(f"Invalid feedback parser: {table.parse}")
+        self.table = table
+        self.cache_size = cache_size
+        self.cache = {}
+        self.empty = Decoded(table.empty[0], None, table.empty[1], table.empty[2])
+        self.cache[b''] = self.empty
+        for code in table.codes:
+            raw = str(code).encode()
+            self.cache[raw] = self.decode_slow(raw)
+
+    def decode(self, fb):
+        try:
+            decoded = self.cache.get(fb)
+        except TypeError:
+            fb = bytes(fb)  # bytearray from a reader buffer
+            decoded = self.cache.get(fb)
+        if decoded is not None:
+            return decoded
+
+        if not fb:
+            return self.empty
+        if isinstance(fb, str):
+            return self.decode(fb.encode())
+        decoded = self.decode_slow(fb)
+        if len(self.cache) < self.cache_size:
+            self.cache[fb] = decoded
+        return decoded
+
+    def decode_slow(self, fb):
+        try:
+            value = self.parse(fb)
+        except ValueError as e:
+            outcome, level, message = self.table.invalid
+            return Decoded(outcome, None, level, message.format(error=e) if message else None)
+
+        row = self.table.codes.get(value)
+        if row is not None:
+            return Decoded(row[0], value, row[1], row[2])
+        outcome, level, message = self.table.other
+        return Decoded(outcome, value, level, message.format(value=value) if message else None)
+
+    def parse(self, fb):
+        if self.table.parse == 'text':
+            return int(fb)
+        try:
+            return int(fb.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            return int.from_bytes(fb, 'little')
+
+
+def feedback_table(codes, empty, other=(Outcome.ERROR, logging.ERROR, "Error occurred. Feedback value: {value}"),
+                   invalid=(Outcome.ERROR, logging.ERROR, "Error processing feedback: {error}"), parse='text_or_bytes'):
+    return FeedbackTable(codes, empty, other, invalid, parse)
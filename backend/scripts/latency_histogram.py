@@ -0,0 +1,141 @@
+from tester_clock import SYSTEM_CLOCK
+
+# Log-bucketed histogram in the style of HdrHistogram: each power of two is split
+# into SUB_BUCKETS linear buckets, so relative error stays under 1/SUB_BUCKETS
+# (~6%) from 1 ns up to MAX_VALUE_NS with a fixed 672-slot count array.
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 40
+MAX_VALUE_NS = (1 << (MAX_EXPONENT + SUB_BUCKET_BITS + 1)) - 1  # ~9.7 hours
+NUM_BUCKETS = (MAX_EXPONENT + 2) * SUB_BUCKETS
+
+SUMMARY_PERCENTILES = (50, 90, 99)
+
+
+def bucket_index(value_ns):
+    if value_ns < SUB_BUCKETS:
+        return max(0, value_ns)
+    exponent = value_ns.bit_length() - SUB_BUCKET_BITS - 1
+    return exponent * SUB_BUCKETS + (value_ns >> exponent)
+
+
+def bucket_upper_bound(index):
+    if index < SUB_BUCKETS:
+        return index
+    exponent = index // SUB_BUCKETS - 1
+    lower = (index % SUB_BUCKETS + SUB_BUCKETS) << exponent
+    return lower + (1 << exponent) - 1
+
+
+def percentile_rank(total, percent):
+    # 1-based nearest rank of the percent-th percentile among `total` sorted values
+    return max(1, -(-total * percent // 100))  # ceil without floats
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.total = 0
+        self.sum_ns = 0
+        self.max_ns = 0
+
+    def record(self, value_ns):
+        value_ns = min(int(value_ns), MAX_VALUE_NS)
+        self.counts[bucket_index(value_ns)] += 1
+        self.total += 1
+        self.sum_ns += value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum_ns += other.sum_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self, percent):
+        if not self.total:
+            return 0
+        target = percentile_rank(self.total, percent)
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(bucket_upper_bound(index), self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        # Milliseconds, rounded for the progress stream
+        summary = {'count': self.total}
+        for percent in SUMMARY_PERCENTILES:
+            summary[f'p{percent}'] = round(self.percentile(percent) / 1e6, 3)
+        summary['max'] = round(self.max_ns / 1e6, 3)
+        summary['mean'] = round(self.sum_ns / self.total / 1e6, 3) if self.total else 0.0
+        return summary
+
+    def to_dict(self):
+        # Sparse form for checkpoints: only non-empty buckets
+        return {
+            'counts': {str(i): c for i, c in enumerate(self.counts) if c},
+            'total': self.total,
+            'sum_ns': self.sum_ns,
+            'max_ns': self.max_ns
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls()
+        for index, count in data.get('counts', {}).items():
+            histogram.counts[int(index)] = count
+        histogram.total = data.get('total', 0)
+        histogram.sum_ns = data.get('sum_ns', 0)
+        histogram.max_ns = data.get('max_ns', 0)
+        return histogram
+
+
+class LatencyStats:
+    # One histogram per command string, keyed without the trailing newline
+
+    def __init__(self, clock=SYSTEM_CLOCK):
+        self.clock = clock
+        self.histograms = {}
+        self.sent_at_ns = None
+        self.last_ns = None  # Round trip of the latest reply, None after a send until it arrives
+        self.last_sent_ns = None  # perf_counter_ns of the latest send
+
+    def mark_sent(self):
+        self.sent_at_ns = self.last_sent_ns = self.clock.perf_counter_ns()
+        self.last_ns = None
+
+    def record_reply(self, command):
+        # Round trip from the last mark_sent() to now
+        if self.sent_at_ns is None:
+            return
+        self.record(command, self.clock.perf_counter_ns() - self.sent_at_ns)
+        self.sent_at_ns = None
+
+    def record(self, command, value_ns):
+        key = command.strip() if command else ''
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(value_ns)
+        self.last_ns = value_ns
+
+    def summary(self):
+        return {command: histogram.summary() for command, histogram in self.histograms.items()}
+
+    def log_summary(self, logger):
+        for command, s in self.summary().items():
+            logger.info(f"Latency for {command} (ms): p50={s['p50']} p90={s['p90']} p99={s['p99']} max={s['max']} (n={s['count']})")
+
+    def to_dict(self):
+        return {command: histogram.to_dict() for command, histogram in self.histograms.items()}
+
+    @classmethod
+    def from_dict(cls, data, clock=SYSTEM_CLOCK):
+        stats = cls(clock)
+        stats.histograms = {command: LatencyHistogram.from_dict(h) for command, h in data.items()}
+        return stats
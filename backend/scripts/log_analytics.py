@@ -0,0 +1,284 @@
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from feedback_decoder import FeedbackDecoder
+from tester_registry import TESTER_CLASSES, load_feedback_table
+
+CACHE_FILE = '.analytics_cache.json'  # Inside the logs directory
+CACHE_VERSION = 1  # Bump when parse_log() changes what it extracts
+TABLES = ('commands', 'cycles', 'errors')
+GROUP_KEYS = ('date', 'hardware', 'project', 'instance', 'command')
+OUTCOME_COLUMNS = {'success': 1, 'timeout': 2, 'error': 3}  # Index into a command's [sent, success, timeout, error]
+
+# Lines written by the testers' setup_logging() format: "<asctime> - <LEVEL> - <message>"
+LINE_SEPARATOR = ' - '
+# ERROR lines that stand in for a Feedback line, the command got no decoded reply
+SEND_FAILURES = ('Exception while sending command', 'Timeout while sending command', 'Exception while processing feedback')
+NUMBERS = re.compile(r'\d+')
+
+_decoders = {}
+
+
+def log_files(log_dir, since=None, until=None):
+    # logs/<YYYY-MM-DD>/<project>_<hardware>_<n>.log, oldest day first
+    files = []
+    for day in sorted(os.listdir(log_dir)):
+        day_dir = os.path.join(log_dir, day)
+        if not os.path.isdir(day_dir) or (since and day < since) or (until and day > until):
+            continue
+        for name in sorted(os.listdir(day_dir)):
+            if name.endswith('.log'):
+                files.append(os.path.join(day_dir, name))
+    return files
+
+
+def describe_file(path):
+    # Instance IDs are "<hardware>_<n>", project names may contain underscores themselves
+    day = os.path.basename(os.path.dirname(path))
+    project, _, instance = os.path.basename(path)[:-len('.log')].rpartition('_')
+    project, _, hardware = project.rpartition('_')
+    return {'date': day, 'project': project, 'hardware': hardware, 'instance': f"{hardware}_{instance}"}
+
+
+def decoder_for(hardware):
+    decoder = _decoders.get(hardware)
+    if decoder is None and hardware in TESTER_CLASSES:
+        decoder = _decoders[hardware] = FeedbackDecoder(load_feedback_table(hardware))
+    return decoder
+
+
+def parse_feedback(text):
+    # Feedback is logged as the repr of the bytes read, e.g. b'13'
+    if text.startswith("b'") and text.endswith("'") and '\\' not in text:
+        return text[2:-1].encode('latin1')
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text.encode()
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def new_result(info):
+    return {
+        **info,
+        'offset': 0,
+        'commands': {},  # command -> [sent, success, timeout, error]
+        'feedback': {},  # command -> {raw feedback: count}
+        'cycles': [0, 0, 0],  # started, completed, failed
+        'errors': {},  # ERROR line with numbers replaced by '#' -> count
+        'runs': 0,
+        'first': None,
+        'last': None,
+        'pending': []  # Commands sent but not yet answered when the file ended
+    }
+
+
+def parse_log(path, result):
+    # Streams the file from result['offset'] and adds what it finds to result.
+    # Replies are matched to sends in order, which holds for stop-and-wait and for
+    # pipelined runs in 'order' match mode. Stops before a partly written last line.
+    decoder = decoder_for(result['hardware'])
+    commands, feedback, cycles, errors = result['commands'], result['feedback'], result['cycles'], result['errors']
+    pending = deque(result['pending'])
+
+    def resolve(outcome):
+        command = pending.popleft() if pending else ''
+        counts = commands.setdefault(command, [0, 0, 0, 0])
+        counts[OUTCOME_COLUMNS[outcome]] += 1
+        return command
+
+    with open(path, 'rb') as f:
+        f.seek(result['offset'])
+        offset = result['offset']
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            offset += len(raw)
+            parts = raw.decode('utf-8', 'replace').rstrip('\n').split(LINE_SEPARATOR, 2)
+            if len(parts) != 3:
+                continue  # Blank or continuation line, commands are logged with their newline
+            timestamp, level, message = parts
+            if result['first'] is None:
+                result['first'] = timestamp
+            result['last'] = timestamp
+
+            if message.startswith('Sending command: '):
+                command = message[len('Sending command: '):].strip()
+                commands.setdefault(command, [0, 0, 0, 0])[0] += 1
+                pending.append(command)
+            elif message.startswith('Feedback: '):
+                fb = parse_feedback(message[len('Feedback: '):])
+                outcome = decoder.decode(fb).outcome.value if decoder else 'success'
+                command = resolve(outcome)
+                codes = feedback.setdefault(command, {})
+                key = fb.decode('latin1')
+                codes[key] = codes.get(key, 0) + 1
+            elif message.startswith('Starting cycle '):
+                cycles[0] += 1
+            elif message.startswith('Cycle: '):
+                cycles[1] += 1
+                if message.endswith('Failed'):
+                    cycles[2] += 1
+            elif message.startswith(('Total commands completed', 'Total commands executed')):
+                result['runs'] += 1
+                pending.clear()  # Run ended, anything unanswered never will be
+            if level == 'ERROR':
+                key = NUMBERS.sub('#', message)[:120]
+                errors[key] = errors.get(key, 0) + 1
+                if message.startswith(SEND_FAILURES):
+                    resolve('error')
+
+    result['offset'] = offset
+    result['pending'] = list(pending)
+    return result
+
+
+def parse_task(task):
+    path, result = task
+    return path, parse_log(path, result)
+
+
+def load_cache(log_dir):
+    try:
+        with open(os.path.join(log_dir, CACHE_FILE)) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get('files', {}) if cache.get('version') == CACHE_VERSION else {}
+
+
+def save_cache(log_dir, files):
+    path = os.path.join(log_dir, CACHE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'files': files}, f)
+    os.replace(path + '.tmp', path)
+
+
+def analyse(log_dir, paths, jobs=None):
+    # Parses what changed since the cached run, one file per worker. A file that
+    # only grew (testers append to the day's log) is parsed from where it left off.
+    cache = load_cache(log_dir)
+    results, tasks = {}, []
+    stats = {'files': len(paths), 'cached': 0, 'resumed': 0, 'parsed': 0}
+    for path in paths:
+        st = os.stat(path)
+        key = os.path.relpath(path, log_dir)
+        entry = cache.get(key)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            results[path] = entry['result']
+            stats['cached'] += 1
+        elif entry and entry['result']['offset'] <= st.st_size:
+            tasks.append((path, entry['result']))
+            stats['resumed'] += 1
+        else:
+            tasks.append((path, new_result(describe_file(path))))
+            stats['parsed'] += 1
+
+    if len(tasks) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results.update(pool.map(parse_task, tasks))
+    else:
+        results.update(map(parse_task, tasks))
+
+    if tasks:
+        for path, _ in tasks:
+            st = os.stat(path)
+            cache[os.path.relpath(path, log_dir)] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'result': results[path]}
+        save_cache(log_dir, cache)
+    return [results[path] for path in paths], stats
+
+
+def matches(result, args):
+    return ((not args.hardware or result['hardware'] in args.hardware) and
+            (not args.instance or result['instance'] in args.instance) and
+            (not args.project or result['project'] in args.project))
+
+
+def aggregate(results, table, group_by, commands=None):
+    rows = {}
+    for result in results:
+        if table == 'commands':
+            for command, counts in result['commands'].items():
+                if commands and command not in commands:
+                    continue
+                key = tuple(command if k == 'command' else result[k] for k in group_by)
+                row = rows.setdefault(key, [0, 0, 0, 0])
+                for i, count in enumerate(counts):
+                    row[i] += count
+        elif table == 'cycles':
+            key = tuple(result[k] for k in group_by if k != 'command')
+            row = rows.setdefault(key, [0, 0, 0, 0])
+            row[0] += result['runs']
+            for i, count in enumerate(result['cycles']):
+                row[i + 1] += count
+        else:
+            for message, count in result['errors'].items():
+                key = tuple(result[k] for k in group_by if k != 'command') + (message,)
+                rows[key] = rows.get(key, 0) + count
+    return rows
+
+
+def table_rows(rows, table, group_by, failures_only=False):
+    if table == 'commands':
+        header = list(group_by) + ['sent', 'success', 'timeouts', 'errors', 'failure_rate']
+        body = []
+        for key, (sent, success, timeouts, errors) in sorted(rows.items()):
+            if failures_only and not timeouts and not errors:
+                continue
+            answered = success + timeouts + errors
+            body.append(list(key) + [sent, success, timeouts, errors,
+                                     round((timeouts + errors) / answered, 6) if answered else 0.0])
+    elif table == 'cycles':
+        header = [k for k in group_by if k != 'command'] + ['runs', 'started', 'completed', 'failed']
+        body = [list(key) + counts for key, counts in sorted(rows.items()) if not failures_only or counts[3]]
+    else:
+        header = [k for k in group_by if k != 'command'] + ['message', 'count']
+        body = [list(key) + [count] for key, count in sorted(rows.items(), key=lambda item: -item[1])]
+    return header, body
+
+
+def print_table(header, body):
+    widths = [max(len(str(row[i])) for row in [header] + body) for i in range(len(header))]
+    for row in [header] + body:
+        print('  '.join(str(value).ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aggregate sends, feedback, errors and cycles from tester logs')
+    parser.add_argument('--logs', type=str, default='logs', help='Log directory (logs/<date>/<project>_<id>.log)')
+    parser.add_argument('--table', type=str, default='commands', choices=TABLES, help='What to aggregate')
+    parser.add_argument('--by', type=str, nargs='+', default=['instance', 'command'], choices=GROUP_KEYS,
+                        help='Columns to group by')
+    parser.add_argument('--days', type=int, default=None, help='Only the last N days of logs')
+    parser.add_argument('--since', type=str, default=None, help='First log date, YYYY-MM-DD')
+    parser.add_argument('--until', type=str, default=None, help='Last log date, YYYY-MM-DD')
+    parser.add_argument('--hardware', type=str, nargs='+', default=[], help='Hardware types, e.g. qswipe')
+    parser.add_argument('--instance', type=str, nargs='+', default=[], help='Instance IDs')
+    parser.add_argument('--project', type=str, nargs='+', default=[], help='Project names')
+    parser.add_argument('--command', type=str, nargs='+', default=[], help='Commands, e.g. e:s:c:e:3:')
+    parser.add_argument('--failures-only', action='store_true', help='Only rows with timeouts, errors or failed cycles')
+    parser.add_argument('--jobs', type=int, default=None, help='Worker processes (default: one per CPU)')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of a table')
+
+    args = parser.parse_args()
+    since = args.since
+    if args.days is not None:
+        since = max(since or '', (date.today() - timedelta(days=args.days - 1)).isoformat())
+
+    results, stats = analyse(args.logs, log_files(args.logs, since, args.until), args.jobs)
+    results = [result for result in results if matches(result, args)]
+    header, body = table_rows(aggregate(results, args.table, args.by, args.command), args.table, args.by,
+                              args.failures_only)
+    if args.json:
+        print(json.dumps({'stats': stats, 'rows': [dict(zip(header, row)) for row in body]}, indent=2))
+    else:
+        print_table(header, body)
+        print(f"\n{stats['files']} files: {stats['parsed']} parsed, {stats['resumed']} resumed, "
+              f"{stats['cached']} cached", file=sys.stderr)
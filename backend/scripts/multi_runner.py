@@ -0,0 +1,350 @@
+import asyncio
+import argparse
+import json
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import serial
+
+from command_scheduler import target_rate
+from progress_channel import ProgressChannel
+from result_columns import COLUMN_FORMATS
+from tester_registry import load_tester_class, normalize_commands
+
+# QBA's run() keeps going through the command list after a failed command,
+# the other testers stop the cycle at the first command without valid feedback
+CONTINUE_ON_FAILURE = {'qba'}
+
+CONNECT_SETTLE_DELAY = 0.5  # Same settle delay as connect_serial()
+
+# Testers with a pipelined mode, for specs with a 'window' above 1
+PIPELINED_TYPES = {'qba', 'qbq'}
+
+
+class AsyncPort:
+    # Line reader for a non-blocking serial port driven by the event loop
+
+    def __init__(self, loop, serial_conn):
+        self.loop = loop
+        self.serial_conn = serial_conn
+        self.buffer = bytearray()
+        self.waiter = None
+        self.use_reader = sys.platform != 'win32' and hasattr(serial_conn, 'fileno')
+        if self.use_reader:
+            loop.add_reader(serial_conn.fileno(), self._on_readable)
+
+    def _on_readable(self):
+        try:
+            self.buffer += self.serial_conn.read(self.serial_conn.in_waiting or 1)
+        except serial.SerialException as e:
+            if self.waiter and not self.waiter.done():
+                self.waiter.set_exception(e)
+            return
+        if self.waiter and not self.waiter.done() and b'\n' in self.buffer:
+            self.waiter.set_result(None)
+
+    def reset_input_buffer(self):
+        self.serial_conn.reset_input_buffer()
+        self.buffer.clear()
+
+    def write(self, data):
+        self.serial_conn.write(data)
+
+    async def readline(self, timeout):
+        # Returns (stripped line, timed_out) as soon as the line terminator arrives
+        if not self.use_reader:
+            # Windows event loops can't watch serial handles, use a worker thread instead
+            self.serial_conn.timeout = timeout
+            fb = await self.loop.run_in_executor(None, self.serial_conn.read_until, b'\n')
+            return fb.strip(), not fb.endswith(b'\n')
+
+        if b'\n' not in self.buffer:
+            self.waiter = self.loop.create_future()
+            try:
+                await asyncio.wait_for(self.waiter, timeout)
+            except asyncio.TimeoutError:
+                partial = bytes(self.buffer)
+                self.buffer.clear()
+                return partial.strip(), True
+            finally:
+                self.waiter = None
+
+        line, _, rest = bytes(self.buffer).partition(b'\n')
+        self.buffer[:] = rest
+        return line.strip(), False
+
+    def close(self):
+        if self.use_reader:
+            self.loop.remove_reader(self.serial_conn.fileno())
+
+
+class InstanceRunner:
+    def __init__(self, spec):
+        self.spec = spec
+        self.hardware_type = spec['hardware_type']
+        self.instance_id = spec['id']
+        self.tester = None
+        self.port = None
+        self.started_at = None
+        self.finished_at = None
+
+    async def connect(self, loop):
+        options = {}
+        window = int(self.spec.get('window') or 1)
+        if window > 1:
+            # Optional 'window' and 'match_mode' run a QBA or QBQ instance pipelined
+            if self.hardware_type not in PIPELINED_TYPES:
+                raise ValueError(f"{self.hardware_type} has no pipelined mode")
+            options.update(window=window, match_mode=self.spec.get('match_mode') or 'order')
+        serial_conn = serial.Serial(self.spec['port'], int(self.spec['baud_rate']), timeout=0)
+        await asyncio.sleep(CONNECT_SETTLE_DELAY)
+        serial_conn.reset_input_buffer()
+        serial_conn.reset_output_buffer()
+
+        tester_class = load_tester_class(self.hardware_type)
+        commands = normalize_commands(self.spec['commands'])
+        # Optional 'rate' (commands/sec) or 'cycles_per_hour' switch the instance to deadline pacing
+        rate = target_rate(self.spec.get('rate'), self.spec.get('cycles_per_hour'), len(commands))
+        # Checkpoints are off: a runner has no --resume, and an instance resumed on
+        # its own would clash with the runner's cycle numbering
+        self.tester = tester_class(
+            self.spec['port'], int(self.spec['baud_rate']), int(self.spec['num_cycles']),
+            commands, float(self.spec['command_delay']),
+            self.instance_id, self.spec['project_name'], serial_conn=serial_conn, rate=rate,
+            log_mode=self.spec.get('log_mode', 'sync'), results_db=self.spec.get('results_db'),
+            columns_format=self.spec.get('columns'), checkpoint_interval=0,
+            early_stop=self.spec.get('early_stop'), capture_frames=int(self.spec.get('capture_frames') or 0),
+            **options
+        )
+        self.tester.logger.info(f"Connected to {self.spec['port']} at {self.spec['baud_rate']} baud.")
+        if window == 1:
+            # tester.serial_conn, so a capture sees the frames the event loop reads
+            self.port = AsyncPort(loop, self.tester.serial_conn)
+
+    async def send_command(self, command):
+        # command is one of the tester's CompiledCommands, the same payload run() writes
+        tester = self.tester
+        tester.logger.info(command.send_label)
+        try:
+            self.port.reset_input_buffer()
+            tester.latency.mark_sent()
+            self.port.write(command.payload)
+
+            fb, timed_out = await self.port.readline(command.feedback_timeout)
+            if not timed_out:
+                tester.latency.record_reply(command.key)
+            elif not fb:
+                fb = getattr(tester, 'NO_REPLY_FEEDBACK', fb)
+
+            return tester.process_feedback(fb) == 0
+        except Exception as e:
+            tester.logger.error(f"Exception while sending command: {e}")
+            tester.error += 1
+            return False
+
+    def tag(self, record):
+        return {'instance': self.instance_id, 'hardware_type': self.hardware_type, **record,
+                'commands_per_sec': self.commands_per_sec()}
+
+    async def run(self, emit):
+        tester = self.tester
+        # The tester's own per-cycle progress, early stop and capture bookkeeping
+        # (emit_progress), with its records tagged and sent through the runner
+        tester.progress_channel.send = lambda record: emit(self.tag(record))
+        self.started_at = time.perf_counter()
+        try:
+            if self.port is None:
+                await self.run_pipelined()
+            else:
+                await self.run_cycles()
+        finally:
+            self.finished_at = time.perf_counter()
+            if self.port is not None:
+                self.port.close()
+                tester.cleanup()  # run() does its own in pipelined mode
+            tester.log_handler.close()  # Stops the async log writer thread
+            tester.serial_conn.close()
+
+    async def run_pipelined(self):
+        # The pipeline interleaves sends and reads itself, so the tester's own
+        # run() drives it from a worker thread
+        future = asyncio.get_running_loop().run_in_executor(None, self.tester.run)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The thread can't be cancelled: stop it after the current command and
+            # wait for its cleanup before the port is closed
+            self.tester.is_running = False
+            await future
+            raise
+
+    async def run_cycles(self):
+        # The tester's run() loop, with awaits where it would block
+        tester = self.tester
+        for cycle in range(tester.start_cycle, tester.NUM_CYCLES):
+            if tester.control.pending:
+                # Blocks while paused, so it waits in a worker thread
+                await asyncio.to_thread(tester.control.at_cycle_boundary, tester, cycle)
+            if not tester.is_running:
+                break
+
+            cycle_success = True
+            tester.logger.info(f"Starting cycle {cycle + 1}/{tester.NUM_CYCLES}", extra={'cycle': cycle + 1})
+            tester.current_cycle = cycle
+
+            for command in tester.COMMAND_SET:
+                if not tester.is_running:
+                    break
+
+                if tester.scheduler:
+                    slot = cycle * len(tester.COMMAND_SET) + command.index
+                    await asyncio.sleep(tester.scheduler.delay(slot))
+                    tester.scheduler.mark(slot)
+
+                tester.current_command = command
+                if await self.send_command(command):
+                    tester.logger.info(command.success_label)
+                else:
+                    cycle_success = False
+                    if self.hardware_type not in CONTINUE_ON_FAILURE:
+                        tester.logger.warning(command.failure_label)
+                        break
+
+                if tester.scheduler is None:
+                    tester.logger.info(f"Waiting for {tester.COMMAND_DELAY} seconds before sending next command...")
+                    await asyncio.sleep(tester.COMMAND_DELAY)
+
+            tester.emit_progress(tester.build_progress(cycle, cycle_success))
+            tester.logger.info(f"Cycle: {cycle + 1}/{tester.NUM_CYCLES} completed with status: {'Success' if cycle_success else 'Failed'}")
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    def commands_per_sec(self):
+        elapsed = self.elapsed()
+        return round(self.tester.count / elapsed, 3) if elapsed > 0 else 0.0
+
+
+class MultiRunner:
+    def __init__(self, specs, report_interval=5.0, progress_fd=None):
+        # Not coalesced, records from different instances would replace each other
+        self.channel = ProgressChannel(progress_fd)
+        self.runners = [InstanceRunner(spec) for spec in specs]
+        self.report_interval = report_interval
+        self.started_at = None
+
+    def emit(self, record):
+        self.channel.emit(record)
+
+    def aggregate(self):
+        elapsed = time.perf_counter() - self.started_at
+        commands = sum(r.tester.count for r in self.runners if r.tester)
+        return {
+            'aggregate': True,
+            'instances': len(self.runners),
+            'active': sum(1 for r in self.runners if r.tester and r.finished_at is None),
+            'commands': commands,
+            'errors': sum(r.tester.error for r in self.runners if r.tester),
+            'timeouts': sum(r.tester.timeout for r in self.runners if r.tester),
+            'elapsed_sec': round(elapsed, 3),
+            'commands_per_sec': round(commands / elapsed, 3) if elapsed > 0 else 0.0,
+            'per_instance': {r.instance_id: r.commands_per_sec() for r in self.runners if r.tester}
+        }
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            self.emit(self.aggregate())
+
+    async def run_instance(self, runner, loop):
+        try:
+            await runner.connect(loop)
+        except serial.SerialException as e:
+            self.emit({'instance': runner.instance_id, 'error': f"Failed to connect to {runner.spec['port']}: {e}"})
+            return
+        except ValueError as e:
+            self.emit({'instance': runner.instance_id, 'error': str(e)})
+            return
+        await runner.run(self.emit)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        # A worker per instance: pipelined runs, paused instances and Windows reads each hold one
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=len(self.runners) + 1))
+        self.started_at = time.perf_counter()
+        reporter = asyncio.create_task(self.report())
+        try:
+            await asyncio.gather(*(self.run_instance(r, loop) for r in self.runners))
+        finally:
+            reporter.cancel()
+            self.emit(self.aggregate())
+            self.channel.close()
+
+    def stop(self):
+        for runner in self.runners:
+            if runner.tester:
+                runner.tester.is_running = False
+
+
+def load_specs_from_db(db_path, ids):
+    # Rows from hardware_instances already carry every field the runner needs
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        placeholders = ', '.join('?' for _ in ids)
+        rows = conn.execute(f'SELECT * FROM hardware_instances WHERE id IN ({placeholders})', ids).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+
+def load_specs(args):
+    if args.db:
+        specs = load_specs_from_db(args.db, args.ids)
+    elif args.config == '-':
+        specs = json.load(sys.stdin)
+    else:
+        with open(args.config) as f:
+            specs = json.load(f)
+
+    for spec in specs:
+        # Commands are stored as a JSON string in the database
+        if isinstance(spec['commands'], str):
+            spec['commands'] = json.loads(spec['commands'])
+    return specs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run many hardware test instances from one asyncio event loop')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--config', type=str,
+                        help='JSON list of instances (hardware_instances columns), or - for stdin')
+    source.add_argument('--db', type=str, help='Path to hardware_tests.db')
+    parser.add_argument('--ids', type=str, nargs='+', default=[], help='Instance IDs to load from --db')
+    parser.add_argument('--report-interval', type=float, default=5.0,
+                        help='Seconds between aggregate throughput reports')
+    parser.add_argument('--progress-fd', type=int, default=None,
+                        help='File descriptor for NDJSON progress records (default: stdout, mixed with log lines)')
+    parser.add_argument('--results-db', type=str, default=None,
+                        help='SQLite database for per-command results, for instances that don\'t set results_db')
+    parser.add_argument('--columns', type=str, default=None, choices=COLUMN_FORMATS,
+                        help='Write every command outcome next to each log as .npz or .parquet columns')
+
+    args = parser.parse_args()
+    if args.db and not args.ids:
+        parser.error('--ids is required with --db')
+
+    specs = load_specs(args)
+    for spec in specs:
+        spec.setdefault('results_db', args.results_db)
+        spec.setdefault('columns', args.columns)
+    runner = MultiRunner(specs, args.report_interval, args.progress_fd)
+    try:
+        asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        # asyncio.run() cancels the instance tasks, which still run cleanup()
+        pass
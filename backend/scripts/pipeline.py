@@ -0,0 +1,272 @@
+from collections import OrderedDict, namedtuple
+
+from serial_feedback import tester_feedback_timeout
+from tester_clock import SYSTEM_CLOCK
+
+MATCH_MODES = ('order', 'tag')
+
+# In tag mode each command is framed as '@<seq>:<command>' and the device is
+# expected to echo the tag back in front of its reply: '@<seq>:<code>'
+TAG_PREFIX = b'@'
+SEQ_MODULO = 65536
+
+PendingCommand = namedtuple('PendingCommand', ['seq', 'command', 'context', 'sent_at_ns', 'deadline'])
+# Tester counters a resolved command adds to, tracked per cycle while the cycle is in flight
+CYCLE_COUNTERS = ('count', 'error', 'timeout', 'latency_saved')
+
+
+class CommandPipeline:
+    # Keeps up to `window` commands outstanding and matches replies back to them
+
+    def __init__(self, serial_conn, window, match_mode='order', logger=None, clock=SYSTEM_CLOCK):
+        if match_mode not in MATCH_MODES:
+            raise ValueError(f"Invalid match mode: {match_mode}")
+        self.serial_conn = serial_conn
+        self.window = max(1, window)
+        self.match_mode = match_mode
+        self.logger = logger
+        self.clock = clock
+        self.outstanding = OrderedDict()  # seq -> PendingCommand, oldest first
+        self.next_seq = 0
+        self.rx_buffer = bytearray()
+        self.cycles = {}  # cycle -> CycleState, started but not yet reported (run_pipelined)
+
+        self.missing_replies = 0
+        self.out_of_window_replies = 0
+
+    def has_room(self):
+        return len(self.outstanding) < self.window
+
+    def send(self, command, context, reply_timeout):
+        # command is a CompiledCommand, its pre-encoded payload goes out as is
+        seq = self.next_seq
+        self.next_seq = (self.next_seq + 1) % SEQ_MODULO
+
+        payload = command.payload
+        if self.match_mode == 'tag':
+            payload = TAG_PREFIX + str(seq).encode() + b':' + payload
+
+        sent_at_ns = self.clock.perf_counter_ns()
+        self.serial_conn.write(payload)
+        self.serial_conn.flush()
+        self.outstanding[seq] = PendingCommand(seq, command, context, sent_at_ns, self.clock.monotonic() + reply_timeout)
+        return seq
+
+    def next_deadline(self):
+        if not self.outstanding:
+            return None
+        return min(p.deadline for p in self.outstanding.values())
+
+    def poll(self, max_wait):
+        # Wait up to max_wait for replies. Returns a list of (pending, fb) pairs;
+        # fb is None when the reply never arrived within the command's timeout and
+        # pending is None for a reply that matches no outstanding command
+        deadline = self.next_deadline()
+        if deadline is not None:
+            max_wait = min(max_wait, max(0.0, deadline - self.clock.monotonic()))
+
+        self._read(max_wait)
+
+        events = []
+        while b'\n' in self.rx_buffer:
+            line, _, rest = bytes(self.rx_buffer).partition(b'\n')
+            self.rx_buffer[:] = rest
+            line = line.strip()
+            if line:
+                events.append(self._correlate(line))
+
+        now = self.clock.monotonic()
+        for seq, pending in list(self.outstanding.items()):
+            if pending.deadline <= now:
+                del self.outstanding[seq]
+                self.missing_replies += 1
+                if self.logger:
+                    self.logger.error(f"No reply within timeout for command: {pending.command.key}")
+                events.append((pending, None))
+        return events
+
+    def _read(self, max_wait):
+        waiting = self.serial_conn.in_waiting
+        if waiting:
+            self.rx_buffer += self.serial_conn.read(waiting)
+            return
+        if max_wait <= 0:
+            return
+        if self.serial_conn.timeout != max_wait:
+            self.serial_conn.timeout = max_wait
+        self.rx_buffer += self.serial_conn.read_until(b'\n')
+        waiting = self.serial_conn.in_waiting
+        if waiting:
+            self.rx_buffer += self.serial_conn.read(waiting)
+
+    def _correlate(self, line):
+        if self.match_mode == 'order':
+            if not self.outstanding:
+                return self._out_of_window(line)
+            _, pending = self.outstanding.popitem(last=False)
+            return pending, line
+
+        seq = None
+        if line.startswith(TAG_PREFIX):
+            tag, sep, fb = line[len(TAG_PREFIX):].partition(b':')
+            if sep and tag.isdigit():
+                seq = int(tag)
+        if seq is None or seq not in self.outstanding:
+            return self._out_of_window(line)
+        return self.outstanding.pop(seq), fb.strip()
+
+    def in_flight(self, names):
+        # What the cycles not yet reported have added to each tester counter so far
+        totals = dict.fromkeys(names, 0)
+        for state in self.cycles.values():
+            for name in names:
+                totals[name] += state.counters.get(name, 0)
+        return totals
+
+    def _out_of_window(self, line):
+        self.out_of_window_replies += 1
+        if self.logger:
+            self.logger.error(f"Reply does not match any outstanding command: {line}")
+        return None, line
+
+
+class CycleState:
+    def __init__(self, num_commands):
+        self.total = num_commands
+        self.remaining = num_commands
+        self.success = True
+        self.counters = dict.fromkeys(CYCLE_COUNTERS, 0)
+
+    def count(self, tester, before):
+        # Adds what the tester's counters gained since `before` (from counter_values) to this cycle
+        for name, value in before.items():
+            self.counters[name] += getattr(tester, name) - value
+
+
+def counter_values(tester):
+    return {name: getattr(tester, name) for name in CYCLE_COUNTERS if hasattr(tester, name)}
+
+
+def cycle_schedule(tester, start_cycle):
+    # (cycle, CompiledCommand) in send order. COMMAND_SET is read as each cycle
+    # starts, so a command set changed at a cycle boundary applies from there on.
+    for cycle in range(start_cycle, tester.NUM_CYCLES):
+        for command in tester.COMMAND_SET:
+            yield cycle, command
+
+
+def run_pipelined(tester, stop_on_failure):
+    # Pipelined version of the tester's run() loop. Commands are streamed across
+    # cycle boundaries, COMMAND_DELAY spaces the sends rather than following each
+    # reply, and a cycle is reported once every one of its commands is resolved.
+    # With a deadline scheduler the sends follow its absolute schedule instead.
+    # Control requests (pause, delay or command set changes) wait for the cycles
+    # in flight to finish and are applied before the next cycle's first send.
+    clock = tester.clock
+    pipeline = CommandPipeline(tester.serial_conn, tester.WINDOW, tester.MATCH_MODE, tester.logger, clock)
+    tester.pipeline = pipeline
+    scheduler = getattr(tester, 'scheduler', None)
+    control = getattr(tester, 'control', None)
+    start_cycle = getattr(tester, 'start_cycle', 0)  # Past 0 when resuming from a checkpoint
+    schedule = cycle_schedule(tester, start_cycle)
+    cycles = pipeline.cycles
+    next_report = start_cycle
+    next_send_at = 0.0
+
+    tester.serial_conn.reset_input_buffer()
+    item = next(schedule, None)
+
+    def resolve(cycle, success):
+        state = cycles[cycle]
+        state.remaining -= 1
+        if not success:
+            state.success = False
+
+    while tester.is_running and (item is not None or pipeline.outstanding):
+        at_boundary = control is not None and control.pending and item is not None and item[1].index == 0
+        if at_boundary and not pipeline.outstanding:
+            if control.at_cycle_boundary(tester, item[0]):
+                schedule = cycle_schedule(tester, item[0])
+                item = next(schedule, None)
+            continue
+        if scheduler is not None and item is not None:
+            next_send_at = scheduler.deadline(item[0] * len(tester.COMMAND_SET) + item[1].index)
+        now = clock.monotonic()
+        if item is not None and not at_boundary and pipeline.has_room() and now >= next_send_at:
+            cycle, command = item
+            item = next(schedule, None)
+            state = cycles.setdefault(cycle, CycleState(len(tester.COMMAND_SET)))
+
+            if stop_on_failure and not state.success:
+                # Cycle already failed, skip the rest of its commands like run() does
+                state.remaining -= 1
+            else:
+                if command.index == 0:
+                    tester.logger.info(f"Starting cycle {cycle + 1}/{tester.NUM_CYCLES}", extra={'cycle': cycle + 1})
+                tester.logger.info(command.send_label)
+                if scheduler is not None:
+                    scheduler.mark(cycle * len(tester.COMMAND_SET) + command.index)
+                try:
+                    pipeline.send(command, (cycle, command), command.feedback_timeout)
+                except Exception as e:
+                    tester.logger.error(f"Exception while sending command: {e}")
+                    tester.error += 1
+                    state.counters['error'] += 1
+                    resolve(cycle, False)
+                next_send_at = now + tester.COMMAND_DELAY
+        else:
+            if item is not None and not at_boundary and pipeline.has_room():
+                wait = next_send_at - now
+            else:
+                wait = tester_feedback_timeout(tester, None)
+
+            for pending, fb in pipeline.poll(max(0.0, wait)):
+                if pending is None:
+                    # Not a command's reply (e.g. a late one after its timeout was counted),
+                    # reported as out_of_window_replies rather than as an error
+                    continue
+
+                cycle, command = pending.context
+                tester.current_cycle, tester.current_command = cycle, command
+                tester.latency.last_sent_ns = pending.sent_at_ns
+                if fb is None:
+                    # Same stand-in as the stop-and-wait path, so a silent device scores the same
+                    fb = getattr(tester, 'NO_REPLY_FEEDBACK', b'')
+                    tester.latency.last_ns = None
+                else:
+                    tester.latency.record(pending.command.key, clock.perf_counter_ns() - pending.sent_at_ns)
+                before = counter_values(tester)
+                feedback_value = tester.process_feedback(fb)
+                cycles[cycle].count(tester, before)
+                if feedback_value == 0:
+                    tester.logger.info(command.success_label)
+                else:
+                    tester.logger.warning(f"Command {command.index + 1}/{cycles[cycle].total} failed to receive valid feedback.")
+                resolve(cycle, feedback_value == 0)
+
+        # Report finished cycles in order
+        while next_report in cycles and cycles[next_report].remaining == 0:
+            cycle_success = cycles.pop(next_report).success
+            tester.emit_progress(tester.build_progress(next_report, cycle_success))
+            tester.logger.info(f"Cycle: {next_report + 1}/{tester.NUM_CYCLES} completed with status: {'Success' if cycle_success else 'Failed'}")
+            next_report += 1
+
+
+def log_pipeline_summary(tester):
+    pipeline = getattr(tester, 'pipeline', None)
+    if pipeline is None:
+        return
+    tester.logger.info(f"Pipeline: window {pipeline.window}, {pipeline.missing_replies} missing replies, "
+                       f"{pipeline.out_of_window_replies} unmatched replies")
+
+
+def pipeline_progress(tester):
+    pipeline = getattr(tester, 'pipeline', None)
+    if pipeline is None:
+        return {}
+    return {
+        'window': pipeline.window,
+        'outstanding': len(pipeline.outstanding),
+        'missing_replies': pipeline.missing_replies,
+        'out_of_window_replies': pipeline.out_of_window_replies
+    }
@@ -0,0 +1,241 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import serial
+from serial.tools import list_ports
+
+from feedback_decoder import FeedbackDecoder, Outcome
+from tester_registry import TESTER_CLASSES, load_feedback_table, normalize_commands
+
+FINGERPRINTS_FILE = 'port_fingerprints.json'  # Read by server.js for /api/serial-ports, next to hardware_tests.db
+DISCOVERY_BAUD_RATES = [115200, 9600]
+CONNECT_SETTLE_DELAY = 0.5  # Same settle delay as connect_serial()
+PROBE_TIMEOUT = 0.5
+
+# Identification probes: commands from each type's own vocabulary that only
+# query the device. QBA has none, all its commands press buttons, so a device
+# that answers but rejects every probe is taken for a QBA.
+SAFE_PROBES = {'qtap': ('i:',), 'qba': (), 'qbq': ('#:',), 'qswipe': ('i:',)}
+PROBES = sorted({probe for probes in SAFE_PROBES.values() for probe in probes})
+# Only sent when the safe probes leave candidates that it tells apart: QTap and
+# QSwipe both answer i: with 0, and only a QTap knows r:
+TIEBREAK_PROBES = {'qtap': ('r:',)}
+
+
+class Fingerprinter:
+    # Tells the hardware types apart by which probes a device knows. A reply to a
+    # command in a type's vocabulary has to be one of the codes in that type's
+    # feedback table; a command outside it must not get a success code of any type.
+
+    def __init__(self):
+        self.tables = {hardware_type: load_feedback_table(hardware_type) for hardware_type in TESTER_CLASSES}
+        self.decoders = {hardware_type: FeedbackDecoder(table) for hardware_type, table in self.tables.items()}
+        self.success_codes = {code for table in self.tables.values()
+                              for code, row in table.codes.items() if row[0] is Outcome.SUCCESS}
+
+    def vocabulary(self, hardware_type):
+        return SAFE_PROBES[hardware_type] + TIEBREAK_PROBES.get(hardware_type, ())
+
+    def consistent(self, hardware_type, probe, reply):
+        # Whether a device of this type could have sent `reply` (None = no reply) to `probe`
+        known = probe in self.vocabulary(hardware_type)
+        if reply is None:
+            return not known  # Unknown commands may be ignored, known ones are always answered
+        value = self.decoders[hardware_type].decode(reply).value
+        if known:
+            return value in self.tables[hardware_type].codes
+        return value not in self.success_codes
+
+    def candidates(self, replies):
+        return [hardware_type for hardware_type in sorted(TESTER_CLASSES)
+                if all(self.consistent(hardware_type, probe, reply) for probe, reply in replies.items())]
+
+    def tiebreak(self, candidates, replies):
+        # A probe that some but not all candidates know, or None
+        for hardware_type in candidates:
+            for probe in TIEBREAK_PROBES.get(hardware_type, ()):
+                if probe in replies:
+                    continue
+                knows = [probe in self.vocabulary(candidate) for candidate in candidates]
+                if any(knows) and not all(knows):
+                    return probe
+        return None
+
+
+def send_probe(conn, probe):
+    conn.reset_input_buffer()
+    conn.write(normalize_commands([probe])[0].encode())
+    return conn.readline().strip() or None
+
+
+def probe_port(fingerprinter, info, baud_rates, settle, timeout, tiebreak=True):
+    # Opens one port at each baud rate in turn until the device answers with
+    # decimal reply codes, and classifies it from its replies to the probes
+    started = time.perf_counter()
+    result = {**info, 'hardware_type': None, 'candidates': [], 'baud_rate': None, 'replies': {},
+              'status': 'silent', 'cached': False}
+    for baud_rate in baud_rates:
+        try:
+            conn = serial.Serial(info['port'], baud_rate, timeout=timeout)
+        except serial.SerialException as e:
+            result.update(status='error', error=str(e))
+            break
+        try:
+            time.sleep(settle)
+            replies = {probe: send_probe(conn, probe) for probe in PROBES}
+            answered = [reply for reply in replies.values() if reply is not None]
+            if not answered:
+                continue
+            if not all(reply.isdigit() for reply in answered):
+                # Usually the wrong baud rate
+                result.update(status='garbled', baud_rate=baud_rate,
+                              replies={probe: reply.hex() if reply else None for probe, reply in replies.items()})
+                continue
+
+            candidates = fingerprinter.candidates(replies)
+            probe = fingerprinter.tiebreak(candidates, replies) if tiebreak and len(candidates) > 1 else None
+            if probe is not None:
+                replies[probe] = send_probe(conn, probe)
+                candidates = fingerprinter.candidates(replies)
+        except serial.SerialException as e:
+            result.update(status='error', error=str(e))
+            break
+        finally:
+            conn.close()
+
+        status = 'identified' if len(candidates) == 1 else 'ambiguous' if candidates else 'unrecognized'
+        result.update(status=status, baud_rate=baud_rate, candidates=candidates,
+                      hardware_type=candidates[0] if len(candidates) == 1 else None,
+                      replies={probe: reply.decode() if reply else None for probe, reply in replies.items()})
+        break
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def candidate_ports(paths=None, skip=()):
+    # Port infos from the OS listing; explicit paths are kept in the given order
+    # and get the USB details of the listing entry with the same name, if any
+    listed = {}
+    for port in list_ports.comports():
+        listed[port.device] = {'port': port.device, 'serial_number': port.serial_number,
+                               'vid': port.vid, 'pid': port.pid, 'description': port.description}
+    if paths:
+        ports = [listed.get(path, {'port': path, 'serial_number': None, 'vid': None, 'pid': None,
+                                   'description': None}) for path in paths]
+    else:
+        ports = sorted(listed.values(), key=lambda info: info['port'])
+    return [info for info in ports if info['port'] not in set(skip)]
+
+
+def load_fingerprints(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable fingerprint cache {path}: {e}", file=sys.stderr)
+        return {}
+
+
+def save_fingerprints(path, fingerprints):
+    # Written to a temporary file and renamed into place, like checkpoints
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+def discover(ports, baud_rates=None, settle=CONNECT_SETTLE_DELAY, timeout=PROBE_TIMEOUT, fingerprints=None,
+             refresh=False, tiebreak=True, jobs=0):
+    # Probes every port at once, one thread each (or `jobs` at a time), except USB
+    # adapters whose serial number is already in `fingerprints`: those are answered
+    # from it without opening the port. New identifications are added to it.
+    baud_rates = baud_rates or DISCOVERY_BAUD_RATES
+    fingerprints = fingerprints if fingerprints is not None else {}
+    results = [None] * len(ports)
+    pending = []
+    for i, info in enumerate(ports):
+        cached = fingerprints.get(info['serial_number']) if info['serial_number'] and not refresh else None
+        if cached is not None:
+            results[i] = {**info, 'hardware_type': cached['hardware_type'], 'candidates': [cached['hardware_type']],
+                          'baud_rate': cached['baud_rate'], 'replies': cached['replies'], 'status': 'identified',
+                          'cached': True, 'elapsed_ms': 0.0}
+        else:
+            pending.append(i)
+
+    if pending:
+        fingerprinter = Fingerprinter()
+        with ThreadPoolExecutor(max_workers=jobs or len(pending)) as pool:
+            probed = pool.map(lambda i: probe_port(fingerprinter, ports[i], baud_rates, settle, timeout, tiebreak),
+                              pending)
+            for i, result in zip(pending, probed):
+                results[i] = result
+
+    for result in results:
+        if result['serial_number'] and result['status'] == 'identified' and not result['cached']:
+            fingerprints[result['serial_number']] = {
+                'hardware_type': result['hardware_type'],
+                'baud_rate': result['baud_rate'],
+                'replies': result['replies'],
+                'vid': result['vid'],
+                'pid': result['pid'],
+                'last_port': result['port'],
+                'fingerprinted_at': datetime.now().isoformat(timespec='seconds')
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find the hardware type and baud rate of the devices on serial ports')
+    parser.add_argument('--ports', type=str, nargs='+', default=None,
+                        help='Ports to probe (default: every port the OS lists)')
+    parser.add_argument('--skip', type=str, nargs='+', default=[],
+                        help='Ports to leave alone, e.g. ones running tests')
+    parser.add_argument('--bauds', type=int, nargs='+', default=DISCOVERY_BAUD_RATES,
+                        help='Baud rates to try, in order, until a device answers')
+    parser.add_argument('--settle', type=float, default=CONNECT_SETTLE_DELAY,
+                        help='Seconds to wait after opening a port before probing')
+    parser.add_argument('--timeout', type=float, default=PROBE_TIMEOUT, help='Seconds to wait for each probe reply')
+    parser.add_argument('--no-tiebreak', action='store_true',
+                        help='Only send the safe probes (#: and i:); QTap and QSwipe may then stay ambiguous')
+    parser.add_argument('--jobs', type=int, default=0, help='Ports probed at once, 0 = all of them')
+    parser.add_argument('--cache', type=str, default=FINGERPRINTS_FILE,
+                        help='Fingerprints by USB serial number, reused instead of probing')
+    parser.add_argument('--refresh', action='store_true', help='Probe every port even if its adapter is cached')
+    parser.add_argument('--no-cache', action='store_true', help='Neither read nor write the fingerprint cache')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON')
+
+    args = parser.parse_args()
+    fingerprints = {} if args.no_cache else load_fingerprints(args.cache)
+
+    started = time.perf_counter()
+    results = discover(candidate_ports(args.ports, args.skip), args.bauds, args.settle, args.timeout, fingerprints,
+                       args.refresh, not args.no_tiebreak, args.jobs)
+    elapsed = time.perf_counter() - started
+
+    if not args.no_cache and any(r['status'] == 'identified' and not r['cached'] and r['serial_number']
+                                 for r in results):
+        save_fingerprints(args.cache, fingerprints)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results))
+        sys.exit(0)
+
+    print(f"{'port':<16}  {'type':<8}  {'baud':>6}  {'status':<12}  replies")
+    for r in results:
+        hardware_type = r['hardware_type'] or '/'.join(r['candidates']) or '-'
+        replies = ' '.join(f"{probe} -> {reply or '-'}" for probe, reply in r['replies'].items())
+        source = ' (cached)' if r['cached'] else ''
+        print(f"{r['port']:<16}  {hardware_type:<8}  {r['baud_rate'] or '-':>6}  {r['status']:<12}  "
+              f"{replies}{source}{'  ' + r['error'] if 'error' in r else ''}")
+    identified = sum(1 for r in results if r['status'] == 'identified')
+    print(f"\n{identified} of {len(results)} ports identified in {elapsed:.2f}s")
@@ -0,0 +1,189 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+
+from latency_histogram import percentile_rank
+from tester_clock import SYSTEM_CLOCK
+
+WAIT_HISTORY = 1000
+
+
+class QueuedJob:
+    def __init__(self, job_id, ports, priority, payload, seq, submitted_at):
+        self.job_id = job_id
+        self.ports = ports  # Any of these will do, in order of preference
+        self.priority = priority
+        self.payload = payload
+        self.seq = seq
+        self.submitted_at = submitted_at
+        self.port = None  # Leased port
+        self.leased_at = None
+        self.state = 'queued'  # queued -> leased -> released, or queued -> cancelled
+
+    @property
+    def wait(self):
+        return self.leased_at - self.submitted_at if self.leased_at is not None else None
+
+
+class PortStats:
+    def __init__(self, now):
+        self.first_seen = now
+        self.leases = 0
+        self.busy_sec = 0.0  # Closed leases only, see PortScheduler.port_status()
+        self.holder = None
+        self.queue = []  # Heap of (-priority, seq, QueuedJob) that can run on this port
+
+
+class PortScheduler:
+    # Owns serial ports as leasable resources and queues jobs that want them. A
+    # job lists the ports it can run on (usually just its instance's port) and a
+    # priority; it gets the first free one at once, otherwise it waits. When a
+    # port frees up it goes to the highest-priority job queued for that port,
+    # first come first served within a priority. Each port has its own heap, so a
+    # job waiting on a busy port never holds up jobs behind it that could run on a
+    # free one. on_lease(job) is called outside the lock for every job that gets
+    # a port.
+
+    def __init__(self, on_lease, clock=SYSTEM_CLOCK):
+        self.on_lease = on_lease
+        self.clock = clock
+        self.ports = {}  # port -> PortStats
+        self.jobs = {}  # job_id -> QueuedJob, queued or leased
+        self.queued = 0
+        self.seq = itertools.count()
+        self.waits = deque(maxlen=WAIT_HISTORY)
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def port(self, name, now):
+        stats = self.ports.get(name)
+        if stats is None:
+            stats = self.ports[name] = PortStats(now)
+        return stats
+
+    def submit(self, job_id, ports, priority=0, payload=None):
+        # Returns the QueuedJob; its state says whether it got a port straight away
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('Scheduler is shut down')
+            if job_id in self.jobs:
+                raise ValueError(f"Job {job_id} is already queued or running")
+            if not ports:
+                raise ValueError(f"Job {job_id} needs at least one port")
+            now = self.clock.monotonic()
+            job = QueuedJob(job_id, list(dict.fromkeys(ports)), priority, payload, next(self.seq), now)
+            self.jobs[job_id] = job
+            stats = [self.port(name, now) for name in job.ports]
+            free = next((name for name, port in zip(job.ports, stats) if port.holder is None), None)
+            if free is not None:
+                self.lease(job, free, now)
+            else:
+                for name in job.ports:
+                    heapq.heappush(self.ports[name].queue, (-priority, job.seq, job))
+                self.queued += 1
+        if job.state == 'leased':
+            self.on_lease(job)
+        return job
+
+    def lease(self, job, name, now):
+        stats = self.ports[name]
+        stats.holder = job
+        stats.leases += 1
+        job.port = name
+        job.leased_at = now
+        job.state = 'leased'
+        self.waits.append(job.wait)
+
+    def release(self, job_id):
+        # Frees the job's port and hands it to the next job queued for it
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != 'leased':
+                return None
+            now = self.clock.monotonic()
+            stats = self.ports[job.port]
+            stats.busy_sec += now - job.leased_at
+            stats.holder = None
+            job.state = 'released'
+            del self.jobs[job_id]
+
+            queue = stats.queue
+            while queue and queue[0][2].state != 'queued':
+                heapq.heappop(queue)  # Leased elsewhere or cancelled since
+            if not queue or self.closed:
+                return None
+            _, _, next_job = heapq.heappop(queue)
+            self.queued -= 1
+            self.lease(next_job, job.port, now)
+        self.on_lease(next_job)
+        return next_job
+
+    def cancel(self, job_id):
+        # Takes a job that is still waiting off the queue; leased jobs are left to finish
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != 'queued':
+                return None
+            job.state = 'cancelled'
+            self.queued -= 1
+            del self.jobs[job_id]
+            return job
+
+    def close(self):
+        # Stops dispatching and cancels everything still queued, returns what was cancelled
+        with self.lock:
+            self.closed = True
+            cancelled = [job for job in self.jobs.values() if job.state == 'queued']
+            for job in cancelled:
+                job.state = 'cancelled'
+                del self.jobs[job.job_id]
+            self.queued = 0
+            return cancelled
+
+    def position(self, job_id):
+        # Jobs ahead of a queued job on its own ports, the best case for when it gets one
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state != 'queued':
+                return None
+            key = (-job.priority, job.seq)
+            return min(sum(1 for entry in self.ports[name].queue
+                           if entry[2].state == 'queued' and entry[:2] < key) for name in job.ports)
+
+    def port_status(self, name, stats, now):
+        busy = stats.busy_sec
+        if stats.holder is not None:
+            busy += now - stats.holder.leased_at
+        elapsed = now - stats.first_seen
+        return {
+            'port': name,
+            'job': stats.holder.job_id if stats.holder is not None else None,
+            'queued': sum(1 for entry in stats.queue if entry[2].state == 'queued'),
+            'leases': stats.leases,
+            'busy_sec': round(busy, 3),
+            'utilization': round(busy / elapsed, 4) if elapsed > 0 else None
+        }
+
+    def status(self):
+        # Queue depth, wait times and per-port utilization since each port was first asked for
+        with self.lock:
+            now = self.clock.monotonic()
+            waiting = [now - job.submitted_at for job in self.jobs.values() if job.state == 'queued']
+            history = sorted(self.waits)
+            waits = None
+            if history:
+                waits = {
+                    'count': len(history),
+                    'mean_ms': round(sum(history) / len(history) * 1000, 3),
+                    'p50_ms': round(history[percentile_rank(len(history), 50) - 1] * 1000, 3),
+                    'p95_ms': round(history[percentile_rank(len(history), 95) - 1] * 1000, 3),
+                    'max_ms': round(history[-1] * 1000, 3)
+                }
+            return {
+                'queue_depth': self.queued,
+                'oldest_wait_ms': round(max(waiting) * 1000, 3) if waiting else None,
+                'leased': len(self.jobs) - self.queued,
+                'waits': waits,
+                'ports': [self.port_status(name, stats, now) for name, stats in sorted(self.ports.items())]
+            }
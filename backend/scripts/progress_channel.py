@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import time
+
+
+class ProgressChannel:
+    # Newline-delimited JSON progress records, kept apart from human log output.
+    # With an fd (e.g. --progress-fd 3 from server.js) nothing else writes to it;
+    # without one records go to stdout as before, one write per line.
+    #
+    # interval > 0 coalesces records: at most one is sent per interval, carrying the
+    # latest (cumulative) counters and how many records it replaced. The last
+    # pending record is always sent on close().
+
+    def __init__(self, fd=None, interval=0.0, send=None):
+        self.fd = fd
+        self.interval = interval
+        self.send = send or self.write_line
+        self.seq = 0
+        self.pending = None
+        self.coalesced = 0
+        self.last_sent = None
+
+    def write_line(self, record):
+        line = json.dumps(record) + '\n'
+        if self.fd is None:
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            return
+        data = line.encode()
+        while data:
+            written = os.write(self.fd, data)
+            data = data[written:]
+
+    def emit(self, record):
+        self.seq += 1
+        record = {**record, 'seq': self.seq}
+        now = time.monotonic()
+        if self.interval <= 0 or self.last_sent is None or now - self.last_sent >= self.interval:
+            self.flush(record, now)
+        else:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = record
+
+    def flush(self, record=None, now=None):
+        if record is None:
+            record, self.pending = self.pending, None
+            if record is None:
+                return
+        else:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = None
+        if self.coalesced:
+            record['coalesced'] = self.coalesced
+            self.coalesced = 0
+        self.last_sent = now if now is not None else time.monotonic()
+        try:
+            self.send(record)
+        except OSError:
+            # Reader went away (server restarted), keep testing without progress
+            self.send = lambda record: None
+
+    def close(self):
+        self.flush()
+        if self.fd is not None:
+            try:
+                os.close(self.fd)
+            except OSError:
+                pass
+            self.fd = None
+            self.send = lambda record: None
+
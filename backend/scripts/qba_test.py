@@ -1,14 +1,48 @@
 import serial
-import time
 import logging
 import sys
 from datetime import datetime
 import os
 import argparse
-import json
+
+from latency_histogram import LatencyStats
+from progress_channel import ProgressChannel
+from command_set import compile_commands
+from control import control_progress, install_signal_handlers, open_control
+from early_stop import SPRT_ALPHA, SPRT_BETA, SequentialTest, check_early_stop, early_stop_progress, make_early_stop
+from feedback_decoder import FeedbackDecoder, Outcome, feedback_table
+from checkpoint import CHECKPOINT_INTERVAL, close_checkpointer, open_checkpointer
+from command_scheduler import make_scheduler, schedule_progress, target_rate
+from result_columns import (COLUMN_FORMATS, close_column_recorder, columns_progress, open_column_recorder,
+                            record_columns)
+from results_store import (RESULTS_BATCH_ROWS, close_result_store, open_result_store, record_result,
+                           results_progress)
+from serial_capture import CAPTURE_FRAMES, capture_progress, close_capture, open_capture
+from tester_clock import SYSTEM_CLOCK
+from tester_logging import (LOG_MODES, LOG_QUEUE_SIZE, OVERFLOW_POLICIES, IndexedFileHandler, install_log_handlers,
+                            logging_progress)
+from pipeline import MATCH_MODES, log_pipeline_summary, pipeline_progress, run_pipelined
+
+# Reply code -> (outcome, log level, log message), decoded by feedback_decoder.py
+FEEDBACK_TABLE = feedback_table(
+    codes={
+        0: (Outcome.SUCCESS, None, None),
+        13: (Outcome.TIMEOUT, logging.WARNING, "Timeout occurred."),
+    },
+    empty=(Outcome.ERROR, None, None),
+    other=(Outcome.ERROR, logging.ERROR, "Unexpected feedback code: {value}"),
+    invalid=(Outcome.ERROR, logging.ERROR, "ValueError in feedback processing: {error}"),
+    parse='text',
+)
 
 class QBATester:
-    def __init__(self, port, baud_rate, num_cycles, commands, command_delay, instance_id, project_name):
+    def __init__(self, port, baud_rate, num_cycles, commands, command_delay, instance_id, project_name, serial_conn=None,
+                 window=1, match_mode='order', rate=None,
+                 log_mode='sync', log_queue_size=LOG_QUEUE_SIZE, log_overflow='block',
+                 progress_fd=None, progress_interval=0.0, results_db=None, results_batch=RESULTS_BATCH_ROWS,
+                 columns_format=None, columns_interval=0.0, checkpoint_interval=CHECKPOINT_INTERVAL, resume=False,
+                 early_stop=None, control_fd=None, capture_frames=0,
+                 record_session=False, clock=None):
         self.SERIAL_PORT = port
         self.BAUD_RATE = baud_rate
         self.NUM_CYCLES = num_cycles
@@ -16,17 +50,50 @@ class QBATester:
         self.COMMAND_DELAY = command_delay
         self.INSTANCE_ID = instance_id
         self.PROJECT_NAME = project_name
+        self.LOG_MODE = log_mode
+        self.LOG_QUEUE_SIZE = log_queue_size
+        self.LOG_OVERFLOW = log_overflow
         self.SUCCESS_CODE = 0
         self.TIMEOUT_CODE = 13
+        self.FEEDBACK_TIMEOUT = 1  # readline timeout in seconds
+        self.WINDOW = window  # Outstanding commands allowed in pipelined mode, 1 = stop-and-wait
+        self.MATCH_MODE = match_mode
         
         self.count = 0
         self.error = 0
         self.timeout = 0
         self.success_flag = 0
         self.is_running = True
+        self.clock = clock or SYSTEM_CLOCK  # Time and sleeps; a VirtualClock runs delays and timeouts in simulated time
+        self.latency = LatencyStats(self.clock)  # Per-command round-trip histograms
+        self.scheduler = make_scheduler(rate, self.clock)  # Deadline pacing at `rate` commands/sec, None = sleep COMMAND_DELAY
+        self.progress_channel = ProgressChannel(progress_fd, progress_interval)  # NDJSON progress records
+        # Pre-encoded payloads and log labels; run() has always sent an extra newline after each command
+        self.decoder = FeedbackDecoder(FEEDBACK_TABLE)
+        self.COMMAND_SET = self.compile_command_set(self.COMMANDS)
         
         self.setup_logging()
-        self.connect_serial()
+        self.current_cycle = 0  # Cycle and CompiledCommand the next reply belongs to, for the results store
+        self.current_command = None
+        self.results = open_result_store(self, results_db, results_batch)  # Per-command rows in SQLite, None = off
+        self.columns = open_column_recorder(self, columns_format, columns_interval)  # Array-backed columns, None = off
+        self.early_stop = make_early_stop(early_stop)  # Sequential pass/fail test on the failure rate, None = off
+        # Periodic snapshots to resume from; with resume, counters and histograms are restored here
+        self.checkpointer, self.start_cycle = open_checkpointer(self, checkpoint_interval, resume)
+        # Pause/resume/stop and live delay or command set changes from --control-fd, signals or the daemon
+        self.control = open_control(self, control_fd)
+        self.owns_serial_conn = serial_conn is None
+        if serial_conn is not None:
+            self.serial_conn = serial_conn  # Port opened and owned by the caller
+        else:
+            self.connect_serial()
+        # Raw frames in a ring, written around failures instead of logging every command,
+        # or with record_session every frame for replay.py; None = off
+        self.capture = open_capture(self, capture_frames, record_session)
+
+    def compile_command_set(self, commands):
+        # run() has always sent an extra newline after each command, live command set changes too
+        return compile_commands(self, [command + '\n' for command in commands])
 
     def setup_logging(self):
         current_date = datetime.now().strftime("%Y-%m-%d")
@@ -41,63 +108,76 @@ class QBATester:
         
         # File handler - use project name and instance ID for the log file name
         log_file = os.path.join(self.log_dir, f'{self.PROJECT_NAME}_{self.INSTANCE_ID}.log')
-        file_handler = logging.FileHandler(log_file)
+        self.log_file = log_file
+        file_handler = IndexedFileHandler(log_file)
         file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-        self.logger.addHandler(file_handler)
         
         # Stream handler
         stream_handler = logging.StreamHandler(sys.stdout)
         stream_handler.setFormatter(logging.Formatter('%(message)s'))
-        self.logger.addHandler(stream_handler)
+        
+        # Both handlers sit behind one handler that times logging and, in async mode, queues it
+        self.log_handler = install_log_handlers(self.logger, [file_handler, stream_handler], self.LOG_MODE,
+                                                self.LOG_QUEUE_SIZE, self.LOG_OVERFLOW)
 
     def connect_serial(self):
         try:
-            self.serial_conn = serial.Serial(self.SERIAL_PORT, self.BAUD_RATE, timeout=1)
+            self.serial_conn = serial.Serial(self.SERIAL_PORT, self.BAUD_RATE, timeout=self.FEEDBACK_TIMEOUT)
             self.logger.info(f"Connected to {self.SERIAL_PORT} at {self.BAUD_RATE} baud.")
         except serial.SerialException as e:
             self.logger.error(f"Failed to connect to {self.SERIAL_PORT}: {e}")
             sys.exit(1)
 
-    def wait_for_feedback(self):
+    def wait_for_feedback(self, command):
         try:
-            fb = self.serial_conn.readline().strip()
-            self.logger.info(f"Feedback: {fb}")
-            
-            if fb:
-                feedback_value = int(fb)
-                if feedback_value == self.SUCCESS_CODE:
-                    self.success_flag = 1
-                elif feedback_value == self.TIMEOUT_CODE:
-                    self.success_flag = 0
-                    self.logger.warning("Timeout occurred.")
-                    self.timeout += 1
-                else:
-                    self.success_flag = 0
-                    self.logger.error(f"Unexpected feedback code: {feedback_value}")
-                    self.error += 1
-            else:
-                self.error += 1
-                
-        except ValueError as ve:
-            self.logger.error(f"ValueError in feedback processing: {ve}")
-            self.error += 1
+            raw = self.serial_conn.readline()
+            if raw.endswith(b'\n'):
+                self.latency.record_reply(command.key)
+            self.process_feedback(raw.strip())
         except Exception as e:
             self.logger.error(f"Exception while processing feedback: {e}")
             self.error += 1
+            self.count += 1
             
+        if self.scheduler is None:
+            self.clock.sleep(self.COMMAND_DELAY)
+
+    def process_feedback(self, fb):
+        self.logger.info(f"Feedback: {fb}")
+        decoded = self.decoder.decode(fb)
+        if decoded.message:
+            self.logger.log(decoded.level, decoded.message)
+        
+        if decoded.outcome is Outcome.SUCCESS:
+            self.success_flag = 1
+        else:
+            self.success_flag = 0
+            if decoded.outcome is Outcome.TIMEOUT:
+                self.timeout += 1
+            else:
+                self.error += 1
+        
         self.count += 1
-        time.sleep(self.COMMAND_DELAY)
+        if self.results is not None:
+            record_result(self, decoded)
+        if self.columns is not None:
+            record_columns(self, decoded)
+        
+        # Return feedback value for validation
+        return decoded.value
 
     def send_command(self, command):
         if not self.is_running:
             return
             
-        self.logger.info(f"Sending command: {command}")
+        self.current_command = command
+        self.logger.info(command.send_label)
         try:
-            self.serial_conn.write(command.encode())
-            self.wait_for_feedback()
+            self.latency.mark_sent()
+            self.serial_conn.write(command.payload)
+            self.wait_for_feedback(command)
         except serial.SerialTimeoutException:
-            self.logger.error(f"Timeout while sending command: {command}")
+            self.logger.error(f"Timeout while sending command: {command.text}")
         except Exception as e:
             self.logger.error(f"Exception while sending command: {e}")
 
@@ -107,34 +187,87 @@ class QBATester:
         self.cleanup()
 
     def cleanup(self):
-        if hasattr(self, 'serial_conn'):
+        self.log_handler.overflow = 'block'  # Never drop the end-of-run summary
+        self.logger.setLevel(logging.INFO)  # --capture only quiets the run itself
+        self.progress_channel.close()  # Sends the last coalesced progress record
+        if hasattr(self, 'serial_conn') and self.owns_serial_conn:
             self.serial_conn.close()
             self.logger.info("Serial connection closed.")
         
         self.logger.info(f"Total commands executed: {self.count}")
         self.logger.info(f"Total errors encountered: {self.error}")
         self.logger.info(f"Total timeouts encountered: {self.timeout}")
+        self.latency.log_summary(self.logger)
+        if self.scheduler:
+            self.scheduler.log_summary(self.logger)
+        log_pipeline_summary(self)
+        if self.early_stop is not None:
+            self.early_stop.log_summary(self.logger)
+        self.control.log_summary(self.logger)
+        close_result_store(self)
+        close_column_recorder(self)
+        close_checkpointer(self)
+        close_capture(self)
+        self.log_handler.log_summary(self.logger, self.count)
         self.logger.info(f"Total cycles completed: {self.count // len(self.COMMANDS)}")
+        self.log_handler.flush()
+
+    def build_progress(self, cycle, cycle_success=None):
+        progress = {
+            'cycle': cycle + 1,
+            'total_cycles': self.NUM_CYCLES,
+            'errors': self.error,
+            'timeouts': self.timeout,
+            'latency_ms': self.latency.summary()
+        }
+        if cycle_success is not None:
+            progress['cycle_completed'] = cycle_success
+        progress.update(pipeline_progress(self))
+        progress.update(schedule_progress(self))
+        progress.update(logging_progress(self))
+        progress.update(results_progress(self))
+        progress.update(columns_progress(self))
+        progress.update(early_stop_progress(self))
+        progress.update(control_progress(self))
+        progress.update(capture_progress(self))
+        return progress
+
+    def emit_progress(self, progress):
+        self.progress_channel.emit(progress)
+        if self.columns is not None:
+            self.columns.maybe_write()
+        if self.capture is not None:
+            self.capture.cycle_completed(self, progress)
+        if self.early_stop is not None and check_early_stop(self, progress['cycle']):
+            self.is_running = False  # Pass or fail is decided, the remaining cycles wouldn't change it
+        if self.checkpointer is not None:
+            self.checkpointer.cycle_completed(self, progress['cycle'])
 
     def run(self):
         try:
-            for cycle in range(self.NUM_CYCLES):
+            if self.WINDOW > 1:
+                # QBA keeps sending the rest of a cycle after a failed command
+                run_pipelined(self, stop_on_failure=False)
+                return
+            
+            for cycle in range(self.start_cycle, self.NUM_CYCLES):
+                if self.control.pending:
+                    # Pause, delay and command set changes only ever apply between cycles
+                    self.control.at_cycle_boundary(self, cycle)
                 if not self.is_running:
                     break
-                    
-                for command in self.COMMANDS:
+                
+                self.logger.info(f"Starting cycle {cycle + 1}/{self.NUM_CYCLES}", extra={'cycle': cycle + 1})
+                self.current_cycle = cycle
+                for command in self.COMMAND_SET:
                     if not self.is_running:
                         break
-                    self.send_command(command + '\n')
-                
-                progress = {
-                    'cycle': cycle + 1,
-                    'total_cycles': self.NUM_CYCLES,
-                    'errors': self.error,
-                    'timeouts': self.timeout
-                }
+                    if self.scheduler:
+                        # Wait for this command's slot on the absolute schedule
+                        self.scheduler.wait(cycle * len(self.COMMAND_SET) + command.index)
+                    self.send_command(command)
                 
-                print(json.dumps(progress))
+                self.emit_progress(self.build_progress(cycle))
                 self.logger.info(f"Cycle: {cycle + 1}/{self.NUM_CYCLES} completed.")
                 
         except KeyboardInterrupt:
@@ -153,11 +286,67 @@ if __name__ == "__main__":
                        help='Commands to execute')
     parser.add_argument('--id', type=str, required=True, help='Instance ID')
     parser.add_argument('--project', type=str, required=True, help='Project Name')
+    parser.add_argument('--window', type=int, default=1,
+                       help='Commands kept in flight (pipelined mode when > 1)')
+    parser.add_argument('--match', type=str, default='order', choices=MATCH_MODES,
+                       help='Match replies to commands by order or by sequence tag')
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, default=None,
+                       help='Pace commands on a fixed schedule at this many commands/sec instead of --delay')
+    pacing.add_argument('--cycles-per-hour', type=float, default=None,
+                       help='Pace commands on a fixed schedule to run this many cycles per hour instead of --delay')
+    parser.add_argument('--log-mode', type=str, default='sync', choices=LOG_MODES,
+                       help='sync writes log lines inline, async hands them to a background writer thread')
+    parser.add_argument('--log-queue-size', type=int, default=LOG_QUEUE_SIZE, help='Async log queue capacity')
+    parser.add_argument('--log-overflow', type=str, default='block', choices=OVERFLOW_POLICIES,
+                       help='When the async log queue is full: block, or drop INFO records')
+    parser.add_argument('--progress-fd', type=int, default=None,
+                       help='File descriptor for NDJSON progress records (default: stdout, mixed with log lines)')
+    parser.add_argument('--progress-interval', type=float, default=0.0,
+                       help='Send at most one progress record per this many seconds, 0 sends every record')
+    parser.add_argument('--results-db', type=str, default=None,
+                       help='SQLite database for per-command results, e.g. hardware_tests.db (default: off)')
+    parser.add_argument('--results-batch', type=int, default=RESULTS_BATCH_ROWS,
+                       help='Result rows written per transaction')
+    parser.add_argument('--columns', type=str, default=None, choices=COLUMN_FORMATS,
+                       help='Keep every command outcome in memory as columns and write them next to the log as .npz or .parquet')
+    parser.add_argument('--columns-interval', type=float, default=0.0,
+                       help='Also rewrite the columns file every this many seconds, 0 writes it only at the end')
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                       help='Seconds between checkpoints in logs/checkpoints (default 0: off)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue from the last checkpoint of this project and instance ID')
+    parser.add_argument('--sprt', type=float, nargs=2, default=None, metavar=('P0', 'P1'),
+                       help='Stop early once a sequential test decides the failure rate is P0 (pass) or P1 (fail)')
+    parser.add_argument('--sprt-alpha', type=float, default=SPRT_ALPHA, help='Risk of failing a unit at P0')
+    parser.add_argument('--sprt-beta', type=float, default=SPRT_BETA, help='Risk of passing a unit at P1')
+    parser.add_argument('--sprt-min-cycles', type=int, default=0, help='Cycles to run before deciding')
+    parser.add_argument('--control-fd', type=int, default=None,
+                       help='File descriptor to read pause/resume/stop/set requests from, e.g. 0 for stdin')
+    parser.add_argument('--capture', type=int, nargs='?', const=CAPTURE_FRAMES, default=0, metavar='FRAMES',
+                       help='Keep the last FRAMES raw serial frames in memory and write them around each failure '
+                            'to a .qcap file next to the log, instead of logging every command')
+    parser.add_argument('--record', action='store_true',
+                       help='Write every raw serial frame of the session to a .qcap file next to the log, '
+                            'for replay.py')
 
     args = parser.parse_args()
     
     # Add newline to commands if not present
     commands = [cmd if cmd.endswith('\n') else cmd + '\n' for cmd in args.commands]
+    early_stop = None
+    if args.sprt:
+        early_stop = SequentialTest(*args.sprt, args.sprt_alpha, args.sprt_beta, args.sprt_min_cycles)
     
-    tester = QBATester(args.port, args.baud, args.cycles, commands, args.delay, args.id, args.project)
+    tester = QBATester(args.port, args.baud, args.cycles, commands, args.delay, args.id, args.project,
+                       window=args.window, match_mode=args.match,
+                       rate=target_rate(args.rate, args.cycles_per_hour, len(commands)),
+                       log_mode=args.log_mode, log_queue_size=args.log_queue_size, log_overflow=args.log_overflow,
+                       progress_fd=args.progress_fd, progress_interval=args.progress_interval,
+                       results_db=args.results_db, results_batch=args.results_batch,
+                       columns_format=args.columns, columns_interval=args.columns_interval,
+                       checkpoint_interval=args.checkpoint_interval, resume=args.resume,
+                       early_stop=early_stop, control_fd=args.control_fd,
+                       capture_frames=args.capture, record_session=args.record)
+    install_signal_handlers(tester)
     tester.run()
\ No newline at end of file
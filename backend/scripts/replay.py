@@ -0,0 +1,205 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from serial_capture import read_capture
+from simulators import ClockedSerial
+from tester_clock import SYSTEM_CLOCK, VirtualClock
+from tester_logging import target_handlers
+from tester_registry import load_tester_class, normalize_commands
+
+
+class ReplaySerial(ClockedSerial):
+    # Serial port stand-in that plays a session recorded with --record back to a
+    # tester. Replies recorded after the tester's n-th write become readable once
+    # the tester has made its n-th write, at their recorded offset from it (divided
+    # by `speed`). On a VirtualClock shared with the tester that costs no real
+    # time, and the tester's delays, schedule and reply deadlines play out on the
+    # same simulated clock as the replies.
+
+    def __init__(self, frames, clock, timeout=1, speed=1.0):
+        super().__init__(clock, timeout, 'replay')
+        self.frames = frames  # [(t_ns, 'TX'/'RX', data), ...] in recorded order
+        self.position = 0  # Next frame not yet written or released
+        self.speed = speed
+        self.anchor = (frames[0][0] if frames else 0, clock.perf_counter_ns())  # (recorded, clock) ns of the last write
+        self.writes = 0
+        self.mismatches = 0  # Writes that differ from the recorded ones
+        self.extra_writes = 0  # Writes after the recording ran out
+
+    def release(self):
+        # Queue the replies recorded before the next write, timed from the last one
+        recorded_ns, clock_ns = self.anchor
+        while self.position < len(self.frames) and self.frames[self.position][1] == 'RX':
+            t_ns, _, data = self.frames[self.position]
+            self.incoming.append((clock_ns + int((t_ns - recorded_ns) / self.speed), data))
+            self.position += 1
+
+    def write(self, data):
+        self.writes += 1
+        self.release()  # Replies recorded before the first write
+        if self.position >= len(self.frames):
+            self.extra_writes += 1
+            return len(data)
+        t_ns, _, recorded = self.frames[self.position]
+        self.position += 1
+        if bytes(data) != recorded:
+            self.mismatches += 1
+        self.anchor = (t_ns, self.clock.perf_counter_ns())
+        self.release()
+        return len(data)
+
+    def reset_input_buffer(self):
+        # Replies to earlier writes all arrived before the next one, drop them like the port would
+        self.incoming.clear()
+        self.buffer.clear()
+
+    def summary(self):
+        return {
+            'writes': self.writes,
+            'mismatched_writes': self.mismatches,
+            'extra_writes': self.extra_writes,
+            'unplayed_frames': len(self.frames) - self.position + len(self.incoming)
+        }
+
+
+def load_session(path):
+    # Returns (session info, recorded summary or None, frames). Raises ValueError
+    # for files that aren't session recordings, such as --capture failure windows.
+    segments = read_capture(path)
+    try:
+        session = json.loads(segments[0]['reason'])['session'] if segments else None
+    except (ValueError, KeyError, TypeError):
+        session = None
+    if session is None:
+        raise ValueError(f"{path} is not a session recording (written with --record)")
+    expected = None
+    frames = []
+    for segment in segments:
+        frames += segment['frames']
+        if segment['reason'].startswith('{"summary"'):
+            expected = json.loads(segment['reason'])['summary']
+    return session, expected, frames
+
+
+def replay_session(path, realtime=False, speed=1.0, instance_id=None):
+    # Runs the recorded tester's own run() against the recording and compares its
+    # counters with the ones the recorded run ended with. Without realtime the
+    # tester runs on a VirtualClock, as fast as it can decode.
+    session, expected, frames = load_session(path)
+    if realtime:
+        clock = SYSTEM_CLOCK
+    else:
+        clock, speed = VirtualClock(), 1.0
+    conn = ReplaySerial(frames, clock, session['timeout'], speed)
+    options = {'rate': session['rate'] * speed if session['rate'] else None}
+    if 'window' in session:
+        options['window'] = session['window']
+        options['match_mode'] = session['match_mode']
+    if 'feedback_timeouts' in session:
+        options['feedback_timeouts'] = session['feedback_timeouts']
+    tester_class = load_tester_class(session['hardware_type'])
+    instance_id = instance_id or os.path.splitext(os.path.basename(path))[0]
+    tester = tester_class(conn.port, conn.baudrate, session['cycles'] - session['start_cycle'],
+                          normalize_commands(session['commands']), session['delay'] / speed, instance_id, 'replay',
+                          serial_conn=conn, checkpoint_interval=0, clock=clock, **options)
+    # The log file keeps every line; errors are what recordings are kept for, so not even those on the console
+    for handler in target_handlers(tester.logger):
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(logging.CRITICAL)
+    cycles = []
+    tester.progress_channel.send = lambda record: cycles.append(record.get('cycle_completed'))
+
+    started = time.perf_counter()
+    tester.run()
+    elapsed = time.perf_counter() - started
+    tester.log_handler.close()
+
+    replayed = {
+        'commands': tester.count,
+        'errors': tester.error,
+        'timeouts': tester.timeout,
+        'cycles': len(cycles),
+        'failed_cycles': cycles.count(False)
+    }
+    return {
+        'path': path,
+        'hardware_type': session['hardware_type'],
+        **replayed,
+        'elapsed_sec': round(elapsed, 6),
+        'commands_per_sec': round(tester.count / elapsed, 1) if elapsed > 0 else 0.0,
+        'port': conn.summary(),
+        'expected': expected,
+        'match': expected == replayed if expected is not None else None
+    }
+
+
+def replay_task(task):
+    path, realtime, speed = task
+    try:
+        return replay_session(path, realtime, speed)
+    except (OSError, ValueError) as e:
+        return {'path': path, 'error': str(e)}
+
+
+def capture_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in names if name.endswith('.qcap')]
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay recorded serial sessions (.qcap) through the tester scripts')
+    parser.add_argument('paths', type=str, nargs='+', help='Session recordings, or directories to search for them')
+    parser.add_argument('--realtime', action='store_true',
+                        help='Replay at the recorded timing instead of as fast as possible')
+    parser.add_argument('--speed', type=float, default=1.0, help='With --realtime, replay this many times faster')
+    parser.add_argument('--repeat', type=int, default=1, help='Replay each recording this many times (benchmarking)')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes, 0 = one per CPU')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON')
+
+    args = parser.parse_args()
+    tasks = [(path, args.realtime, args.speed) for path in capture_files(args.paths) for _ in range(args.repeat)]
+    if not tasks:
+        sys.exit("No recordings found")
+
+    started = time.perf_counter()
+    if len(tasks) > 1 and args.jobs != 1:
+        with ProcessPoolExecutor(max_workers=args.jobs or None) as pool:
+            results = list(pool.map(replay_task, tasks))
+    else:
+        results = list(map(replay_task, tasks))
+    elapsed = time.perf_counter() - started
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    replayed = [r for r in results if 'error' not in r]
+    mismatched = [r for r in replayed if r['match'] is False]
+    for r in results:
+        if 'error' in r:
+            print(f"{r['path']}: skipped, {r['error']}")
+            continue
+        status = {True: 'OK', False: 'MISMATCH', None: 'no recorded summary'}[r['match']]
+        print(f"{r['path']}: {r['commands']} commands, {r['errors']} errors, {r['timeouts']} timeouts, "
+              f"{r['cycles']} cycles ({r['failed_cycles']} failed) in {r['elapsed_sec']:.3f}s, "
+              f"{r['commands_per_sec']} commands/sec - {status}")
+        if r['match'] is False:
+            print(f"    recorded: {r['expected']}")
+        if r['port']['mismatched_writes'] or r['port']['extra_writes']:
+            print(f"    port: {r['port']}")
+    commands = sum(r['commands'] for r in replayed)
+    print(f"\n{len(replayed)} replays, {commands} commands in {elapsed:.3f}s "
+          f"({round(commands / elapsed, 1) if elapsed > 0 else 0.0} commands/sec), {len(mismatched)} mismatched")
+    if mismatched:
+        sys.exit(1)
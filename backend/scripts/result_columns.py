@@ -0,0 +1,255 @@
+import argparse
+import array
+import ast
+import os
+import sys
+import time
+import zipfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from tester_clock import SYSTEM_CLOCK
+
+COLUMN_FORMATS = ('npz', 'parquet')
+CHUNK_ROWS = 65536  # Rows preallocated per chunk, columns grow a chunk at a time
+
+# name -> array typecode. 1M commands take about 31 MB
+COLUMNS = (
+    ('cycle', 'I'),
+    ('cmd_idx', 'H'),
+    ('t_send_ns', 'q'),  # Wall clock, ns since the epoch
+    ('latency_ns', 'q'),
+    ('code', 'q'),
+    ('outcome', 'b'),
+)
+NO_LATENCY = -1  # latency_ns when no reply arrived
+NO_CODE = -(2 ** 63)  # code when the reply wasn't a number, or one too big for int64
+CODE_MAX = 2 ** 63 - 1  # Garbled replies parse as little-endian integers, 9+ bytes don't fit
+OUTCOME_CODES = {'success': 0, 'timeout': 1, 'error': 2}
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_KINDS = {'b': 'i', 'h': 'i', 'i': 'i', 'l': 'i', 'q': 'i', 'B': 'u', 'H': 'u', 'I': 'u', 'L': 'u', 'Q': 'u'}
+
+
+def npy_descr(typecode):
+    itemsize = array.array(typecode).itemsize
+    if itemsize == 1:
+        return f"|{NPY_KINDS[typecode]}1"
+    return f"{'<' if sys.byteorder == 'little' else '>'}{NPY_KINDS[typecode]}{itemsize}"
+
+
+def npy_header(typecode, rows):
+    # .npy v1.0: magic, header length, then a dict literal padded so the data starts on a 64-byte boundary
+    header = f"{{'descr': '{npy_descr(typecode)}', 'fortran_order': False, 'shape': ({rows},), }}"
+    header += ' ' * (-(len(NPY_MAGIC) + 2 + len(header) + 1) % 64) + '\n'
+    return NPY_MAGIC + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+
+class ResultColumns:
+    # One preallocated array per column, filled in place by append(). Nothing is
+    # allocated per command; a new chunk of CHUNK_ROWS rows is added when the
+    # current one is full.
+
+    def __init__(self, chunk_rows=CHUNK_ROWS):
+        self.chunk_rows = chunk_rows
+        self.chunks = [[] for _ in COLUMNS]
+        self.current = None
+        self.fill = chunk_rows
+        self.rows = 0
+
+    def grow(self):
+        self.current = []
+        for (_, typecode), chunks in zip(COLUMNS, self.chunks):
+            chunk = array.array(typecode, bytes(array.array(typecode).itemsize * self.chunk_rows))
+            chunks.append(chunk)
+            self.current.append(chunk)
+        self.fill = 0
+
+    def append(self, cycle, cmd_idx, t_send_ns, latency_ns, code, outcome):
+        if self.fill == self.chunk_rows:
+            self.grow()
+        i = self.fill
+        cycles, cmd_idxs, t_sends, latencies, codes, outcomes = self.current
+        cycles[i] = cycle
+        cmd_idxs[i] = cmd_idx
+        t_sends[i] = t_send_ns
+        latencies[i] = latency_ns
+        codes[i] = code if NO_CODE < code <= CODE_MAX else NO_CODE
+        outcomes[i] = outcome
+        self.fill = i + 1
+        self.rows += 1
+
+    def column_bytes(self, index):
+        # The filled part of each chunk, in order, without copying
+        chunks = self.chunks[index]
+        for n, chunk in enumerate(chunks):
+            view = memoryview(chunk).cast('B')
+            if n == len(chunks) - 1:
+                view = view[:self.fill * chunk.itemsize]
+            yield view
+
+    def nbytes(self):
+        return sum(chunk.itemsize * len(chunk) for chunks in self.chunks for chunk in chunks)
+
+    def write_npz(self, path):
+        # Same layout numpy.savez writes, so np.load(path) reads it without numpy being needed here
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for index, (name, typecode) in enumerate(COLUMNS):
+                with zf.open(f'{name}.npy', 'w', force_zip64=True) as f:
+                    f.write(npy_header(typecode, self.rows))
+                    for view in self.column_bytes(index):
+                        f.write(view)
+
+    def write_parquet(self, path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        types = {'b': pa.int8(), 'H': pa.uint16(), 'I': pa.uint32(), 'q': pa.int64()}
+        columns = {}
+        for index, (name, typecode) in enumerate(COLUMNS):
+            buffer = pa.py_buffer(b''.join(self.column_bytes(index)))
+            columns[name] = pa.Array.from_buffers(types[typecode], self.rows, [None, buffer])
+        pq.write_table(pa.table(columns), path)
+
+    def write(self, path, fmt='npz'):
+        # Written beside the final file and renamed over it, readers never see a partial file
+        tmp_path = path + '.tmp'
+        if fmt == 'parquet':
+            self.write_parquet(tmp_path)
+        else:
+            self.write_npz(tmp_path)
+        os.replace(tmp_path, path)
+
+
+class ColumnRecorder:
+    # Feeds a tester's per-command outcomes into ResultColumns and writes them
+    # next to the log at the end of the run and every `interval` seconds
+
+    def __init__(self, path, fmt='npz', interval=0.0, clock=SYSTEM_CLOCK):
+        if fmt not in COLUMN_FORMATS:
+            raise ValueError(f"Invalid columns format: {fmt}")
+        self.path = path
+        self.format = fmt
+        self.interval = interval
+        self.columns = ResultColumns()
+        self.wall_base_ns = time.time_ns() - clock.perf_counter_ns()  # Send times (clock.perf_counter_ns) -> epoch ns
+        self.writes = 0
+        self.write_ms = 0.0
+        self.last_write = time.monotonic()
+
+    def record(self, cycle, command_index, decoded, sent_ns, latency_ns):
+        self.columns.append(
+            cycle + 1, command_index, self.wall_base_ns + sent_ns if sent_ns is not None else 0,
+            latency_ns if latency_ns is not None else NO_LATENCY,
+            decoded.value if decoded.value is not None else NO_CODE, OUTCOME_CODES[decoded.outcome.value]
+        )
+
+    def write(self):
+        start = time.perf_counter()
+        self.columns.write(self.path, self.format)
+        self.write_ms = (time.perf_counter() - start) * 1000
+        self.writes += 1
+        self.last_write = time.monotonic()
+
+    def maybe_write(self):
+        if self.interval > 0 and time.monotonic() - self.last_write >= self.interval:
+            self.write()
+
+    def summary(self):
+        return {
+            'path': self.path,
+            'rows': self.columns.rows,
+            'buffer_mb': round(self.columns.nbytes() / 2 ** 20, 2),
+            'writes': self.writes,
+            'last_write_ms': round(self.write_ms, 2)
+        }
+
+    def log_summary(self, logger):
+        s = self.summary()
+        logger.info(f"Result columns: {s['rows']} rows ({s['buffer_mb']} MB buffered) written to {s['path']} "
+                    f"in {s['last_write_ms']} ms")
+
+
+def open_column_recorder(tester, fmt, interval=0.0):
+    # None when columns aren't being recorded. The file sits next to the log, one per run
+    if not fmt:
+        return None
+    base, _ = os.path.splitext(tester.log_file)
+    path = f"{base}_{time.strftime('%H%M%S')}.{fmt}"
+    return ColumnRecorder(path, fmt, interval, clock=tester.clock)
+
+
+def record_columns(tester, decoded):
+    # Same call site and bookkeeping as results_store.record_result
+    latency = tester.latency
+    tester.columns.record(tester.current_cycle, tester.current_command.index, decoded,
+                          latency.last_sent_ns, latency.last_ns)
+
+
+def close_column_recorder(tester):
+    recorder = tester.columns
+    if recorder is None:
+        return
+    try:
+        recorder.write()
+    except (OSError, ImportError) as e:
+        tester.logger.error(f"Failed to write result columns to {recorder.path}: {e}")
+        return
+    recorder.log_summary(tester.logger)
+
+
+def columns_progress(tester):
+    recorder = getattr(tester, 'columns', None)
+    if recorder is None:
+        return {}
+    return {'columns': recorder.summary()}
+
+
+def read_npz(path):
+    # Loads a columns file into numpy arrays, or array.array columns without numpy
+    if np is not None:
+        with np.load(path) as data:
+            return {name: data[name] for name in data.files}
+    columns = {}
+    with zipfile.ZipFile(path) as zf:
+        for name, typecode in COLUMNS:
+            with zf.open(f'{name}.npy') as f:
+                magic = f.read(len(NPY_MAGIC))
+                if magic != NPY_MAGIC:
+                    raise ValueError(f"{path}: {name}.npy is not a version 1.0 .npy file")
+                header = ast.literal_eval(f.read(int.from_bytes(f.read(2), 'little')).decode('latin1'))
+                if header['descr'] != npy_descr(typecode):
+                    raise ValueError(f"{path}: unexpected type {header['descr']} for {name}")
+                column = array.array(typecode)
+                column.frombytes(f.read())
+                columns[name] = column
+    return columns
+
+
+def read_columns(path):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    return read_npz(path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarise a result columns file (.npz or .parquet)')
+    parser.add_argument('path', type=str, help='File written by a tester run with --columns')
+
+    args = parser.parse_args()
+    start = time.perf_counter()
+    columns = read_columns(args.path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    totals = {}
+    for cmd_idx, outcome in zip(columns['cmd_idx'], columns['outcome']):
+        counts = totals.setdefault(int(cmd_idx), [0, 0])
+        counts[0] += 1
+        counts[1] += outcome != OUTCOME_CODES['success']
+    print(f"{len(columns['cycle'])} rows loaded in {load_ms:.1f} ms")
+    for cmd_idx, (total, failures) in sorted(totals.items()):
+        print(f"command {cmd_idx}: {total} sent, failure rate {failures / total:.6f}")
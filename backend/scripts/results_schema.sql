@@ -0,0 +1,38 @@
+-- Per-command results, written by the testers (results_store.py) and read by
+-- server.js; both create the tables from this file.
+-- test_runs and command_totals hold running counters, rewritten with every batch,
+-- so whole-run failure rates never need a scan of command_results.
+CREATE TABLE IF NOT EXISTS test_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    instance_id TEXT NOT NULL,
+    project_name TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    commands INTEGER DEFAULT 0,
+    successes INTEGER DEFAULT 0,
+    timeouts INTEGER DEFAULT 0,
+    errors INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS command_results (
+    run_id INTEGER NOT NULL,
+    instance_id TEXT NOT NULL,
+    cycle INTEGER NOT NULL,
+    command_index INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    t_send REAL,  -- When the command was sent, epoch seconds
+    completed_at REAL NOT NULL,
+    latency_ms REAL,
+    code INTEGER,  -- NULL for no reply, or one outside SQLite's 64-bit integers
+    outcome TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS command_totals (
+    run_id INTEGER NOT NULL,
+    command_index INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    timeouts INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    PRIMARY KEY (run_id, command_index)
+);
+CREATE INDEX IF NOT EXISTS idx_command_results_instance_cycle ON command_results (instance_id, cycle);
+CREATE INDEX IF NOT EXISTS idx_test_runs_instance ON test_runs (instance_id);
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from tester_clock import SYSTEM_CLOCK
+
+RESULTS_BATCH_ROWS = 500  # Rows per transaction
+RESULTS_BATCH_MS = 1000  # Longest a row waits in memory before it is written
+BUSY_TIMEOUT_MS = 5000  # The server and other testers share the database file
+
+# Table definitions shared with server.js
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results_schema.sql')
+CODE_MIN, CODE_MAX = -2 ** 63, 2 ** 63 - 1  # SQLite integers are signed 64-bit
+
+INSERT_RESULT = '''INSERT INTO command_results
+    (run_id, instance_id, cycle, command_index, command, t_send, completed_at, latency_ms, code, outcome)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+
+UPDATE_RUN = '''UPDATE test_runs SET commands = ?, successes = ?, timeouts = ?, errors = ?, finished_at = ?
+    WHERE run_id = ?'''
+
+UPSERT_TOTALS = '''INSERT OR REPLACE INTO command_totals (run_id, command_index, command, total, timeouts, errors)
+    VALUES (?, ?, ?, ?, ?, ?)'''
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    # WAL lets the server read while testers write; NORMAL only syncs at checkpoints
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with open(SCHEMA_FILE) as f:
+        conn.executescript(f.read())
+    return conn
+
+
+class ResultStore:
+    # Buffers per-command outcomes in memory and writes them to command_results
+    # in one transaction every `batch_rows` rows or `batch_ms` milliseconds,
+    # whichever comes first, so the send path never waits on a commit
+
+    def __init__(self, db_path, instance_id, project_name, batch_rows=RESULTS_BATCH_ROWS, batch_ms=RESULTS_BATCH_MS,
+                 clock=SYSTEM_CLOCK):
+        self.db_path = db_path
+        self.instance_id = instance_id
+        self.batch_rows = max(1, batch_rows)
+        self.batch_interval = batch_ms / 1000
+        self.rows = []
+        self.counts = {'success': 0, 'timeout': 0, 'error': 0}
+        self.totals = {}  # command index -> [command, total, timeouts, errors]
+        self.written = 0
+        self.lost = 0
+        self.batches = 0
+        self.write_ns = 0
+        self.conn = connect(db_path)
+        self.run_id = self.conn.execute(
+            'INSERT INTO test_runs (instance_id, project_name, started_at) VALUES (?, ?, ?)',
+            (instance_id, project_name, time.time())
+        ).lastrowid
+        self.wall_base_ns = time.time_ns() - clock.perf_counter_ns()  # Send times (clock.perf_counter_ns) -> epoch ns
+        self.last_flush = time.monotonic()
+
+    def record(self, cycle, command, decoded, sent_ns, latency_ns):
+        outcome = decoded.outcome.value
+        self.counts[outcome] += 1
+        totals = self.totals.get(command.index)
+        if totals is None:
+            totals = self.totals[command.index] = [command.key, 0, 0, 0]
+        totals[1] += 1
+        if outcome == 'timeout':
+            totals[2] += 1
+        elif outcome == 'error':
+            totals[3] += 1
+        code = decoded.value
+        if code is not None and not CODE_MIN <= code <= CODE_MAX:
+            code = None  # sqlite3 would raise OverflowError, which isn't a sqlite3.Error
+        self.rows.append((
+            self.run_id, self.instance_id, cycle + 1, command.index, command.key,
+            (self.wall_base_ns + sent_ns) / 1e9 if sent_ns is not None else None, time.time(),
+            latency_ns / 1e6 if latency_ns is not None else None, code, outcome
+        ))
+        if len(self.rows) >= self.batch_rows or time.monotonic() - self.last_flush >= self.batch_interval:
+            self.flush()
+
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.rows or self.conn is None:
+            return
+        start = time.perf_counter_ns()
+        rows, self.rows = self.rows, []
+        commands = self.written + self.lost + len(rows)
+        try:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(INSERT_RESULT, rows)
+            self.conn.execute(UPDATE_RUN, (commands, self.counts['success'], self.counts['timeout'],
+                                           self.counts['error'], time.time(), self.run_id))
+            self.conn.executemany(UPSERT_TOTALS, [(self.run_id, index, *totals) for index, totals in self.totals.items()])
+            self.conn.execute('COMMIT')
+        except sqlite3.Error:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            self.lost += len(rows)  # Counted rather than retried, so a broken database can't stall the run
+            raise
+        self.written += len(rows)
+        self.batches += 1
+        self.write_ns += time.perf_counter_ns() - start
+
+    def close(self):
+        if self.conn is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def summary(self):
+        return {
+            'run_id': self.run_id,
+            'rows': self.written,
+            'pending': len(self.rows),
+            'lost': self.lost,
+            'batches': self.batches,
+            'write_us_per_row': round(self.write_ns / self.written / 1000, 3) if self.written else 0.0
+        }
+
+    def log_summary(self, logger):
+        s = self.summary()
+        logger.info(f"Results: {s['rows']} rows in {s['batches']} batches to {self.db_path} (run {s['run_id']}), "
+                    f"{s['lost']} lost, {s['write_us_per_row']} us per row")
+
+
+def open_result_store(tester, db_path, batch_rows=RESULTS_BATCH_ROWS):
+    # None when results aren't being recorded, a failing database never stops a test
+    if not db_path:
+        return None
+    try:
+        return ResultStore(db_path, tester.INSTANCE_ID, tester.PROJECT_NAME, batch_rows, clock=tester.clock)
+    except sqlite3.Error as e:
+        tester.logger.error(f"Failed to open results database {db_path}: {e}")
+        return None
+
+
+def record_result(tester, decoded):
+    # Called from process_feedback; the run loop keeps current_cycle and
+    # current_command pointing at the command the reply belongs to
+    store = tester.results
+    if store is None:
+        return
+    try:
+        store.record(tester.current_cycle, tester.current_command, decoded, tester.latency.last_sent_ns,
+                     tester.latency.last_ns)
+    except sqlite3.Error as e:
+        tester.logger.error(f"Failed to write results to {store.db_path}: {e}")
+
+
+def close_result_store(tester):
+    store = tester.results
+    if store is None:
+        return
+    try:
+        store.close()
+    except sqlite3.Error as e:
+        tester.logger.error(f"Failed to write results to {store.db_path}: {e}")
+    store.log_summary(tester.logger)
+
+
+def results_progress(tester):
+    store = getattr(tester, 'results', None)
+    if store is None:
+        return {}
+    return {'results': store.summary()}
+
+
+def failure_rates(conn, instance_id, run_id=None, cycles=None):
+    # Whole-run figures come straight from the counter tables; only a cycle range
+    # reads command_results, through the (instance_id, cycle) index
+    runs = conn.execute(
+        'SELECT run_id, started_at, finished_at, commands, successes, timeouts, errors FROM test_runs '
+        'WHERE instance_id = ? ORDER BY run_id', (instance_id,)
+    ).fetchall()
+    if run_id is None and runs:
+        run_id = runs[-1][0]
+
+    if cycles is None:
+        query = ('SELECT command_index, command, total, timeouts, errors FROM command_totals '
+                 'WHERE run_id = ? ORDER BY command_index')
+        params = [run_id]
+    else:
+        query = ('SELECT command_index, command, COUNT(*), SUM(outcome = \'timeout\'), SUM(outcome = \'error\') '
+                 'FROM command_results WHERE instance_id = ? AND cycle BETWEEN ? AND ? AND run_id = ? '
+                 'GROUP BY command_index ORDER BY command_index')
+        params = [instance_id, *cycles, run_id]
+
+    commands = []
+    for index, command, total, timeouts, errors in conn.execute(query, params):
+        commands.append({
+            'index': index, 'command': command, 'total': total, 'timeouts': timeouts, 'errors': errors,
+            'failure_rate': round((timeouts + errors) / total, 6) if total else 0.0
+        })
+    return {
+        'instance': instance_id,
+        'run_id': run_id,
+        'runs': [{
+            'run_id': r[0], 'started_at': r[1], 'finished_at': r[2], 'commands': r[3], 'successes': r[4],
+            'timeouts': r[5], 'errors': r[6], 'failure_rate': round((r[5] + r[6]) / r[3], 6) if r[3] else 0.0
+        } for r in runs],
+        'commands': commands
+    }
+
+
+def parse_cycles(value):
+    first, _, last = value.partition('-')
+    return int(first), int(last or first)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Failure rates from the command_results table')
+    parser.add_argument('--db', type=str, default='hardware_tests.db', help='Path to hardware_tests.db')
+    parser.add_argument('--id', type=str, required=True, help='Instance ID')
+    parser.add_argument('--run', type=int, default=None, help='Run ID (default: the latest run)')
+    parser.add_argument('--cycles', type=parse_cycles, default=None, help='Cycle range, e.g. 100-200')
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+    try:
+        print(json.dumps(failure_rates(conn, args.id, args.run, args.cycles), indent=2))
+    finally:
+        conn.close()
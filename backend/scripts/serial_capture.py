@@ -0,0 +1,356 @@
+import argparse
+import array
+import json
+import logging
+import os
+import struct
+import sys
+import time
+
+from tester_clock import SYSTEM_CLOCK
+from tester_registry import TESTER_CLASSES
+
+CAPTURE_FRAMES = 64  # Default frames kept from before a failure for --capture
+CAPTURE_AFTER_RATIO = 4  # A quarter as many frames are captured after it before the window is written
+
+# Capture file (.qcap): a header, then records, all little-endian.
+#   header   '<4sBq'  magic, version, wall-clock ns at perf_counter_ns() == 0
+#   segment  '<BIH'   SEGMENT, cycle (1-based), reason length, then the reason (UTF-8)
+#   frame    '<BqH'   TX or RX, perf_counter_ns() when the bytes were written/read, length, then the bytes
+# Each segment holds the frames of one failure window in order. Frames are never
+# written twice, overlapping windows continue where the previous one stopped.
+# A session recording (--record) is one segment whose reason is JSON describing
+# the run ({"session": ...}) holding every frame, then an empty {"summary": ...}
+# segment with the final counters.
+CAPTURE_MAGIC = b'QCAP'
+CAPTURE_VERSION = 1
+HEADER = struct.Struct('<4sBq')
+SEGMENT_HEADER = struct.Struct('<BIH')
+FRAME_HEADER = struct.Struct('<BqH')
+SEGMENT, TX, RX = 0x53, 0x54, 0x52  # 'S', 'T', 'R'
+MAX_FRAME_BYTES = 0xffff
+
+
+def frame_records(t_ns, direction, data):
+    # A frame longer than the length field allows is split into several
+    parts = []
+    for i in range(0, max(1, len(data)), MAX_FRAME_BYTES):
+        chunk = data[i:i + MAX_FRAME_BYTES]
+        parts.append(FRAME_HEADER.pack(direction, t_ns, len(chunk)))
+        parts.append(chunk)
+    return parts
+
+
+def segment_record(cycle, reason):
+    reason = reason.encode()[:0xffff]
+    return SEGMENT_HEADER.pack(SEGMENT, cycle, len(reason)) + reason
+
+
+class FrameRing:
+    # Fixed-size ring of timestamped TX/RX frames. Appending is a few stores into
+    # preallocated slots, the oldest frame is overwritten once the ring is full.
+
+    def __init__(self, capacity, clock=SYSTEM_CLOCK):
+        self.capacity = max(1, capacity)
+        self.clock = clock
+        self.times = array.array('q', bytes(8 * self.capacity))
+        self.directions = bytearray(self.capacity)
+        self.data = [b''] * self.capacity
+        self.seq = 0  # Frames appended so far; frame n sits in slot n % capacity
+
+    def append(self, direction, data):
+        slot = self.seq % self.capacity
+        self.times[slot] = self.clock.perf_counter_ns()
+        self.directions[slot] = direction
+        self.data[slot] = data
+        self.seq += 1
+
+    def frames(self, first, last):
+        # Frames first..last-1 (by sequence number) that are still in the ring
+        first = max(first, self.seq - self.capacity)
+        for n in range(first, last):
+            slot = n % self.capacity
+            yield self.times[slot], self.directions[slot], self.data[slot]
+
+
+class CaptureSerial:
+    # Stands in for the tester's serial port and hands every write and every
+    # non-empty read to `recorder.record()`. Everything else goes straight to the port.
+
+    def __init__(self, serial_conn, recorder):
+        object.__setattr__(self, 'serial_conn', serial_conn)
+        object.__setattr__(self, 'recorder', recorder)
+
+    def __getattr__(self, name):
+        return getattr(self.serial_conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.serial_conn, name, value)  # e.g. timeout, set by read_feedback() and the pipeline
+
+    def write(self, data):
+        self.recorder.record(TX, bytes(data))
+        return self.serial_conn.write(data)
+
+    def read(self, size=1):
+        data = self.serial_conn.read(size)
+        if data:
+            self.recorder.record(RX, data)
+        return data
+
+    def read_until(self, expected=b'\n', size=None):
+        data = self.serial_conn.read_until(expected, size)
+        if data:
+            self.recorder.record(RX, data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.serial_conn.readline(size)
+        if data:
+            self.recorder.record(RX, data)
+        return data
+
+
+class FailureCapture:
+    # Writes the frames around each failing cycle to a capture file: up to
+    # `before` frames leading up to it and `after` frames following it.
+
+    def __init__(self, path, before=CAPTURE_FRAMES, after=CAPTURE_FRAMES // CAPTURE_AFTER_RATIO, clock=SYSTEM_CLOCK):
+        self.path = path
+        self.before = before
+        self.after = after
+        self.clock = clock
+        self.ring = FrameRing(before + after, clock)
+        self.file = None
+        self.written_seq = 0  # Frames before this have been written (or dropped)
+        self.pending = None  # (cycle, reason, first frame)
+        self.flush_at = None  # Sequence number at which the open window is complete
+        self.segments = 0
+        self.frames_written = 0
+        self.failures = 0
+        self.last_failures = 0
+
+    def open_file(self):
+        self.file = open(self.path, 'wb')
+        self.file.write(HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, time.time_ns() - self.clock.perf_counter_ns()))
+
+    def record(self, direction, data):
+        self.ring.append(direction, data)
+        if self.flush_at is not None and self.ring.seq >= self.flush_at:
+            self.flush()  # The open window has its frames from after the failure
+
+    def trigger(self, cycle, reason):
+        self.failures += 1
+        if self.pending is not None:
+            self.flush()  # Close the open window here, the new one carries on from it
+        first = max(self.written_seq, self.ring.seq - self.before)
+        self.pending = (cycle, reason, first)
+        self.flush_at = self.ring.seq + self.after
+
+    def flush(self):
+        if self.pending is None:
+            return
+        cycle, reason, first = self.pending
+        self.pending = self.flush_at = None
+        last = self.ring.seq
+        if self.file is None:
+            self.open_file()
+        parts = [segment_record(cycle, reason)]
+        for t_ns, direction, data in self.ring.frames(first, last):
+            parts += frame_records(t_ns, direction, data)
+            self.frames_written += 1
+        self.file.write(b''.join(parts))
+        self.file.flush()
+        self.written_seq = last
+        self.segments += 1
+
+    def cycle_completed(self, tester, progress):
+        # Called with every progress record: any new error or timeout opens a window.
+        # Goes by the counters rather than the cycle status, QBA carries on through
+        # failed commands and QBQ/QSwipe report a cycle as failed on a 48 reply.
+        failures = tester.error + tester.timeout
+        if failures > self.last_failures:
+            command = tester.current_command.key if tester.current_command is not None else None
+            self.trigger(progress['cycle'], f"{failures - self.last_failures} new errors/timeouts "
+                                            f"({tester.error} errors, {tester.timeout} timeouts), last command {command}")
+        self.last_failures = failures
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def summary(self):
+        return {
+            'path': self.path if self.segments else None,
+            'frames': self.ring.seq,
+            'failures': self.failures,
+            'windows_written': self.segments,
+            'frames_written': self.frames_written
+        }
+
+    def log_summary(self, logger):
+        s = self.summary()
+        logger.info(f"Serial capture: {s['frames']} frames seen, {s['failures']} failing cycles, "
+                    f"{s['frames_written']} frames in {s['windows_written']} windows"
+                    + (f" written to {s['path']}" if s['path'] else ""))
+
+
+class SessionRecorder:
+    # Writes every frame of the run to the capture file as it goes, for replay.py.
+    # Same interface as FailureCapture; logging is left as it is.
+
+    def __init__(self, path, tester):
+        self.path = path
+        self.tester = tester
+        self.clock = tester.clock
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION, time.time_ns() - self.clock.perf_counter_ns()))
+        self.file.write(segment_record(0, json.dumps({'session': session_info(tester)})))
+        self.initial = (tester.count, tester.error, tester.timeout)  # Past 0 when resuming from a checkpoint
+        self.frames = 0
+        self.failures = 0
+        self.last_failures = tester.error + tester.timeout
+        self.cycles = 0
+        self.failed_cycles = 0
+
+    def record(self, direction, data):
+        self.file.write(b''.join(frame_records(self.clock.perf_counter_ns(), direction, data)))
+        self.frames += 1
+
+    def cycle_completed(self, tester, progress):
+        self.cycles += 1
+        if progress.get('cycle_completed') is False:
+            self.failed_cycles += 1
+        failures = tester.error + tester.timeout
+        if failures > self.last_failures:
+            self.failures += 1
+        self.last_failures = failures
+
+    def close(self):
+        if self.file is None:
+            return
+        count, error, timeout = self.initial
+        summary = {
+            # This session's share only, so a replay from cycle 1 can be checked against it
+            'commands': self.tester.count - count,
+            'errors': self.tester.error - error,
+            'timeouts': self.tester.timeout - timeout,
+            'cycles': self.cycles,
+            'failed_cycles': self.failed_cycles
+        }
+        self.file.write(segment_record(self.cycles, json.dumps({'summary': summary})))
+        self.file.close()
+        self.file = None
+
+    def summary(self):
+        return {
+            'path': self.path,
+            'frames': self.frames,
+            'failures': self.failures,
+            'windows_written': 1,
+            'frames_written': self.frames
+        }
+
+    def log_summary(self, logger):
+        logger.info(f"Serial recording: {self.frames} frames written to {self.path}")
+
+
+def session_info(tester):
+    # What replay.py needs to build the same tester and send the same commands
+    script = os.path.basename(sys.modules[type(tester).__module__].__file__)
+    hardware_type = next(t for t, (module, _) in TESTER_CLASSES.items() if script == module + '.py')
+    info = {
+        'hardware_type': hardware_type,
+        'commands': [command.strip() for command in tester.COMMANDS],
+        'cycles': tester.NUM_CYCLES,
+        'start_cycle': tester.start_cycle,
+        'delay': tester.COMMAND_DELAY,
+        'rate': tester.scheduler.RATE if tester.scheduler is not None else None,
+        'timeout': tester.serial_conn.timeout
+    }
+    if hasattr(tester, 'WINDOW'):
+        info['window'] = tester.WINDOW
+        info['match_mode'] = tester.MATCH_MODE
+    if hasattr(tester, 'FEEDBACK_TIMEOUTS'):
+        info['feedback_timeouts'] = tester.FEEDBACK_TIMEOUTS
+    return info
+
+
+def open_capture(tester, frames, record=False):
+    # None unless --capture or --record is on. Wraps the tester's port (call once
+    # it's open). --capture turns the per-command INFO log lines off: only warnings,
+    # errors, the failure windows in the capture file and the end-of-run summary
+    # are kept. --record keeps the log and writes every frame.
+    if not frames and not record:
+        return None
+    base, _ = os.path.splitext(tester.log_file)
+    path = f"{base}_{time.strftime('%H%M%S')}.qcap"
+    if record:
+        capture = SessionRecorder(path, tester)
+    else:
+        capture = FailureCapture(path, frames, max(1, frames // CAPTURE_AFTER_RATIO), tester.clock)
+        tester.logger.setLevel(logging.WARNING)
+    tester.serial_conn = CaptureSerial(tester.serial_conn, capture)
+    return capture
+
+
+def close_capture(tester):
+    capture = tester.capture
+    if capture is None:
+        return
+    try:
+        capture.close()
+    except OSError as e:
+        tester.logger.error(f"Failed to write serial capture {capture.path}: {e}")
+        return
+    capture.log_summary(tester.logger)
+
+
+def capture_progress(tester):
+    capture = getattr(tester, 'capture', None)
+    if capture is None:
+        return {}
+    return {'capture': capture.summary()}
+
+
+def read_capture(path):
+    # Returns [{'cycle', 'reason', 'frames': [(epoch ns, 'TX'/'RX', bytes), ...]}, ...]
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, wall_base_ns = HEADER.unpack_from(data, 0)
+    if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+        raise ValueError(f"{path} is not a version {CAPTURE_VERSION} capture file")
+    segments = []
+    offset = HEADER.size
+    while offset < len(data):
+        kind = data[offset]
+        if kind == SEGMENT:
+            _, cycle, length = SEGMENT_HEADER.unpack_from(data, offset)
+            offset += SEGMENT_HEADER.size
+            segments.append({'cycle': cycle, 'reason': data[offset:offset + length].decode(), 'frames': []})
+        elif kind in (TX, RX):
+            _, t_ns, length = FRAME_HEADER.unpack_from(data, offset)
+            offset += FRAME_HEADER.size
+            segments[-1]['frames'].append((wall_base_ns + t_ns, 'TX' if kind == TX else 'RX', data[offset:offset + length]))
+        else:
+            raise ValueError(f"{path}: unknown record type {kind:#x} at offset {offset}")
+        offset += length
+    return segments
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Print the failure windows or session in a serial capture file (.qcap)')
+    parser.add_argument('path', type=str, help='File written by a tester run with --capture or --record')
+
+    args = parser.parse_args()
+    try:
+        segments = read_capture(args.path)
+    except (OSError, ValueError, struct.error) as e:
+        sys.exit(f"Failed to read {args.path}: {e}")
+    for segment in segments:
+        print(f"== cycle {segment['cycle']}: {segment['reason']}")
+        start = segment['frames'][0][0] if segment['frames'] else 0
+        for t_ns, direction, data in segment['frames']:
+            stamp = time.strftime('%H:%M:%S', time.localtime(t_ns / 1e9))
+            print(f"{stamp}.{t_ns % 10 ** 9 // 10 ** 6:03d} +{(t_ns - start) / 1e6:10.3f} ms  {direction}  {data!r}")
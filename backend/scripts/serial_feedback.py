@@ -0,0 +1,67 @@
+import math
+
+from tester_clock import SYSTEM_CLOCK
+
+# Timing of the original sleep-and-poll wait_for_feedback loop, used to estimate
+# how much round-trip latency the event-driven read saves
+LEGACY_PRE_READ_DELAY = 0.2
+LEGACY_POLL_INTERVAL = 0.1
+LEGACY_TIMEOUT = 2
+
+DEFAULT_FEEDBACK_TIMEOUT = 2  # seconds
+
+
+def command_type(command):
+    # Command type is everything up to and including the first ':' ('i:', 'BR:', 'e:', '#:')
+    head, sep, _ = command.strip().partition(':')
+    return head + sep
+
+
+def parse_feedback_timeouts(values):
+    # Turn CLI values like ['i:=0.5', 'BR:=3'] into {'i:': 0.5, 'BR:': 3.0}
+    timeouts = {}
+    for value in values or []:
+        prefix, sep, seconds = value.rpartition('=')
+        if not sep or not prefix:
+            raise ValueError(f"Invalid feedback timeout '{value}', expected <command type>=<seconds>")
+        timeouts[command_type(prefix)] = float(seconds)
+    return timeouts
+
+
+def feedback_timeout(command, timeouts, default=DEFAULT_FEEDBACK_TIMEOUT):
+    if command is None:
+        return default
+    return timeouts.get(command_type(command), default)
+
+
+def read_feedback(serial_conn, timeout, terminator=b'\n', clock=SYSTEM_CLOCK):
+    # Block on the port until a full line arrives or the deadline passes.
+    # read_until waits in select() on the serial fd, so it returns as soon as the
+    # terminator is received instead of on the next poll tick.
+    if serial_conn.timeout != timeout:
+        # Changing the timeout reconfigures the port, so only do it when needed
+        serial_conn.timeout = timeout
+
+    start = clock.perf_counter()
+    fb = serial_conn.read_until(terminator)
+    elapsed = clock.perf_counter() - start
+
+    timed_out = not fb.endswith(terminator)
+    return fb.strip(), elapsed, timed_out
+
+
+def legacy_poll_latency(elapsed, timed_out):
+    # Time the old loop would have taken to return the same reply: a fixed
+    # 200 ms sleep, then 100 ms polls of in_waiting for up to 2 s
+    if timed_out:
+        return LEGACY_PRE_READ_DELAY + LEGACY_TIMEOUT
+    if elapsed <= LEGACY_PRE_READ_DELAY:
+        return LEGACY_PRE_READ_DELAY
+    polls = math.ceil((elapsed - LEGACY_PRE_READ_DELAY) / LEGACY_POLL_INTERVAL)
+    return LEGACY_PRE_READ_DELAY + polls * LEGACY_POLL_INTERVAL
+
+
+def tester_feedback_timeout(tester, command):
+    # QBA uses a single readline timeout, the other testers a per-command-type table
+    default = getattr(tester, 'FEEDBACK_TIMEOUT', DEFAULT_FEEDBACK_TIMEOUT)
+    return feedback_timeout(command, getattr(tester, 'FEEDBACK_TIMEOUTS', {}), default)
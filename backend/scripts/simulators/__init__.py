@@ -0,0 +1,30 @@
+from .devices import DEVICE_TYPES, ERROR_CODE, FaultInjector, QBADevice, QBQDevice, QSwipeDevice, QTapDevice, SimulatedDevice
+from .latency import LatencyModel
+from .pty_device import PtySimulator
+from .virtual_serial import ClockedSerial, VirtualSerial
+
+
+def start_simulator(hardware_type, latency='fixed:0', seed=None, link=None, reply_success_code=False, busy_time=0.0,
+                    **fault_rates):
+    # Convenience for benchmarks and scripts: build a device and serve it on a new pty
+    device = DEVICE_TYPES[hardware_type](
+        latency=LatencyModel.parse(latency, seed),
+        faults=FaultInjector(seed=seed, **fault_rates),
+        reply_success_code=reply_success_code,
+        busy_time=busy_time
+    )
+    simulator = PtySimulator(device, link)
+    simulator.start()
+    return simulator
+
+
+def virtual_simulator(hardware_type, latency='fixed:0', seed=None, reply_success_code=False, busy_time=0.0, clock=None,
+                      timeout=1, **fault_rates):
+    # Same device as start_simulator(), behind a VirtualSerial for a tester running on `clock`
+    device = DEVICE_TYPES[hardware_type](
+        latency=LatencyModel.parse(latency, seed),
+        faults=FaultInjector(seed=seed, **fault_rates),
+        reply_success_code=reply_success_code,
+        busy_time=busy_time
+    )
+    return VirtualSerial(device, clock, timeout)
@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import DEVICE_TYPES, start_simulator
+from .latency import parse_duration
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='python -m simulators',
+                                     description='Serve simulated QTap/QBA/QBQ/QSwipe devices on pseudo-terminals')
+    parser.add_argument('devices', type=str, nargs='+', choices=sorted(DEVICE_TYPES), help='Device types to simulate')
+    parser.add_argument('--latency', type=str, default='fixed:5ms',
+                        help='Reply latency: fixed:5ms, uniform:2ms:8ms, normal:5ms:1ms, lognormal:5ms:0.5 or exp:5ms')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Fraction of commands answered with the timeout code')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of commands answered with an error code')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Fraction of commands never answered')
+    parser.add_argument('--garbage-rate', type=float, default=0.0, help='Fraction of commands answered with undecodable bytes')
+    parser.add_argument('--reply-success-code', action='store_true',
+                        help='Reply with the device success code (48 for QBQ/QSwipe) instead of 0')
+    parser.add_argument('--busy-time', type=str, default='0',
+                        help='Recovery time after each reply (e.g. 20ms), commands sent sooner get the timeout code')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for latency and faults')
+    parser.add_argument('--link-dir', type=str, default=None,
+                        help='Also create stable symlinks <link-dir>/<type>_<n> to each pty')
+
+    args = parser.parse_args()
+    if os.name != 'posix':
+        sys.exit('Simulators need POSIX pseudo-terminals')
+
+    simulators = {}
+    for n, hardware_type in enumerate(args.devices, start=1):
+        link = os.path.join(args.link_dir, f'{hardware_type}_{n}') if args.link_dir else None
+        simulators[f'{hardware_type}_{n}'] = start_simulator(
+            hardware_type, args.latency, args.seed, link, args.reply_success_code, parse_duration(args.busy_time),
+            timeout_rate=args.timeout_rate, error_rate=args.error_rate,
+            drop_rate=args.drop_rate, garbage_rate=args.garbage_rate
+        )
+
+    print(json.dumps({name: sim.path for name, sim in simulators.items()}), flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for name, sim in simulators.items():
+            sim.stop()
+            print(json.dumps({'device': name, **sim.device.stats}), flush=True)
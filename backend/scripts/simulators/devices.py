@@ -0,0 +1,138 @@
+import random
+import re
+import time
+from collections import Counter
+
+from .latency import LatencyModel
+
+ERROR_CODE = 1  # Reply for commands the device rejects or injected errors
+
+# Pipelined testers (--match tag) prefix commands with '@<seq>:' and expect the
+# same tag in front of the reply
+TAG_PATTERN = re.compile(r'@(\d+):(.*)')
+
+FAULT_KINDS = ('timeout', 'error', 'drop', 'garbage')
+
+
+class FaultInjector:
+    # Per-command fault probabilities:
+    #   timeout - reply with the device's timeout code
+    #   error   - reply with ERROR_CODE
+    #   drop    - never reply
+    #   garbage - reply with undecodable bytes
+
+    def __init__(self, timeout_rate=0.0, error_rate=0.0, drop_rate=0.0, garbage_rate=0.0, seed=None):
+        self.rates = {'timeout': timeout_rate, 'error': error_rate, 'drop': drop_rate, 'garbage': garbage_rate}
+        if sum(self.rates.values()) > 1:
+            raise ValueError("Fault rates must add up to at most 1")
+        self.rng = random.Random(seed)
+
+    def pick(self):
+        roll = self.rng.random()
+        for kind in FAULT_KINDS:
+            roll -= self.rates[kind]
+            if roll < 0:
+                return kind
+        return None
+
+    def garbage(self):
+        # Bytes >= 0x80 never decode to a digit and never form a valid code via int.from_bytes
+        return bytes(self.rng.randint(0x80, 0xff) for _ in range(2))
+
+
+class SimulatedDevice:
+    NAME = None
+    SUCCESS_CODE = 0
+    TIMEOUT_CODE = 13
+    ACK_CODE = 0  # What every tester accepts as a valid reply before moving on
+    COMMANDS = ()
+
+    def __init__(self, latency=None, faults=None, reply_success_code=False, busy_time=0.0):
+        self.latency = latency or LatencyModel()
+        self.faults = faults or FaultInjector()
+        self.reply_code = self.SUCCESS_CODE if reply_success_code else self.ACK_CODE
+        self.busy_time = busy_time  # Recovery time after each reply, commands arriving sooner time out
+        self.ready_at = 0.0
+        self.stats = Counter()
+
+    def accepts(self, command):
+        return any(pattern.fullmatch(command) for pattern in self.COMMANDS)
+
+    def handle(self, line, now=None):
+        # Returns (reply bytes or None, latency in seconds) for one received line.
+        # `now` is the arrival time on the caller's clock, time.monotonic() by default.
+        command = line.decode('utf-8', errors='replace').strip()
+        if not command:
+            return None, 0.0  # Blank lines (e.g. QBA's doubled newline) are ignored
+
+        tag = b''
+        match = TAG_PATTERN.fullmatch(command)
+        if match:
+            tag = f'@{match.group(1)}:'.encode()
+            command = match.group(2)
+
+        self.stats['commands'] += 1
+        latency = self.latency.sample()
+        if now is None:
+            now = time.monotonic()
+        if now < self.ready_at - 1e-9:
+            # Still recovering from the last command, like real hardware driven too fast.
+            # A command sent the moment the reply arrives (on a VirtualClock) is in time.
+            self.stats['busy'] += 1
+            return tag + str(self.TIMEOUT_CODE).encode() + b'\r\n', latency
+        self.ready_at = now + latency + self.busy_time
+
+        fault = self.faults.pick()
+        if fault == 'drop':
+            self.stats['dropped'] += 1
+            return None, 0.0
+
+        if not self.accepts(command):
+            self.stats['rejected'] += 1
+            body = str(ERROR_CODE).encode()
+        elif fault == 'garbage':
+            self.stats['garbage'] += 1
+            body = self.faults.garbage()
+        elif fault == 'timeout':
+            self.stats['timeouts'] += 1
+            body = str(self.TIMEOUT_CODE).encode()
+        elif fault == 'error':
+            self.stats['errors'] += 1
+            body = str(ERROR_CODE).encode()
+        else:
+            self.stats['ok'] += 1
+            body = str(self.reply_code).encode()
+
+        return tag + body + b'\r\n', latency
+
+
+class QTapDevice(SimulatedDevice):
+    NAME = 'qtap'
+    SUCCESS_CODE = 0
+    TIMEOUT_CODE = 13
+    COMMANDS = (re.compile(r'i:'), re.compile(r'r:'))
+
+
+class QBADevice(SimulatedDevice):
+    NAME = 'qba'
+    SUCCESS_CODE = 0
+    TIMEOUT_CODE = 13
+    # p:<count>:b<button>:<step>:<ms>:... e.g. p:1:b1:1:200:2:200:
+    COMMANDS = (re.compile(r'p:\d+:b\d+:(?:\d+:)*'),)
+
+
+class QBQDevice(SimulatedDevice):
+    NAME = 'qbq'
+    SUCCESS_CODE = 48
+    TIMEOUT_CODE = 50
+    COMMANDS = (re.compile(r'BR:[^:]*:'), re.compile(r'QR:[^:]*:'), re.compile(r'#:'))
+
+
+class QSwipeDevice(SimulatedDevice):
+    NAME = 'qswipe'
+    SUCCESS_CODE = 48
+    TIMEOUT_CODE = 50
+    COMMANDS = (re.compile(r'e:s:c:e:\d+:'), re.compile(r'i:'))
+
+
+DEVICE_TYPES = {device.NAME: device for device in (QTapDevice, QBADevice, QBQDevice, QSwipeDevice)}
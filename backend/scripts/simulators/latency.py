@@ -0,0 +1,59 @@
+import math
+import random
+
+UNITS = {'s': 1.0, 'ms': 1e-3, 'us': 1e-6}
+
+
+def parse_duration(text):
+    # '5' and '5ms' are milliseconds, '200us' and '1.5s' are converted to seconds
+    text = text.strip()
+    for unit in ('ms', 'us', 's'):
+        if text.endswith(unit):
+            return float(text[:-len(unit)]) * UNITS[unit]
+    return float(text) * UNITS['ms']
+
+
+class LatencyModel:
+    # Reply latency distributions, all sampled in seconds:
+    #   fixed:5ms  uniform:2ms:8ms  normal:5ms:1ms  lognormal:5ms:0.5  exp:5ms
+
+    def __init__(self, kind='fixed', params=(0.0,), seed=None):
+        self.kind = kind
+        self.params = params
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def parse(cls, spec, seed=None):
+        kind, _, rest = spec.partition(':')
+        args = rest.split(':') if rest else []
+        if kind == 'fixed' and len(args) == 1:
+            params = (parse_duration(args[0]),)
+        elif kind in ('uniform', 'normal') and len(args) == 2:
+            params = (parse_duration(args[0]), parse_duration(args[1]))
+        elif kind == 'lognormal' and len(args) == 2:
+            params = (parse_duration(args[0]), float(args[1]))  # median, sigma
+        elif kind == 'exp' and len(args) == 1:
+            params = (parse_duration(args[0]),)  # mean
+        else:
+            raise ValueError(f"Invalid latency spec '{spec}'")
+        return cls(kind, params, seed)
+
+    def mean(self):
+        if self.kind == 'fixed' or self.kind == 'exp' or self.kind == 'normal':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return (self.params[0] + self.params[1]) / 2
+        median, sigma = self.params
+        return median * math.exp(sigma * sigma / 2)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return self.rng.uniform(*self.params)
+        if self.kind == 'normal':
+            return max(0.0, self.rng.gauss(*self.params))
+        if self.kind == 'lognormal':
+            median, sigma = self.params
+            return self.rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+        return self.rng.expovariate(1 / self.params[0]) if self.params[0] > 0 else 0.0
@@ -0,0 +1,81 @@
+import os
+import select
+import threading
+import time
+from collections import deque
+
+POLL_INTERVAL = 0.1  # How often an idle simulator checks for stop()
+
+
+class PtySimulator:
+    # Serves a SimulatedDevice on a pseudo-terminal. Point a tester's --port at
+    # .path to talk to it exactly like real hardware.
+
+    def __init__(self, device, link=None):
+        self.device = device
+        self.link = link
+        self.master = None
+        self.slave = None
+        self.path = None
+        self.thread = None
+        self.running = False
+
+    def open(self):
+        import tty  # POSIX only
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.path = os.ttyname(self.slave)
+        if self.link:
+            if os.path.lexists(self.link):
+                os.remove(self.link)
+            os.symlink(self.path, self.link)
+            self.path = self.link
+        return self.path
+
+    def start(self):
+        if self.master is None:
+            self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self.serve, name=f'{self.device.NAME}-simulator', daemon=True)
+        self.thread.start()
+        return self.path
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+
+    def serve(self):
+        # The device works through commands one at a time, so each reply is due
+        # `latency` after the later of its arrival and the previous reply
+        pending = deque()
+        busy_until = 0.0
+        buffer = b''
+
+        while self.running:
+            now = time.monotonic()
+            wait = min(POLL_INTERVAL, max(0.0, pending[0][0] - now)) if pending else POLL_INTERVAL
+            readable, _, _ = select.select([self.master], [], [], wait)
+
+            if readable:
+                try:
+                    buffer += os.read(self.master, 4096)
+                except OSError:
+                    break
+                while b'\n' in buffer:
+                    line, buffer = buffer.split(b'\n', 1)
+                    reply, latency = self.device.handle(line)
+                    if reply is not None:
+                        busy_until = max(time.monotonic(), busy_until) + latency
+                        pending.append((busy_until, reply))
+
+            now = time.monotonic()
+            while pending and pending[0][0] <= now:
+                os.write(self.master, pending.popleft()[1])
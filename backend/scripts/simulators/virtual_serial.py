@@ -0,0 +1,107 @@
+import math
+from collections import deque
+
+from tester_clock import VirtualClock
+
+
+class ClockedSerial:
+    # Base for serial port stand-ins whose incoming bytes are due at set times on a
+    # tester clock (tester_clock.py). Subclasses queue them in `incoming` from
+    # write(). Reads wait for them on the clock like pyserial waits on the port, so
+    # on a VirtualClock a slow reply or a timeout moves the clock instead of
+    # taking real time.
+
+    def __init__(self, clock, timeout=1, port='virtual', baudrate=115200):
+        self.clock = clock
+        self.incoming = deque()  # (due perf_counter_ns, bytes), in due order
+        self.buffer = bytearray()  # Arrived, not yet read
+        self.timeout = timeout
+        self.port = port
+        self.baudrate = baudrate
+        self.is_open = True
+
+    def fill(self):
+        now = self.clock.perf_counter_ns()
+        while self.incoming and self.incoming[0][0] <= now:
+            self.buffer += self.incoming.popleft()[1]
+
+    def read_buffered(self, end_of):
+        # Waits until end_of(buffer) gives how many bytes to return, or the timeout
+        # passes and whatever arrived is returned
+        deadline = None if self.timeout is None else self.clock.perf_counter_ns() + math.ceil(self.timeout * 1e9)
+        while True:
+            self.fill()
+            end = end_of(self.buffer)
+            if end is not None:
+                break
+            if self.incoming and (deadline is None or self.incoming[0][0] <= deadline):
+                self.clock.advance_to(self.incoming[0][0])
+                continue
+            if deadline is not None:
+                self.clock.advance_to(deadline)
+                self.fill()
+            end = len(self.buffer)
+            break
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return data
+
+    def read(self, size=1):
+        return self.read_buffered(lambda buffer: size if len(buffer) >= size else None)
+
+    def read_until(self, expected=b'\n', size=None):
+        def end_of(buffer):
+            i = buffer.find(expected)
+            if i >= 0:
+                end = i + len(expected)
+                return end if size is None else min(end, size)
+            if size is not None and len(buffer) >= size:
+                return size
+            return None
+        return self.read_buffered(end_of)
+
+    def readline(self, size=-1):
+        return self.read_until(b'\n', None if size is None or size < 0 else size)
+
+    @property
+    def in_waiting(self):
+        self.fill()
+        return len(self.buffer)
+
+    def reset_input_buffer(self):
+        self.fill()
+        self.buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+class VirtualSerial(ClockedSerial):
+    # A SimulatedDevice behind a serial port stand-in, no pty or thread: replies
+    # are timed like PtySimulator times them, on the clock the tester runs on.
+    # With a VirtualClock shared with the tester (clock=...) a whole run takes no
+    # simulated time at all in reality.
+
+    def __init__(self, device, clock=None, timeout=1):
+        super().__init__(clock or VirtualClock(), timeout, f'virtual-{device.NAME}')
+        self.device = device
+        self.line = b''
+        self.busy_until_ns = 0
+
+    def write(self, data):
+        now = self.clock.perf_counter_ns()
+        self.line += bytes(data)
+        while b'\n' in self.line:
+            line, self.line = self.line.split(b'\n', 1)
+            reply, latency = self.device.handle(line, now / 1e9)
+            if reply is not None:
+                # The device works through commands one at a time, like PtySimulator.serve()
+                self.busy_until_ns = max(now, self.busy_until_ns) + int(latency * 1e9)
+                self.incoming.append((self.busy_until_ns, reply))
+        return len(data)
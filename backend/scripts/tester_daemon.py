@@ -0,0 +1,353 @@
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+
+import serial
+
+from port_scheduler import PortScheduler
+from tester_logging import target_handlers
+from tester_registry import TESTER_CLASSES, load_tester_class, normalize_commands
+
+CONNECT_SETTLE_DELAY = 0.5  # Same settle delay as connect_serial(), paid once per warm port
+TTFC_HISTORY = 1000
+
+# Protocol: one JSON request per line on stdin, one JSON event per line on stdout.
+#   {"op": "run", "job": "qtap_1", "instance": {<hardware_instances columns>}, "options": {...},
+#    "priority": 0, "ports": ["/dev/ttyUSB0", "/dev/ttyUSB1"]}
+#   {"op": "stop", "job": "qtap_1"}
+#   {"op": "pause", "job": "qtap_1"}  {"op": "resume", "job": "qtap_1"}
+#   {"op": "set", "job": "qtap_1", "delay": 0.5, "commands": ["i:", "r:"]}
+#   {"op": "status"}
+#   {"op": "close_port", "port": "/dev/ttyUSB0"}
+#   {"op": "shutdown"}
+# Every accepted job ends with a 'finished' event, requests that can't be run
+# get a 'rejected' event. Tester log lines go to stderr so stdout only carries
+# protocol events.
+# Ports are leased through a PortScheduler (port_scheduler.py): a job whose port
+# is busy gets a 'queued' event and waits, higher priority first, and every job
+# gets a 'leased' event with its wait once it has a port. "ports" lists other
+# ports the job may run on instead of the instance's own. Stopping a queued job
+# takes it off the queue. {"op": "status"} includes the queue and per-port
+# utilization.
+
+
+class WarmSerial(serial.Serial):
+    # Serial port kept open between jobs; reports the first write of each job
+    on_first_write = None
+
+    def write(self, data):
+        if self.on_first_write is not None:
+            callback, self.on_first_write = self.on_first_write, None
+            callback()
+        return super().write(data)
+
+
+class PortPool:
+    def __init__(self):
+        self.ports = {}
+        self.in_use = set()
+        self.lock = threading.Lock()
+
+    def acquire(self, port, baud_rate):
+        with self.lock:
+            if port in self.in_use:
+                raise RuntimeError(f"Port {port} is already in use by another job")
+            self.in_use.add(port)
+
+        try:
+            conn = self.ports.get(port)
+            if conn is not None and (not conn.is_open or conn.baudrate != baud_rate):
+                conn.close()
+                conn = None
+            if conn is None:
+                conn = WarmSerial(port, baud_rate, timeout=1)
+                time.sleep(CONNECT_SETTLE_DELAY)
+                self.ports[port] = conn
+
+            conn.timeout = 1
+            conn.reset_input_buffer()
+            conn.reset_output_buffer()
+            return conn
+        except Exception:
+            self.release(port, broken=True)
+            raise
+
+    def release(self, port, broken=False):
+        with self.lock:
+            self.in_use.discard(port)
+            if broken and port in self.ports:
+                # Drop handles that failed (e.g. USB unplugged) so the next job reopens them
+                try:
+                    self.ports.pop(port).close()
+                except serial.SerialException:
+                    pass
+
+    def close(self, port=None):
+        with self.lock:
+            for name in ([port] if port else list(self.ports)):
+                if name in self.ports and name not in self.in_use:
+                    self.ports.pop(name).close()
+
+    def status(self):
+        with self.lock:
+            return [{'port': name, 'baud_rate': conn.baudrate, 'in_use': name in self.in_use}
+                    for name, conn in self.ports.items()]
+
+
+class Job:
+    def __init__(self, job_id, spec, options, received_at):
+        self.job_id = job_id
+        self.spec = spec
+        self.options = options
+        self.received_at = received_at
+        self.port = None  # Leased by the scheduler
+        self.leased_at = None
+        self.tester = None
+        self.thread = None
+        self.stop_requested = False
+        self.ttfc = None
+        self.setup_time = None
+
+
+class TesterDaemon:
+    def __init__(self):
+        # Import every tester up front so a run never pays the import cost
+        self.tester_classes = {hardware_type: load_tester_class(hardware_type) for hardware_type in TESTER_CLASSES}
+        self.pool = PortPool()
+        self.scheduler = PortScheduler(self.lease_granted)
+        self.jobs = {}
+        self.ttfc_history = deque(maxlen=TTFC_HISTORY)
+        self.output_lock = threading.Lock()
+
+    def emit(self, record):
+        with self.output_lock:
+            sys.stdout.write(json.dumps(record) + '\n')
+            sys.stdout.flush()
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == 'run':
+            self.start_job(request)
+        elif op == 'stop':
+            self.stop_job(request.get('job'))
+        elif op in ('pause', 'resume', 'set'):
+            self.control_job(request)
+        elif op == 'status':
+            self.emit(self.status())
+        elif op == 'close_port':
+            self.pool.close(request.get('port'))
+            self.emit({'event': 'port_closed', 'port': request.get('port')})
+        elif op == 'shutdown':
+            return False
+        else:
+            self.emit({'event': 'error', 'error': f"Unknown op: {op}"})
+        return True
+
+    def start_job(self, request):
+        received_at = time.perf_counter()
+        spec = request.get('instance') or {}
+        job_id = request.get('job') or spec.get('id')
+        if not job_id:
+            self.emit({'event': 'rejected', 'error': 'run request needs a job or instance id'})
+            return
+        if job_id in self.jobs:
+            self.emit({'event': 'rejected', 'job': job_id, 'error': 'Job already running'})
+            return
+        if spec.get('hardware_type') not in self.tester_classes:
+            self.emit({'event': 'rejected', 'job': job_id, 'error': f"Invalid hardware type: {spec.get('hardware_type')}"})
+            return
+        ports = request.get('ports') or ([spec['port']] if spec.get('port') else [])
+        if not ports:
+            self.emit({'event': 'rejected', 'job': job_id, 'error': 'run request needs an instance port or ports'})
+            return
+        try:
+            priority = float(request.get('priority') or 0)
+        except (TypeError, ValueError):
+            self.emit({'event': 'rejected', 'job': job_id, 'error': f"Invalid priority: {request.get('priority')}"})
+            return
+
+        job = Job(job_id, spec, request.get('options') or {}, received_at)
+        self.jobs[job_id] = job
+        self.emit({'event': 'accepted', 'job': job_id})
+        queued = self.scheduler.submit(job_id, ports, priority, job)
+        if queued.state == 'queued':
+            self.emit({'event': 'queued', 'job': job_id, 'ports': queued.ports, 'priority': priority,
+                       'position': self.scheduler.position(job_id)})
+
+    def lease_granted(self, queued):
+        # Called by the scheduler when a job gets a port, now or when one frees up
+        job = queued.payload
+        job.port = queued.port
+        job.leased_at = time.perf_counter()
+        self.emit({'event': 'leased', 'job': job.job_id, 'port': job.port, 'wait_ms': round(queued.wait * 1000, 3)})
+        job.thread = threading.Thread(target=self.run_job, args=(job,), name=f'job-{job.job_id}', daemon=True)
+        job.thread.start()
+
+    def run_job(self, job):
+        spec = job.spec
+        port = job.port
+        broken = False
+        try:
+            conn = self.pool.acquire(port, int(spec['baud_rate']))
+        except Exception as e:
+            self.jobs.pop(job.job_id, None)
+            self.emit({'event': 'error', 'job': job.job_id, 'error': f"Failed to connect to {port}: {e}"})
+            self.finish_job(job)
+            self.scheduler.release(job.job_id)
+            return
+
+        try:
+            commands = spec['commands']
+            if isinstance(commands, str):
+                commands = json.loads(commands)  # Stored as a JSON string in hardware_instances
+
+            tester = self.tester_classes[spec['hardware_type']](
+                port, int(spec['baud_rate']), int(spec['num_cycles']), normalize_commands(commands),
+                float(spec['command_delay']), spec.get('id', job.job_id), spec['project_name'],
+                serial_conn=conn, **job.options
+            )
+            job.tester = tester
+            # Checked after job.tester is set: a stop_job() before this sees no tester and only sets the flag
+            if job.stop_requested:
+                tester.control.request(tester, {'op': 'stop'})
+            # Progress records become protocol events on the daemon's stdout
+            tester.progress_channel.send = lambda record: self.emit({'event': 'progress', 'job': job.job_id, **record})
+            self.redirect_console_logging(tester.logger)
+            job.setup_time = time.perf_counter() - job.leased_at
+
+            conn.on_first_write = lambda: self.first_command(job)
+            tester.run()
+        except serial.SerialException as e:
+            broken = True
+            self.emit({'event': 'error', 'job': job.job_id, 'error': str(e)})
+        except Exception as e:
+            self.emit({'event': 'error', 'job': job.job_id, 'error': f"{type(e).__name__}: {e}"})
+        finally:
+            conn.on_first_write = None
+            self.pool.release(port, broken=broken)
+            self.jobs.pop(job.job_id, None)
+            self.finish_job(job)
+            self.scheduler.release(job.job_id)  # Starts the next job queued for the port
+
+    def first_command(self, job):
+        # Measured from the lease, so time spent queued doesn't count
+        job.ttfc = time.perf_counter() - job.leased_at
+        self.ttfc_history.append(job.ttfc)
+        self.emit({'event': 'started', 'job': job.job_id,
+                   'ttfc_ms': round(job.ttfc * 1000, 3),
+                   'setup_ms': round(job.setup_time * 1000, 3) if job.setup_time is not None else None})
+
+    def finish_job(self, job):
+        record = {'event': 'finished', 'job': job.job_id,
+                  'ttfc_ms': round(job.ttfc * 1000, 3) if job.ttfc is not None else None,
+                  'duration_sec': round(time.perf_counter() - (job.leased_at or job.received_at), 3)}
+        if job.leased_at is None:
+            record['cancelled'] = True  # Stopped while still queued
+        tester = job.tester
+        if tester is not None:
+            record.update({'commands': tester.count, 'errors': tester.error, 'timeouts': tester.timeout})
+            # setup_logging replaces handlers without closing them, close ours so
+            # thousands of runs don't leak log file descriptors
+            for handler in tester.logger.handlers:
+                handler.close()
+            tester.logger.handlers = []
+        self.emit(record)
+
+    def redirect_console_logging(self, logger):
+        for handler in target_handlers(logger):
+            if type(handler) is logging.StreamHandler and handler.stream is sys.stdout:
+                handler.setStream(sys.stderr)
+
+    def stop_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            self.emit({'event': 'error', 'job': job_id, 'error': 'No running job found'})
+            return
+        if self.scheduler.cancel(job_id) is not None:
+            self.jobs.pop(job_id, None)
+            self.finish_job(job)
+            return
+        job.stop_requested = True
+        if job.tester is not None:
+            job.tester.control.request(job.tester, {'op': 'stop'})  # Also wakes a paused tester
+        self.emit({'event': 'stopping', 'job': job_id})
+
+    def control_job(self, request):
+        # Pause, resume and live delay/command set changes, applied at the tester's next cycle boundary
+        job_id = request.get('job')
+        job = self.jobs.get(job_id)
+        if job is None or job.tester is None:
+            error = 'Job is queued, waiting for a port' if job is not None and job.port is None else 'No running job found'
+            self.emit({'event': 'error', 'job': job_id, 'error': error})
+            return
+        try:
+            job.tester.control.request(job.tester, request)
+        except ValueError as e:
+            self.emit({'event': 'error', 'job': job_id, 'error': str(e)})
+            return
+        self.emit({'event': 'control', 'job': job_id, 'op': request['op']})
+
+    def status(self):
+        history = sorted(self.ttfc_history)
+        ttfc = None
+        if history:
+            ttfc = {
+                'count': len(history),
+                'mean_ms': round(sum(history) / len(history) * 1000, 3),
+                'p50_ms': round(history[(len(history) - 1) // 2] * 1000, 3),
+                'max_ms': round(history[-1] * 1000, 3)
+            }
+        return {
+            'event': 'status',
+            'jobs': [{'job': job.job_id, 'hardware_type': job.spec.get('hardware_type'),
+                      'port': job.port or job.spec.get('port'), 'state': 'running' if job.port else 'queued',
+                      'count': job.tester.count if job.tester else 0} for job in list(self.jobs.values())],
+            'ports': self.pool.status(),
+            'scheduler': self.scheduler.status(),
+            'ttfc': ttfc
+        }
+
+    def serve(self, stream):
+        self.emit({'event': 'ready', 'hardware_types': sorted(self.tester_classes)})
+        try:
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    request = json.loads(line)
+                except json.JSONDecodeError as e:
+                    self.emit({'event': 'error', 'error': f"Invalid JSON: {e}"})
+                    continue
+                if not self.handle(request):
+                    break
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        for queued in self.scheduler.close():
+            self.jobs.pop(queued.job_id, None)
+            self.finish_job(queued.payload)
+        for job in list(self.jobs.values()):
+            job.stop_requested = True
+            if job.tester is not None:
+                job.tester.control.request(job.tester, {'op': 'stop'})
+        for job in list(self.jobs.values()):
+            if job.thread is not None:
+                job.thread.join()
+        self.pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Long-lived tester service driven by JSON lines on stdin')
+    parser.parse_args()
+
+    daemon = TesterDaemon()
+    try:
+        daemon.serve(sys.stdin)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,204 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+LOG_MODES = ('sync', 'async')
+# What the async handler does when its queue is full:
+#   block - wait for the writer thread, nothing is lost
+#   drop  - drop INFO and below and count them, warnings and errors still wait
+OVERFLOW_POLICIES = ('block', 'drop')
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 256  # Records formatted and written per flush by the writer thread
+LOG_INDEX_SUFFIX = '.idx'
+
+_STOP = object()
+
+
+class IndexedFileHandler(logging.FileHandler):
+    # FileHandler that keeps a sidecar index next to the log: one JSON line
+    # {"cycle": N, "offset": <byte offset>} for every record logged with
+    # extra={'cycle': N}, so the server can slice out cycles without scanning the log
+
+    def __init__(self, filename, mode='a'):
+        super().__init__(filename, mode, encoding='utf-8')  # Fixed encoding keeps offsets in bytes
+        self.index_file = open(self.baseFilename + LOG_INDEX_SUFFIX, mode, encoding='utf-8')
+
+    def mark_record(self, record):
+        cycle = getattr(record, 'cycle', None)
+        if cycle is None or self.index_file is None:
+            return
+        self.stream.flush()
+        self.index_file.write(json.dumps({'cycle': cycle, 'offset': self.stream.tell()}) + '\n')
+        self.index_file.flush()
+
+    def emit(self, record):
+        self.mark_record(record)
+        super().emit(record)
+
+    def close(self):
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+        super().close()
+
+
+class TimedLogHandler(logging.Handler):
+    # Fans records out to the real handlers and measures how long the calling
+    # thread spends in logging, so it can be reported per command
+
+    def __init__(self, targets):
+        super().__init__()
+        self.targets = list(targets)
+        self.records = 0
+        self.dropped = 0
+        self.cost_ns = 0
+
+    def handle(self, record):
+        start = time.perf_counter_ns()
+        self.dispatch(record)
+        self.cost_ns += time.perf_counter_ns() - start
+        self.records += 1
+        return True
+
+    def dispatch(self, record):
+        for handler in self.targets:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def emit(self, record):
+        self.dispatch(record)
+
+    def close(self):
+        for handler in self.targets:
+            handler.close()
+        super().close()
+
+    def summary(self, commands):
+        return {
+            'mode': 'sync',
+            'records': self.records,
+            'dropped': self.dropped,
+            'cost_us_per_command': round(self.cost_ns / commands / 1000, 3) if commands else 0.0
+        }
+
+    def log_summary(self, logger, commands):
+        s = self.summary(commands)
+        logger.info(f"Logging ({s['mode']}): {s['records']} records, {s['dropped']} dropped, "
+                    f"{s['cost_us_per_command']} us per command")
+
+
+class QueuedLogHandler(TimedLogHandler):
+    # Only enqueues on the calling thread; a writer thread formats records,
+    # writes them in batches and flushes each handler once per batch
+
+    def __init__(self, targets, queue_size=LOG_QUEUE_SIZE, overflow='block'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Invalid log overflow policy: {overflow}")
+        super().__init__(targets)
+        self.overflow = overflow
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.high_water = 0
+        self.reported_drops = 0
+        self.writer = threading.Thread(target=self.write_loop, name='log-writer', daemon=True)
+        self.writer.start()
+
+    def dispatch(self, record):
+        if self.writer is None:
+            super().dispatch(record)  # Closed, write directly
+        elif self.overflow == 'drop' and record.levelno < logging.WARNING:
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+        else:
+            self.queue.put(record)
+        size = self.queue.qsize()
+        if size > self.high_water:
+            self.high_water = size
+
+    def write_loop(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not _STOP]
+            if self.dropped > self.reported_drops:
+                # Leave a trace in the log wherever records went missing
+                records.append(logging.makeLogRecord({
+                    'name': records[0].name if records else 'tester_logging', 'levelno': logging.WARNING,
+                    'levelname': 'WARNING', 'msg': f"Log queue full, dropped {self.dropped - self.reported_drops} records"
+                }))
+                self.reported_drops = self.dropped
+            self.write_batch(records)
+
+            for _ in batch:
+                self.queue.task_done()
+            if len(records) < len(batch):
+                return
+
+    def write_batch(self, records):
+        for handler in self.targets:
+            mark_record = getattr(handler, 'mark_record', None)
+            handler.acquire()
+            try:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        try:
+                            if mark_record is not None:
+                                mark_record(record)
+                            handler.stream.write(handler.format(record) + handler.terminator)
+                        except Exception:
+                            handler.handleError(record)
+                handler.flush()
+            finally:
+                handler.release()
+
+    def flush(self):
+        # Block until everything logged so far has been written
+        if self.writer is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.writer is not None:
+            self.queue.put(_STOP)
+            self.writer.join()
+            self.writer = None
+        super().close()
+
+    def summary(self, commands):
+        summary = super().summary(commands)
+        summary.update({'mode': 'async', 'overflow': self.overflow, 'queue_high_water': self.high_water})
+        return summary
+
+
+def install_log_handlers(logger, targets, mode='sync', queue_size=LOG_QUEUE_SIZE, overflow='block'):
+    # Replaces the logger's handlers with one timed handler in front of `targets`
+    if mode not in LOG_MODES:
+        raise ValueError(f"Invalid log mode: {mode}")
+    if mode == 'async':
+        handler = QueuedLogHandler(targets, queue_size, overflow)
+    else:
+        handler = TimedLogHandler(targets)
+    logger.handlers = [handler]
+    return handler
+
+
+def target_handlers(logger):
+    # The real handlers behind a logger, looking through the timed handler
+    handlers = []
+    for handler in logger.handlers:
+        handlers.extend(getattr(handler, 'targets', [handler]))
+    return handlers
+
+
+def logging_progress(tester):
+    handler = getattr(tester, 'log_handler', None)
+    if handler is None:
+        return {}
+    return {'logging': handler.summary(tester.count)}
@@ -0,0 +1,40 @@
+import importlib
+
+# Hardware type -> (script module, tester class). Mirrors getScriptPath() in server.js
+TESTER_CLASSES = {
+    'qswipe': ('qswipe_test', 'QSwipeTester'),
+    'qtap': ('qtap_test', 'HardwareTester'),
+    'qba': ('qba_test', 'QBATester'),
+    'qbq': ('qbq_test', 'HardwareTester'),
+}
+
+# Default command sets, same as defaultConfigs in server.js
+DEFAULT_COMMANDS = {
+    'qswipe': ['e:s:c:e:4:', 'i:', 'e:s:c:e:3:', 'i:', 'e:s:c:e:2:', 'i:', 'e:s:c:e:1:', 'i:'],
+    'qtap': ['i:', 'r:'],
+    'qba': ['p:1:b1:1:200:2:200:', 'p:1:b2:1:200:2:200:', 'p:1:b3:1:200:2:200:'],
+    'qbq': ['#:', 'QR:abc:', '#:', 'BR:123:'],
+}
+
+# Default delay between commands in seconds, same as defaultConfigs in server.js
+# (throughput_probe.py --save overrides these through probe_defaults.json)
+DEFAULT_DELAYS = {'qswipe': 3.0, 'qtap': 1.0, 'qba': 3.0, 'qbq': 1.5}
+
+
+def load_tester_class(hardware_type):
+    if hardware_type not in TESTER_CLASSES:
+        raise ValueError(f"Invalid hardware type: {hardware_type}")
+    module_name, class_name = TESTER_CLASSES[hardware_type]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def normalize_commands(commands):
+    # Add newline to commands if not present, same as each script's __main__
+    return [cmd if cmd.endswith('\n') else cmd + '\n' for cmd in commands]
+
+
+def load_feedback_table(hardware_type):
+    # The reply code table each script decodes feedback with (feedback_decoder.py)
+    if hardware_type not in TESTER_CLASSES:
+        raise ValueError(f"Invalid hardware type: {hardware_type}")
+    return importlib.import_module(TESTER_CLASSES[hardware_type][0]).FEEDBACK_TABLE
@@ -0,0 +1,32 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import each other as top-level modules, the way they run from backend/scripts
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(autouse=True)
+def run_in_tmp_path(tmp_path, monkeypatch):
+    # Testers write logs/, checkpoints and capture files relative to the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+class ReplyDevice:
+    # Stand-in device for VirtualSerial that answers every line with the same reply
+    NAME = 'reply'
+
+    def __init__(self, reply, latency=0.001):
+        self.reply = reply
+        self.latency = latency
+        self.lines = []
+
+    def handle(self, line, now=None):
+        self.lines.append(line)
+        return self.reply, self.latency
+
+
+@pytest.fixture
+def reply_device():
+    return ReplyDevice
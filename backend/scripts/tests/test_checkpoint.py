@@ -0,0 +1,92 @@
+import os
+
+from checkpoint import checkpoint_path, load_checkpoint
+from qba_test import QBATester
+from qtap_test import HardwareTester
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def qtap(device, cycles, commands=('i:', 'r:'), **options):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    return HardwareTester(conn.port, conn.baudrate, cycles, normalize_commands(commands), 0.5, 'qtap_soak', 'test',
+                          serial_conn=conn, clock=clock, **options)
+
+
+def stop_after(tester, device, lines):
+    # Ends the run once the device has answered `lines` commands, as if it was killed there
+    handle = device.handle
+
+    def handle_and_stop(line, now=None):
+        reply = handle(line, now)
+        if len(device.lines) == lines:
+            tester.is_running = False
+        return reply
+
+    device.handle = handle_and_stop
+
+
+def test_checkpoints_are_off_by_default(reply_device):
+    tester = qtap(reply_device(b'0\r\n'), 2)
+    tester.run()
+    assert tester.checkpointer is None
+    assert not os.path.exists(checkpoint_path(tester))
+
+
+def test_interval_follows_the_run_clock(reply_device):
+    tester = qtap(reply_device(b'0\r\n'), 10, checkpoint_interval=3)
+    tester.run()  # About 1 simulated second per cycle
+    assert tester.checkpointer.writes == 4  # After cycles 3, 6 and 9, and from cleanup()
+    assert load_checkpoint(checkpoint_path(tester))['next_cycle'] == 10
+
+
+def test_resume_continues_from_the_last_completed_cycle(reply_device):
+    device = reply_device(b'0\r\n')
+    tester = qtap(device, 5, checkpoint_interval=60)
+    stop_after(tester, device, 6)  # Cycle 3's last reply
+    tester.run()
+    data = load_checkpoint(checkpoint_path(tester))
+    assert (data['next_cycle'], data['finished']) == (3, False)
+    assert data['counters']['count'] == 6
+
+    resumed = qtap(reply_device(b'0\r\n'), 5, checkpoint_interval=60, resume=True)
+    assert resumed.start_cycle == 3
+    assert resumed.latency.histograms['i:'].total == 3
+    resumed.run()
+    assert (resumed.count, resumed.error, resumed.timeout) == (10, 0, 0)
+    assert resumed.latency.histograms['i:'].total == 5
+    data = load_checkpoint(checkpoint_path(resumed))
+    assert (data['next_cycle'], data['finished']) == (5, True)
+
+
+def test_finished_or_changed_runs_start_over(reply_device):
+    qtap(reply_device(b'0\r\n'), 2, checkpoint_interval=60).run()
+    assert qtap(reply_device(b'0\r\n'), 2, checkpoint_interval=60, resume=True).start_cycle == 0
+
+    device = reply_device(b'0\r\n')
+    tester = qtap(device, 4, checkpoint_interval=60)
+    stop_after(tester, device, 2)
+    tester.run()
+    assert qtap(reply_device(b'0\r\n'), 4, resume=True).start_cycle == 1
+    assert qtap(reply_device(b'0\r\n'), 4, commands=['i:'], resume=True).start_cycle == 0
+
+
+def test_pipelined_checkpoints_leave_out_the_cycles_in_flight(reply_device):
+    # Window 3 over 2-command cycles: each cycle is reported with the next one half done
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(b'0\r\n', latency=0), clock)
+    tester = QBATester(conn.port, conn.baudrate, 6, normalize_commands(['p:1:b1:', 'p:1:b2:']), 0.0, 'qba_soak',
+                       'test', serial_conn=conn, clock=clock, window=3, checkpoint_interval=60)
+    boundaries = []
+    cycle_completed = tester.checkpointer.cycle_completed
+
+    def record_boundary(tester, next_cycle):
+        cycle_completed(tester, next_cycle)
+        boundaries.append((next_cycle, tester.checkpointer.boundary[1]['count'], tester.count))
+
+    tester.checkpointer.cycle_completed = record_boundary
+    tester.run()
+    assert [(next_cycle, count) for next_cycle, count, _ in boundaries] == [(cycle, 2 * cycle) for cycle in range(1, 7)]
+    assert any(total > count for _, count, total in boundaries)
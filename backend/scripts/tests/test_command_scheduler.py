@@ -0,0 +1,50 @@
+import pytest
+
+from command_scheduler import OVERRUN_TOLERANCE, DeadlineScheduler, make_scheduler, target_rate
+from tester_clock import VirtualClock
+
+
+def test_target_rate():
+    assert target_rate() is None
+    assert target_rate(rate=5) == 5
+    assert target_rate(cycles_per_hour=3600, num_commands=4) == pytest.approx(4)
+    with pytest.raises(ValueError):
+        target_rate(5, 60)
+
+
+def test_slots_keep_to_the_absolute_schedule():
+    clock = VirtualClock()
+    scheduler = DeadlineScheduler(10, clock)
+    sends = []
+    for slot in range(5):
+        scheduler.wait(slot)
+        sends.append(clock.monotonic())
+        clock.sleep(0.03)  # Reply and logging time doesn't push the next slot back
+    assert sends == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4])
+    assert scheduler.overruns == 0
+
+
+def test_late_sends_count_as_overruns_without_shifting_later_slots():
+    clock = VirtualClock()
+    scheduler = DeadlineScheduler(10, clock)
+    scheduler.wait(0)
+    clock.sleep(0.25)  # A slow reply, slot 1 and 2 are due by now
+    scheduler.wait(1)
+    assert scheduler.overruns == 1
+    assert scheduler.last_lateness == pytest.approx(0.15)
+    scheduler.wait(3)
+    assert clock.monotonic() == pytest.approx(0.3)
+    assert scheduler.summary()['drift_ms'] == pytest.approx(0.0, abs=OVERRUN_TOLERANCE * 1000)
+
+
+def test_resumed_run_starts_at_its_slot():
+    clock = VirtualClock(start=50)
+    scheduler = DeadlineScheduler(2, clock)
+    assert scheduler.delay(40) == 0  # First command goes out at once
+    assert scheduler.delay(41) == pytest.approx(0.5)
+
+
+def test_make_scheduler():
+    assert make_scheduler(None) is None
+    with pytest.raises(ValueError):
+        DeadlineScheduler(0)
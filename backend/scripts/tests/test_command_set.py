@@ -0,0 +1,46 @@
+from command_set import compile_commands
+from qba_test import QBATester
+from qbq_test import HardwareTester as QBQTester
+from qtap_test import HardwareTester as QTapTester
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def make(tester_class, device, commands, **options):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    return tester_class(conn.port, conn.baudrate, 2, commands, 0.0, 'command_set', 'test',
+                        serial_conn=conn, checkpoint_interval=0, clock=clock, **options)
+
+
+def test_compiled_commands(reply_device):
+    tester = make(QTapTester, reply_device(b'0\r\n'), normalize_commands(['i:', 'r:']), feedback_timeouts={'r:': 0.5})
+    first, second = tester.COMMAND_SET
+    assert first.index == 0 and first.text == 'i:\n' and first.key == 'i:' and first.payload == b'i:\n'
+    assert (first.feedback_timeout, second.feedback_timeout) == (2, 0.5)
+    assert first.send_label == 'Sending command: i:\n'
+    assert second.success_label == 'Command 2/2 succeeded with valid feedback.'
+    assert second.failure_label.startswith('Command 2/2 failed to receive valid feedback.')
+
+
+def test_run_writes_the_compiled_payloads(reply_device):
+    device = reply_device(b'0\r\n')
+    tester = make(QTapTester, device, normalize_commands(['i:', 'r:']))
+    tester.run()
+    assert device.lines == [command.payload.strip() for command in tester.COMMAND_SET] * 2
+
+
+def test_qba_keeps_its_extra_newline_and_single_timeout(reply_device):
+    tester = make(QBATester, reply_device(b'0\r\n'), normalize_commands(['p:1:b1:1:200:2:200:']))
+    command, = tester.COMMAND_SET
+    assert command.payload == b'p:1:b1:1:200:2:200:\n\n'
+    assert command.key == 'p:1:b1:1:200:2:200:'
+    assert command.feedback_timeout == 1
+
+
+def test_qbq_timeouts_by_command_type(reply_device):
+    tester = make(QBQTester, reply_device(b'0\r\n'), normalize_commands(['#:', 'BR:123:', 'QR:1:']),
+                  feedback_timeouts={'BR:': 0.25})
+    assert [command.feedback_timeout for command in tester.COMMAND_SET] == [2, 0.25, 2]
+    assert compile_commands(tester, []) == ()
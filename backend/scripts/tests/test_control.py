@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+
+import pytest
+
+from control import parse_changes
+from qba_test import QBATester
+from qtap_test import HardwareTester
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def qtap(device, cycles, on_progress=None, tester_class=HardwareTester, commands=('i:', 'r:')):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    tester = tester_class(conn.port, conn.baudrate, cycles, normalize_commands(list(commands)), 0.5, 'control', 'test',
+                          serial_conn=conn, checkpoint_interval=0, clock=clock)
+    records = []
+
+    def send(record):
+        records.append(record)
+        if on_progress is not None:
+            on_progress(tester, record)
+
+    tester.progress_channel.send = send
+    return tester, records
+
+
+def test_parse_changes():
+    assert parse_changes({'op': 'set', 'delay': '0.25'}) == {'delay': 0.25}
+    assert parse_changes({'op': 'set', 'commands': ['i:']}) == {'commands': ['i:\n']}
+    for message in ({'op': 'set'}, {'op': 'set', 'delay': -1}, {'op': 'set', 'commands': []},
+                    {'op': 'set', 'commands': ['i:', ' ']}, {'op': 'set', 'commands': 'i:'}):
+        with pytest.raises(ValueError):
+            parse_changes(message)
+
+
+def test_unknown_op_is_rejected(reply_device):
+    tester, _ = qtap(reply_device(b'0\r\n'), 1)
+    with pytest.raises(ValueError):
+        tester.control.request(tester, {'op': 'restart'})
+    assert not tester.control.pending
+
+
+def test_set_applies_from_the_next_cycle(reply_device):
+    device = reply_device(b'0\r\n')
+
+    def on_progress(tester, record):
+        if record['cycle'] == 1:
+            tester.control.request(tester, {'op': 'set', 'delay': 0, 'commands': ['r:']})
+
+    tester, records = qtap(device, 3, on_progress)
+    tester.run()
+    assert device.lines == [b'i:', b'r:', b'r:', b'r:']
+    assert tester.COMMAND_DELAY == 0
+    assert [command.key for command in tester.COMMAND_SET] == ['r:']
+    assert records[-1]['control'] == {'paused': False, 'pauses': 0, 'paused_sec': 0.0, 'changes_applied': 1,
+                                      'command_delay': 0, 'commands': 1}
+
+
+def test_qba_set_keeps_the_extra_newline(reply_device):
+    device = reply_device(b'0\r\n')
+    written = []
+
+    def on_progress(tester, record):
+        if record['cycle'] == 1:
+            tester.control.request(tester, {'op': 'set', 'commands': ['p:1:b2:']})
+
+    tester, _ = qtap(device, 2, on_progress, QBATester, ['p:1:b1:'])
+    write = tester.serial_conn.write
+    tester.serial_conn.write = lambda data: written.append(bytes(data)) or write(data)
+    tester.run()
+    assert written == [b'p:1:b1:\n\n', b'p:1:b2:\n\n']
+    assert tester.COMMAND_SET[0].key == 'p:1:b2:'
+
+
+def test_stop_ends_the_run_before_the_next_cycle(reply_device):
+    device = reply_device(b'0\r\n')
+
+    def on_progress(tester, record):
+        if record['cycle'] == 2:
+            tester.control.request(tester, {'op': 'stop'})
+
+    tester, records = qtap(device, 5, on_progress)
+    tester.run()
+    assert [record['cycle'] for record in records] == [1, 2]
+    assert len(device.lines) == 4
+
+
+def test_pause_blocks_at_the_cycle_boundary_until_resumed(reply_device):
+    device = reply_device(b'0\r\n')
+    paused = threading.Event()
+
+    def on_progress(tester, record):
+        if record['cycle'] == 1:
+            tester.control.request(tester, {'op': 'pause'})
+            paused.set()
+
+    tester, records = qtap(device, 2, on_progress)
+    runner = threading.Thread(target=tester.run)
+    runner.start()
+    assert paused.wait(5)
+    runner.join(0.2)
+    assert runner.is_alive() and len(device.lines) == 2
+    tester.control.request(tester, {'op': 'resume'})
+    runner.join(5)
+    assert not runner.is_alive()
+    assert len(device.lines) == 4
+    assert tester.control.pauses == 1 and tester.control.paused_time > 0
+
+
+def test_requests_from_the_control_fd(reply_device):
+    tester, _ = qtap(reply_device(b'0\r\n'), 1)
+    read_fd, write_fd = os.pipe()
+    with os.fdopen(write_fd, 'w') as f:
+        f.write('pause\n\n' + json.dumps({'op': 'set', 'delay': 1}) + '\nbogus\n')
+    tester.control.start_reader(tester, read_fd)
+    tester.control.reader.join(5)
+    os.close(read_fd)
+    assert tester.control.paused and tester.control.changes == {'delay': 1.0}
@@ -0,0 +1,78 @@
+import math
+import random
+
+import pytest
+
+from early_stop import SequentialTest, make_early_stop
+from qtap_test import HardwareTester
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def test_wald_bounds():
+    test = SequentialTest(0.01, 0.05, alpha=0.05, beta=0.1)
+    assert test.upper == pytest.approx(math.log(0.9 / 0.05))
+    assert test.lower == pytest.approx(math.log(0.1 / 0.95))
+
+
+def test_clean_unit_passes_and_bad_unit_fails():
+    test = SequentialTest(0.01, 0.5)
+    needed = math.ceil(test.lower / test.success_step)  # Successes in a row to pass
+    assert test.update(needed - 1, 0, 1) is None
+    assert test.update(needed, 0, 2) == 'pass'
+    assert test.decided_at == 2
+
+    test = SequentialTest(0.01, 0.1)
+    assert test.update(1, 1, 1) is None
+    assert test.update(2, 2, 2) == 'fail'
+
+
+def test_min_cycles_and_sticky_decisions():
+    test = SequentialTest(0.01, 0.5, min_cycles=10)
+    assert test.update(100, 0, 9) is None
+    assert test.update(100, 0, 10) == 'pass'
+    assert test.update(200, 200, 20) == 'pass'  # Already decided
+    assert test.summary()['decided_at_cycle'] == 10
+
+
+@pytest.mark.parametrize('args', [(0.05, 0.01), (0, 0.5), (0.01, 1), (0.01, 0.05, 0.6)])
+def test_invalid_parameters(args):
+    with pytest.raises(ValueError):
+        SequentialTest(*args)
+
+
+def test_error_rates_stay_near_alpha_and_beta():
+    rng = random.Random(3)
+
+    def decide(rate):
+        test = SequentialTest(0.02, 0.1, alpha=0.05, beta=0.05)
+        trials = failures = 0
+        while test.decision is None:
+            trials += 1
+            failures += rng.random() < rate
+            test.update(trials, failures, trials)
+        return test.decision
+
+    runs = 400
+    assert sum(decide(0.02) == 'fail' for _ in range(runs)) / runs < 0.1
+    assert sum(decide(0.1) == 'pass' for _ in range(runs)) / runs < 0.1
+
+
+def test_interval_contains_the_observed_rate():
+    test = SequentialTest(0.01, 0.05)
+    assert test.interval() == (0.0, 1.0)
+    test.update(200, 10, 50)
+    low, high = test.interval()
+    assert low < 0.05 < high
+
+
+def test_tester_stops_once_decided(reply_device):
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(b'0\r\n'), clock)
+    tester = HardwareTester(conn.port, conn.baudrate, 100, normalize_commands(['i:', 'r:']), 0.5, 'qtap_sprt', 'test',
+                            serial_conn=conn, checkpoint_interval=0, clock=clock,
+                            early_stop=make_early_stop({'p0': 0.01, 'p1': 0.5}))
+    tester.run()
+    assert tester.early_stop.decision == 'pass'
+    assert tester.count == 6  # Decided after the third cycle
@@ -0,0 +1,60 @@
+import logging
+
+import pytest
+
+from feedback_decoder import FeedbackDecoder, Outcome, feedback_table
+from tester_registry import load_feedback_table
+
+
+@pytest.fixture
+def qtap():
+    return FeedbackDecoder(load_feedback_table('qtap'))
+
+
+def test_known_codes(qtap):
+    assert qtap.decode(b'0').outcome is Outcome.SUCCESS
+    decoded = qtap.decode(b'13')
+    assert (decoded.outcome, decoded.value, decoded.level) == (Outcome.TIMEOUT, 13, logging.WARNING)
+    assert qtap.decode(b'').outcome is Outcome.TIMEOUT  # QTap counts a silent device as a timeout
+
+
+def test_other_codes_fill_in_the_message(qtap):
+    decoded = qtap.decode(b'7')
+    assert (decoded.outcome, decoded.value) == (Outcome.ERROR, 7)
+    assert decoded.message == "Error occurred. Feedback value: 7"
+
+
+def test_non_text_replies_are_read_as_little_endian_bytes(qtap):
+    decoded = qtap.decode(b'\xff\xfe')
+    assert (decoded.outcome, decoded.value) == (Outcome.ERROR, 0xfeff)
+
+
+def test_text_only_parser_rejects_garbage():
+    decoded = FeedbackDecoder(load_feedback_table('qba')).decode(b'\xff\xfe')
+    assert (decoded.outcome, decoded.value) == (Outcome.ERROR, None)
+    assert decoded.message.startswith("ValueError in feedback processing")
+
+
+def test_bytearray_and_str_replies(qtap):
+    assert qtap.decode(bytearray(b'0')) == qtap.decode(b'0')
+    assert qtap.decode('13') == qtap.decode(b'13')
+
+
+def test_each_type_keeps_its_own_codes():
+    qbq = FeedbackDecoder(load_feedback_table('qbq'))
+    assert qbq.decode(b'48').outcome is Outcome.SUCCESS
+    assert qbq.decode(b'50').outcome is Outcome.TIMEOUT
+    assert qbq.decode(b'').outcome is Outcome.ERROR
+
+
+def test_cache_is_bounded():
+    table = feedback_table({0: (Outcome.SUCCESS, logging.INFO, None)}, (Outcome.ERROR, logging.ERROR, None))
+    decoder = FeedbackDecoder(table, cache_size=4)
+    for code in range(100, 110):
+        assert decoder.decode(str(code).encode()).value == code
+    assert len(decoder.cache) == 4
+
+
+def test_unknown_parser():
+    with pytest.raises(ValueError):
+        FeedbackDecoder(feedback_table({}, (Outcome.ERROR, logging.ERROR, None), parse='hex'))
@@ -0,0 +1,68 @@
+import json
+import random
+
+import pytest
+
+from latency_histogram import (MAX_VALUE_NS, SUB_BUCKETS, LatencyHistogram, LatencyStats, bucket_index,
+                               bucket_upper_bound, percentile_rank)
+from tester_clock import VirtualClock
+
+
+def test_buckets_cover_their_values():
+    for value in [0, 1, SUB_BUCKETS - 1, SUB_BUCKETS, 1000, 123456789, MAX_VALUE_NS]:
+        index = bucket_index(value)
+        assert value <= bucket_upper_bound(index)
+        assert index == 0 or bucket_upper_bound(index - 1) < value
+
+
+def test_percentiles_stay_within_the_bucket_error():
+    rng = random.Random(7)
+    values = sorted(rng.randint(10_000, 50_000_000) for _ in range(5000))
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    for percent in (50, 90, 99):
+        exact = values[percentile_rank(len(values), percent) - 1]
+        assert exact <= histogram.percentile(percent) <= exact * (1 + 1 / SUB_BUCKETS)
+    assert histogram.percentile(100) == values[-1]
+
+
+def test_percentile_rank_is_nearest_rank():
+    assert percentile_rank(2, 95) == 2
+    assert percentile_rank(2, 50) == 1
+    assert percentile_rank(100, 99) == 99
+    assert percentile_rank(1, 1) == 1
+
+
+def test_empty_and_clamped_values():
+    histogram = LatencyHistogram()
+    assert histogram.percentile(50) == 0
+    assert histogram.summary() == {'count': 0, 'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0, 'mean': 0.0}
+    histogram.record(MAX_VALUE_NS * 2)
+    assert histogram.max_ns == MAX_VALUE_NS
+
+
+def test_merge_and_dict_round_trip():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    for value in (1_000, 2_000_000):
+        a.record(value)
+    b.record(5_000_000)
+    a.merge(b)
+    restored = LatencyHistogram.from_dict(json.loads(json.dumps(a.to_dict())))
+    assert restored.counts == a.counts
+    assert restored.summary() == a.summary() and restored.total == 3
+
+
+def test_stats_time_replies_on_the_clock():
+    clock = VirtualClock()
+    stats = LatencyStats(clock)
+    stats.mark_sent()
+    clock.sleep(0.004)
+    stats.record_reply('i:\n')
+    assert stats.last_ns == 4_000_000
+    assert stats.summary()['i:']['p50'] == pytest.approx(4, rel=1 / SUB_BUCKETS)
+    stats.record_reply('i:')  # No send outstanding
+    assert stats.histograms['i:'].total == 1
+
+    stats.mark_sent()
+    assert stats.last_ns is None and stats.last_sent_ns == 4_000_000
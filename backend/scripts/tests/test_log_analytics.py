@@ -0,0 +1,59 @@
+import os
+
+from log_analytics import aggregate, analyse, describe_file, log_files, parse_feedback, table_rows
+from tester_registry import normalize_commands
+from virtual_run import virtual_run
+
+
+def run_logged(instance_id, cycles=20, seed=3):
+    tester, device, _ = virtual_run('qtap', cycles, normalize_commands(['i:', 'r:']), 0.1, instance_id, 'my_proj',
+                                    seed=seed, fault_rates={'error_rate': 0.1, 'drop_rate': 0.1},
+                                    checkpoint_interval=0)
+    tester.log_handler.close()
+    return tester, device
+
+
+def totals(results):
+    rows = aggregate(results, 'commands', ['hardware'])
+    return rows[('qtap',)]
+
+
+def test_describe_file_and_feedback():
+    assert describe_file(os.path.join('logs', '2024-05-01', 'line_2_qswipe_3.log')) == {
+        'date': '2024-05-01', 'project': 'line_2', 'hardware': 'qswipe', 'instance': 'qswipe_3'}
+    assert parse_feedback("b'13'") == b'13'
+    assert parse_feedback("b'\\x00'") == b'\x00'
+    assert parse_feedback('garbage') == b'garbage'
+
+
+def test_counts_match_the_run():
+    tester, device = run_logged('qtap_1')
+    results, stats = analyse('logs', log_files('logs'), jobs=1)
+    assert stats == {'files': 1, 'cached': 0, 'resumed': 0, 'parsed': 1}
+    sent, success, timeouts, errors = totals(results)
+    assert (sent, success, timeouts, errors) == (tester.count, device.stats['ok'], tester.timeout, tester.error)
+    assert timeouts > 0 and errors > 0
+    result, = results
+    assert result['runs'] == 1 and result['cycles'][0] == 20 and result['pending'] == []
+
+    header, body = table_rows(aggregate(results, 'commands', ['instance', 'command']), 'commands',
+                              ['instance', 'command'], failures_only=True)
+    assert header[-1] == 'failure_rate'
+    assert all(row[0] == 'qtap_1' and row[1] in ('i:', 'r:') and 0 < row[-1] < 1 for row in body)
+
+
+def test_cache_and_resume():
+    run_logged('qtap_1')
+    run_logged('qtap_2', seed=4)
+    paths = log_files('logs')
+    first, _ = analyse('logs', paths, jobs=2)
+    again, stats = analyse('logs', paths, jobs=1)
+    assert stats['cached'] == 2 and again == first
+
+    run_logged('qtap_1', seed=5)  # Appends to the day's log
+    resumed, stats = analyse('logs', paths, jobs=1)
+    assert (stats['cached'], stats['resumed']) == (1, 1)
+    os.remove(os.path.join('logs', '.analytics_cache.json'))
+    fresh, stats = analyse('logs', paths, jobs=1)
+    assert stats['parsed'] == 2 and fresh == resumed
+    assert fresh[paths.index(next(p for p in paths if p.endswith('qtap_1.log')))]['runs'] == 2
@@ -0,0 +1,82 @@
+import asyncio
+import sys
+
+import pytest
+import serial
+
+import multi_runner
+from simulators import start_simulator
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='pty simulators need Linux/macOS')
+
+QBA_COMMANDS = ['p:1:b1:1:200:2:200:', 'p:1:b2:1:200:2:200:']
+
+
+class RecordingSerial(serial.Serial):
+    written = []
+
+    def write(self, data):
+        RecordingSerial.written.append(bytes(data))
+        return super().write(data)
+
+
+@pytest.fixture
+def run_qba(monkeypatch):
+    # Runs one QBA instance against a pty simulator, returns (runner, progress records)
+    monkeypatch.setattr(multi_runner.serial, 'Serial', RecordingSerial)
+    monkeypatch.setattr(multi_runner, 'CONNECT_SETTLE_DELAY', 0)
+    RecordingSerial.written = []
+
+    def run(num_cycles=2, latency='fixed:1ms', **options):
+        simulator = start_simulator('qba', latency)
+        try:
+            spec = {'id': 'qba_multi', 'hardware_type': 'qba', 'port': simulator.path, 'baud_rate': 115200,
+                    'num_cycles': num_cycles, 'command_delay': 0.0, 'project_name': 'test',
+                    'commands': QBA_COMMANDS, **options}
+            records = []
+            runner = multi_runner.MultiRunner([spec], report_interval=60)
+            runner.emit = records.append
+            asyncio.run(runner.run())
+        finally:
+            simulator.stop()
+        return runner, records
+
+    return run
+
+
+def test_runner_writes_compiled_payloads(run_qba):
+    runner, _ = run_qba()
+    tester = runner.runners[0].tester
+    assert RecordingSerial.written == [command.payload for command in tester.COMMAND_SET] * 2
+    assert RecordingSerial.written[0].endswith(b'\n\n')
+    assert (tester.count, tester.error, tester.timeout) == (4, 0, 0)
+    assert tester.checkpointer is None
+
+
+def test_runner_reports_the_testers_own_progress(run_qba):
+    runner, records = run_qba()
+    cycles = [record for record in records if 'cycle' in record]
+    assert [record['cycle'] for record in cycles] == [1, 2]
+    for record in cycles:
+        assert record['instance'] == 'qba_multi'
+        assert record['hardware_type'] == 'qba'
+        assert record['cycle_completed'] is True
+        assert 'commands_per_sec' in record and 'latency_ms' in record
+
+
+def test_runner_stops_early_once_decided(run_qba):
+    runner, records = run_qba(num_cycles=50, early_stop={'p0': 0.01, 'p1': 0.5})
+    tester = runner.runners[0].tester
+    assert tester.early_stop.decision == 'pass'
+    assert tester.count == 6  # Decided after the third cycle
+    assert [record['cycle'] for record in records if 'cycle' in record] == [1, 2, 3]
+
+
+def test_runner_pipelines_windowed_instances(run_qba):
+    # The simulator answers commands that arrive before its last reply with a timeout
+    runner, records = run_qba(latency='fixed:0', window=3)
+    tester = runner.runners[0].tester
+    assert tester.pipeline.window == 3
+    assert sorted(RecordingSerial.written) == sorted([command.payload for command in tester.COMMAND_SET] * 2)
+    assert (tester.count, tester.error, tester.timeout) == (4, 0, 0)
+    assert [record['cycle'] for record in records if 'cycle' in record] == [1, 2]
@@ -0,0 +1,73 @@
+from qba_test import QBATester
+from qbq_test import HardwareTester as QBQTester
+from simulators import VirtualSerial, virtual_simulator
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+QBA_COMMANDS = ['p:1:b1:1:200:2:200:', 'p:1:b2:1:200:2:200:']
+
+
+class RecordingSerial(VirtualSerial):
+    def __init__(self, device, clock):
+        super().__init__(device, clock)
+        self.written = []
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        return super().write(data)
+
+
+def qba_run(conn, clock, cycles, **options):
+    tester = QBATester(conn.port, conn.baudrate, cycles, normalize_commands(QBA_COMMANDS), 0.0, 'qba_pipeline',
+                       'test', serial_conn=conn, checkpoint_interval=0, clock=clock, **options)
+    tester.run()
+    return tester
+
+
+def test_pipelined_sends_the_same_payloads_as_stop_and_wait(reply_device):
+    written = {}
+    for window in (1, 3):
+        clock = VirtualClock()
+        conn = RecordingSerial(reply_device(b'0\r\n'), clock)
+        tester = qba_run(conn, clock, 2, window=window)
+        assert tester.count == 4
+        written[window] = conn.written
+    assert written[3] == written[1]
+    assert written[1][0] == b'p:1:b1:1:200:2:200:\n\n'  # QBA's extra newline
+
+
+def test_tag_mode_prefixes_the_compiled_payload():
+    clock = VirtualClock()
+    conn = RecordingSerial(virtual_simulator('qba', 'fixed:5ms', clock=clock).device, clock)
+    tester = qba_run(conn, clock, 2, window=4, match_mode='tag')
+    assert conn.written[:2] == [b'@0:p:1:b1:1:200:2:200:\n\n', b'@1:p:1:b2:1:200:2:200:\n\n']
+    assert tester.count == 4
+    assert tester.error == 0
+    assert tester.pipeline.out_of_window_replies == 0
+
+
+def qbq_run(conn, clock, **options):
+    tester = QBQTester(conn.port, conn.baudrate, 3, normalize_commands(['#:', 'QR:abc:']), 0.0, 'qbq_pipeline',
+                       'test', serial_conn=conn, feedback_timeouts={'#:': 0.2, 'QR:': 0.2}, checkpoint_interval=0,
+                       clock=clock, **options)
+    tester.run()
+    return tester
+
+
+def test_silent_qbq_scores_the_same_pipelined_and_stop_and_wait(reply_device):
+    counters = {}
+    for window in (1, 4):
+        clock = VirtualClock()
+        tester = qbq_run(VirtualSerial(reply_device(None), clock), clock, window=window)
+        counters[window] = (tester.count, tester.error, tester.timeout)
+    assert counters[4] == counters[1] == (6, 0, 0)  # NO_REPLY_FEEDBACK stands in for the missing replies
+
+
+def test_late_replies_are_reported_not_counted_as_errors():
+    clock = VirtualClock()
+    conn = virtual_simulator('qba', 'fixed:1.5s', clock=clock)  # Later than QBA's 1 s reply timeout
+    tester = qba_run(conn, clock, 3, window=2, match_mode='tag')
+    assert tester.count == 6
+    assert tester.error == 6  # One per command that got no reply in time, none for the late replies
+    assert tester.pipeline.missing_replies == 6
+    assert tester.pipeline.out_of_window_replies >= 1
@@ -0,0 +1,61 @@
+import sys
+
+import pytest
+
+from port_discovery import Fingerprinter, discover, load_fingerprints, save_fingerprints
+from simulators import start_simulator
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='pty simulators need Linux/macOS')
+
+HARDWARE_TYPES = ('qba', 'qbq', 'qswipe', 'qtap')
+
+
+@pytest.fixture
+def simulators():
+    started = {hardware_type: start_simulator(hardware_type, 'fixed:1ms') for hardware_type in HARDWARE_TYPES}
+    yield started
+    for simulator in started.values():
+        simulator.stop()
+
+
+def port_info(simulator, serial_number=None):
+    return {'port': simulator.path, 'serial_number': serial_number, 'vid': None, 'pid': None, 'description': None}
+
+
+def test_candidates_from_replies():
+    fingerprinter = Fingerprinter()
+    assert fingerprinter.candidates({'#:': b'0', 'i:': b'1'}) == ['qbq']
+    assert fingerprinter.candidates({'#:': b'1', 'i:': b'0'}) == ['qswipe', 'qtap']
+    assert fingerprinter.tiebreak(['qswipe', 'qtap'], {'#:': b'1', 'i:': b'0'}) == 'r:'
+    assert fingerprinter.tiebreak(['qswipe', 'qtap'], {'#:': b'1', 'i:': b'0', 'r:': b'1'}) is None
+    assert fingerprinter.candidates({'#:': None, 'i:': None}) == ['qba']
+
+
+def test_identifies_each_simulated_type(simulators):
+    ports = [port_info(simulators[hardware_type]) for hardware_type in HARDWARE_TYPES]
+    results = discover(ports, [115200], settle=0, timeout=0.3)
+    assert [result['hardware_type'] for result in results] == list(HARDWARE_TYPES)
+    assert all(result['status'] == 'identified' and result['baud_rate'] == 115200 for result in results)
+    assert 'r:' in results[HARDWARE_TYPES.index('qtap')]['replies']
+    assert 'r:' not in results[HARDWARE_TYPES.index('qbq')]['replies']
+
+
+def test_without_tiebreak_qtap_and_qswipe_stay_ambiguous(simulators):
+    results = discover([port_info(simulators['qtap']), port_info(simulators['qswipe'])], [115200], settle=0,
+                       timeout=0.3, tiebreak=False)
+    assert [(result['status'], result['candidates']) for result in results] == [('ambiguous', ['qswipe', 'qtap'])] * 2
+
+
+def test_cached_adapters_are_not_opened(simulators, tmp_path):
+    fingerprints = {}
+    first, = discover([port_info(simulators['qbq'], 'A1')], [115200], settle=0, timeout=0.3, fingerprints=fingerprints)
+    assert fingerprints['A1']['hardware_type'] == 'qbq' and not first['cached']
+    path = str(tmp_path / 'fingerprints.json')
+    save_fingerprints(path, fingerprints)
+
+    moved = {'port': '/dev/does-not-exist', 'serial_number': 'A1', 'vid': None, 'pid': None, 'description': None}
+    cached, = discover([moved], [115200], fingerprints=load_fingerprints(path))
+    assert cached['cached'] and cached['hardware_type'] == 'qbq' and cached['replies'] == first['replies']
+    refreshed, = discover([moved], [115200], settle=0, fingerprints=load_fingerprints(path), refresh=True)
+    assert refreshed['status'] == 'error'
+    assert load_fingerprints(str(tmp_path / 'missing.json')) == {}
@@ -0,0 +1,82 @@
+import pytest
+
+from port_scheduler import PortScheduler
+from tester_clock import VirtualClock
+
+
+@pytest.fixture
+def scheduler():
+    leased = []
+    scheduler = PortScheduler(leased.append, clock=VirtualClock())
+    scheduler.leased = leased
+    return scheduler
+
+
+def test_free_port_is_leased_at_once(scheduler):
+    job = scheduler.submit('a', ['/dev/ttyUSB0'])
+    assert job.state == 'leased' and job.port == '/dev/ttyUSB0'
+    assert scheduler.leased == [job]
+
+
+def test_higher_priority_goes_first_then_first_come(scheduler):
+    scheduler.submit('running', ['p'])
+    scheduler.submit('low', ['p'], priority=0)
+    scheduler.submit('high', ['p'], priority=5)
+    scheduler.submit('low2', ['p'], priority=0)
+    assert scheduler.position('low2') == 2
+    order = []
+    for job_id in ('running', 'high', 'low'):
+        order.append(scheduler.release(job_id).job_id)
+    assert order == ['high', 'low', 'low2']
+
+
+def test_job_waiting_on_a_busy_port_does_not_hold_up_others(scheduler):
+    scheduler.submit('a', ['p1'])
+    scheduler.submit('b', ['p1'])
+    c = scheduler.submit('c', ['p1', 'p2'])
+    assert c.state == 'leased' and c.port == 'p2'
+
+
+def test_cancelled_jobs_are_skipped(scheduler):
+    scheduler.submit('a', ['p'])
+    scheduler.submit('b', ['p'])
+    scheduler.submit('c', ['p'])
+    assert scheduler.cancel('b').state == 'cancelled'
+    assert scheduler.release('a').job_id == 'c'
+    assert scheduler.status()['queue_depth'] == 0
+
+
+def test_wait_percentiles_use_the_nearest_rank(scheduler):
+    clock = scheduler.clock
+    scheduler.submit('a', ['p'])  # Waits 0 ms
+    scheduler.submit('b', ['p'])
+    clock.sleep(0.587)
+    scheduler.release('a')  # b waited 587 ms
+    waits = scheduler.status()['waits']
+    assert waits['count'] == 2
+    assert waits['p50_ms'] == 0.0
+    assert waits['p95_ms'] == 587.0
+    assert waits['max_ms'] == 587.0
+
+
+def test_utilization_counts_the_open_lease(scheduler):
+    clock = scheduler.clock
+    scheduler.submit('a', ['p'])
+    clock.sleep(1)
+    scheduler.release('a')
+    clock.sleep(1)
+    scheduler.submit('b', ['p'])
+    clock.sleep(2)
+    port = scheduler.status()['ports'][0]
+    assert port['leases'] == 2
+    assert port['busy_sec'] == 3.0
+    assert port['utilization'] == 0.75
+
+
+def test_close_cancels_queued_jobs(scheduler):
+    scheduler.submit('a', ['p'])
+    scheduler.submit('b', ['p'])
+    assert [job.job_id for job in scheduler.close()] == ['b']
+    assert scheduler.release('a') is None
+    with pytest.raises(RuntimeError):
+        scheduler.submit('c', ['p'])
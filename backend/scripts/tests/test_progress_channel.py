@@ -0,0 +1,50 @@
+import json
+import os
+
+from progress_channel import ProgressChannel
+from qtap_test import HardwareTester
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def test_records_go_to_the_fd_as_ndjson():
+    read_fd, write_fd = os.pipe()
+    channel = ProgressChannel(write_fd)
+    channel.emit({'cycle': 1})
+    channel.emit({'cycle': 2})
+    channel.close()
+    with os.fdopen(read_fd) as f:
+        records = [json.loads(line) for line in f]
+    assert records == [{'cycle': 1, 'seq': 1}, {'cycle': 2, 'seq': 2}]
+
+
+def test_interval_coalesces_and_close_sends_the_last_record():
+    sent = []
+    channel = ProgressChannel(interval=3600, send=sent.append)
+    for cycle in range(1, 6):
+        channel.emit({'cycle': cycle})
+    assert sent == [{'cycle': 1, 'seq': 1}]
+    channel.close()
+    assert sent[-1] == {'cycle': 5, 'seq': 5, 'coalesced': 3}
+
+
+def test_a_closed_reader_does_not_stop_the_run():
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    channel = ProgressChannel(write_fd)
+    channel.emit({'cycle': 1})  # EPIPE, records are dropped from here on
+    channel.emit({'cycle': 2})
+    channel.close()
+
+
+def test_tester_sends_one_record_per_cycle(reply_device):
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(b'0\r\n'), clock)
+    tester = HardwareTester(conn.port, conn.baudrate, 3, normalize_commands(['i:', 'r:']), 0.5, 'qtap_progress', 'test',
+                            serial_conn=conn, checkpoint_interval=0, clock=clock)
+    records = []
+    tester.progress_channel.send = records.append
+    tester.run()
+    assert [(r['seq'], r['cycle'], r['cycle_completed']) for r in records] == [(1, 1, True), (2, 2, True), (3, 3, True)]
+    assert records[-1]['latency_ms']['i:']['count'] == 3
@@ -0,0 +1,58 @@
+import itertools
+
+import pytest
+
+from qbq_test import HardwareTester as QBQTester
+from qtap_test import HardwareTester as QTapTester
+from replay import load_session, replay_session
+from serial_capture import TX, FailureCapture
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+class SequenceDevice:
+    # Answers with the given replies in turn, None stays silent
+    NAME = 'sequence'
+
+    def __init__(self, replies, latency=0.003):
+        self.replies = itertools.cycle(replies)
+        self.latency = latency
+
+    def handle(self, line, now=None):
+        return next(self.replies), self.latency
+
+
+def record(tester_class, device, commands, cycles, **options):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    tester = tester_class(conn.port, conn.baudrate, cycles, normalize_commands(commands), 0.5, 'recorded', 'test',
+                          serial_conn=conn, checkpoint_interval=0, clock=clock, record_session=True, **options)
+    tester.run()
+    return tester
+
+
+def test_replay_reproduces_the_recorded_counters():
+    tester = record(QTapTester, SequenceDevice([b'0\r\n', b'0\r\n', b'13\r\n', None, b'0\r\n', b'7\r\n']),
+                    ['i:', 'r:'], 6, feedback_timeouts={'i:': 0.2, 'r:': 0.2})
+    result = replay_session(tester.capture.path)
+    assert result['match'] is True
+    assert result['errors'] == tester.error and result['timeouts'] == tester.timeout > 0
+    assert result['port']['mismatched_writes'] == 0
+    assert result['port']['extra_writes'] == 0
+
+
+def test_replay_of_a_pipelined_run():
+    tester = record(QBQTester, SequenceDevice([b'0\r\n', b'50\r\n'], latency=0.01), ['#:', 'QR:abc:'], 4, window=2)
+    result = replay_session(tester.capture.path)
+    assert result['match'] is True
+    assert result['commands'] == 8
+
+
+def test_failure_captures_are_not_sessions():
+    capture = FailureCapture('failures.qcap', before=2, after=0, clock=VirtualClock())
+    capture.record(TX, b'i:\n')
+    capture.trigger(1, 'failed')
+    capture.close()
+    with pytest.raises(ValueError):
+        load_session('failures.qcap')
@@ -0,0 +1,68 @@
+import os
+import time
+
+import pytest
+
+from feedback_decoder import FeedbackDecoder
+from qtap_test import FEEDBACK_TABLE, HardwareTester
+from result_columns import COLUMNS, NO_CODE, NO_LATENCY, OUTCOME_CODES, ResultColumns, read_npz
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+GARBAGE = b'\xff' * 9  # Parses as an integer far outside int64
+
+
+def test_append_grows_in_chunks_and_round_trips(tmp_path):
+    columns = ResultColumns(chunk_rows=4)
+    for i in range(10):
+        columns.append(i + 1, i % 3, 1000 + i, 50 * i, i % 2, i % 3)
+    assert columns.rows == 10
+    assert len(columns.chunks[0]) == 3
+
+    path = str(tmp_path / 'columns.npz')
+    columns.write(path)
+    data = read_npz(path)
+    assert set(data) == {name for name, _ in COLUMNS}
+    assert list(data['cycle']) == list(range(1, 11))
+    assert list(data['latency_ns']) == [50 * i for i in range(10)]
+    assert not os.path.exists(path + '.tmp')
+
+
+def test_out_of_range_code_is_stored_as_no_code():
+    columns = ResultColumns()
+    columns.append(1, 0, 0, 0, int.from_bytes(GARBAGE, 'little'), 0)
+    columns.append(1, 1, 0, 0, -(2 ** 64), 0)
+    columns.append(1, 2, 0, 0, 2 ** 63 - 1, 0)
+    codes = columns.current[4]
+    assert list(codes[:3]) == [NO_CODE, NO_CODE, 2 ** 63 - 1]
+
+
+def test_garbage_reply_is_counted_once_and_recorded(reply_device):
+    assert FeedbackDecoder(FEEDBACK_TABLE).decode(GARBAGE).value > 2 ** 63
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(GARBAGE + b'\r\n'), clock)
+    tester = HardwareTester(conn.port, conn.baudrate, 3, normalize_commands(['i:', 'r:']), 0.0, 'qtap_garbage',
+                            'test', serial_conn=conn, columns_format='npz', checkpoint_interval=0, clock=clock)
+    tester.run()
+
+    assert tester.count == 3  # Stops each cycle at the first failed command
+    assert tester.error == 3
+    assert tester.timeout == 0
+    data = read_npz(tester.columns.path)
+    assert list(data['code']) == [NO_CODE] * 3
+    assert list(data['outcome']) == [OUTCOME_CODES['error']] * 3
+    assert all(latency != NO_LATENCY for latency in data['latency_ns'])
+
+
+
+def test_send_times_follow_the_run_clock(reply_device):
+    clock = VirtualClock(start=1e6)  # Far from the real perf_counter
+    conn = VirtualSerial(reply_device(b'0\r\n', latency=0.004), clock)
+    tester = HardwareTester(conn.port, conn.baudrate, 2, normalize_commands(['i:', 'r:']), 0.5, 'qtap_columns',
+                            'test', serial_conn=conn, columns_format='npz', checkpoint_interval=0, clock=clock)
+    tester.run()
+    sends = [int(t_send) for t_send in read_npz(tester.columns.path)['t_send_ns']]
+    gaps = [later - earlier for earlier, later in zip(sends, sends[1:])]
+    assert gaps == pytest.approx([504_000_000] * 3, abs=1000)  # Reply latency plus the command delay
+    assert sends[0] / 1e9 == pytest.approx(time.time(), abs=60)
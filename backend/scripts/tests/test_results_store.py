@@ -0,0 +1,65 @@
+import sqlite3
+import time
+
+import pytest
+
+from qtap_test import HardwareTester
+from results_store import connect, failure_rates
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def qtap_run(device, cycles, delay=0.5):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    tester = HardwareTester(conn.port, conn.baudrate, cycles, normalize_commands(['i:', 'r:']), delay, 'qtap_results',
+                            'test', serial_conn=conn, results_db='results.db', checkpoint_interval=0, clock=clock)
+    tester.run()
+    return tester
+
+
+def results(columns):
+    conn = sqlite3.connect('results.db')
+    try:
+        return conn.execute(f'SELECT {columns} FROM command_results ORDER BY rowid').fetchall()
+    finally:
+        conn.close()
+
+
+def test_rows_and_counters(reply_device):
+    tester = qtap_run(reply_device(b'0\r\n'), 3)
+    assert tester.results.summary()['rows'] == 6
+    rows = results('cycle, command_index, command, code, outcome')
+    assert rows[:2] == [(1, 0, 'i:', 0, 'success'), (1, 1, 'r:', 0, 'success')]
+    conn = connect('results.db')
+    try:
+        rates = failure_rates(conn, 'qtap_results')
+        assert rates['runs'][0]['commands'] == 6
+        assert [c['total'] for c in rates['commands']] == [3, 3]
+        assert failure_rates(conn, 'qtap_results', cycles=(2, 3))['commands'][0]['total'] == 2
+    finally:
+        conn.close()
+
+
+def test_t_send_follows_the_run_clock(reply_device):
+    qtap_run(reply_device(b'0\r\n', latency=0.004), 2, delay=0.5)
+    sends = [t_send for (t_send,) in results('t_send')]
+    gaps = [later - earlier for earlier, later in zip(sends, sends[1:])]
+    assert gaps == pytest.approx([0.504] * 3, abs=1e-6)  # Reply latency plus the command delay
+    assert sends[0] == pytest.approx(time.time(), abs=60)  # Epoch seconds, like completed_at
+
+
+def test_codes_outside_int64_are_stored_as_null(reply_device):
+    tester = qtap_run(reply_device(b'9' * 25 + b'\r\n'), 1)
+    assert tester.results.summary()['lost'] == 0
+    assert results('code, outcome') == [(None, 'error')]  # QTap stops the cycle at the first failure
+
+
+def test_schema_is_created_once():
+    connect('results.db').close()
+    connect('results.db').close()  # Already there the second time
+    conn = sqlite3.connect('results.db')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(command_results)')]
+    conn.close()
+    assert columns[columns.index('t_send') + 1] == 'completed_at'
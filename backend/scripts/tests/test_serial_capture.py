@@ -0,0 +1,84 @@
+import json
+
+from qtap_test import HardwareTester
+from serial_capture import MAX_FRAME_BYTES, RX, TX, FailureCapture, read_capture
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def qtap_run(device, cycles, **options):
+    clock = VirtualClock()
+    conn = VirtualSerial(device, clock)
+    tester = HardwareTester(conn.port, conn.baudrate, cycles, normalize_commands(['i:', 'r:']), 0.5, 'qtap_capture',
+                            'test', serial_conn=conn, checkpoint_interval=0, clock=clock, **options)
+    tester.run()
+    return tester
+
+
+def test_failure_window_holds_frames_before_and_after():
+    clock = VirtualClock()
+    capture = FailureCapture('window.qcap', before=4, after=2, clock=clock)
+    for n in range(10):
+        clock.sleep(0.001)
+        capture.record(TX, f'{n}'.encode())
+    capture.trigger(3, 'failed')
+    capture.record(RX, b'10')
+    assert capture.segments == 0  # Still waiting for the second frame after the failure
+    capture.record(RX, b'11')
+    capture.record(RX, b'12')  # Past the window
+    capture.close()
+
+    [segment] = read_capture('window.qcap')
+    assert (segment['cycle'], segment['reason']) == (3, 'failed')
+    assert [data for _, _, data in segment['frames']] == [b'6', b'7', b'8', b'9', b'10', b'11']
+    assert segment['frames'][-1][1] == 'RX'
+    times = [t_ns for t_ns, _, _ in segment['frames']]
+    assert times == sorted(times) and times[1] - times[0] == 1_000_000
+
+
+def test_overlapping_windows_never_repeat_frames():
+    capture = FailureCapture('overlap.qcap', before=4, after=4, clock=VirtualClock())
+    for n in range(6):
+        capture.record(TX, bytes([n]))
+    capture.trigger(1, 'first')
+    capture.record(TX, bytes([6]))
+    capture.trigger(2, 'second')  # Before the first window filled up
+    capture.record(TX, bytes([7]))
+    capture.close()
+    first, second = read_capture('overlap.qcap')
+    assert [data for _, _, data in first['frames']] == [bytes([n]) for n in range(2, 7)]
+    assert [data for _, _, data in second['frames']] == [bytes([7])]
+
+
+def test_long_frames_are_split():
+    capture = FailureCapture('long.qcap', before=2, after=0, clock=VirtualClock())
+    capture.record(RX, b'x' * (MAX_FRAME_BYTES + 10))
+    capture.trigger(1, 'long')
+    capture.close()
+    [segment] = read_capture('long.qcap')
+    assert [len(data) for _, _, data in segment['frames']] == [MAX_FRAME_BYTES, 10]
+
+
+def test_tester_writes_a_window_per_failing_cycle(reply_device):
+    tester = qtap_run(reply_device(b'7\r\n'), 3, capture_frames=8)
+    segments = read_capture(tester.capture.path)
+    assert [segment['cycle'] for segment in segments] == [1, 2, 3]
+    # The failing exchange, then the 2 frames after it (a quarter of 8), which are cycle 2's
+    assert [(direction, data) for _, direction, data in segments[0]['frames']] == [('TX', b'i:\n'), ('RX', b'7\r\n')] * 2
+    assert tester.capture.summary()['windows_written'] == 3
+
+
+def test_clean_run_writes_no_capture_file(reply_device):
+    tester = qtap_run(reply_device(b'0\r\n'), 3, capture_frames=8)
+    assert tester.capture.summary()['path'] is None
+
+
+def test_session_recording(reply_device):
+    tester = qtap_run(reply_device(b'0\r\n'), 2, record_session=True)
+    session, summary = read_capture(tester.capture.path)
+    info = json.loads(session['reason'])['session']
+    assert (info['hardware_type'], info['commands'], info['cycles']) == ('qtap', ['i:', 'r:'], 2)
+    assert [direction for _, direction, _ in session['frames']] == ['TX', 'RX'] * 4
+    assert json.loads(summary['reason'])['summary'] == {'commands': 4, 'errors': 0, 'timeouts': 0, 'cycles': 2,
+                                                        'failed_cycles': 0}
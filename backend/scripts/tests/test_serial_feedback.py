@@ -0,0 +1,52 @@
+import pytest
+
+from qbq_test import HardwareTester as QBQTester
+from serial_feedback import command_type, legacy_poll_latency, parse_feedback_timeouts, read_feedback
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+
+
+def test_command_type():
+    assert command_type('BR:123:\n') == 'BR:'
+    assert command_type('#:') == '#:'
+    assert command_type('e:s:c:e:4:') == 'e:'
+
+
+def test_parse_feedback_timeouts():
+    assert parse_feedback_timeouts(['#:=0.5', 'BR:=2']) == {'#:': 0.5, 'BR:': 2.0}
+    assert parse_feedback_timeouts(['e:s:c:=1']) == {'e:': 1.0}
+    assert parse_feedback_timeouts(None) == {}
+    for value in ('i:0.5', '=0.5'):
+        with pytest.raises(ValueError):
+            parse_feedback_timeouts([value])
+
+
+def test_help_example_sets_qbq_timeouts(reply_device):
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(None), clock)
+    tester = QBQTester(conn.port, conn.baudrate, 1, normalize_commands(['#:', 'BR:123:']), 0.0, 'qbq_timeouts',
+                       'test', feedback_timeouts=parse_feedback_timeouts(['#:=0.5', 'BR:=2']), serial_conn=conn,
+                       checkpoint_interval=0, clock=clock)
+    assert [command.feedback_timeout for command in tester.COMMAND_SET] == [0.5, 2.0]
+    tester.run()
+    assert clock.monotonic() == pytest.approx(2.5)  # Both commands waited out their own timeout
+
+
+def test_read_feedback_returns_as_soon_as_the_line_arrives(reply_device):
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(b'0\r\n', latency=0.004), clock)
+    conn.write(b'i:\n')
+    fb, elapsed, timed_out = read_feedback(conn, 2, clock=clock)
+    assert (fb, timed_out) == (b'0', False)
+    assert elapsed == pytest.approx(0.004)
+
+    fb, elapsed, timed_out = read_feedback(conn, 2, clock=clock)
+    assert (fb, timed_out) == (b'', True)
+    assert elapsed == pytest.approx(2)
+
+
+def test_legacy_poll_latency():
+    assert legacy_poll_latency(0.05, False) == pytest.approx(0.2)
+    assert legacy_poll_latency(0.25, False) == pytest.approx(0.3)
+    assert legacy_poll_latency(2.2, True) == pytest.approx(2.2)
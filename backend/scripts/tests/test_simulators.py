@@ -0,0 +1,70 @@
+import sys
+
+import pytest
+import serial
+
+from simulators import DEVICE_TYPES, ERROR_CODE, FaultInjector, LatencyModel, QBQDevice, QTapDevice, start_simulator
+from simulators.latency import parse_duration
+
+
+def test_parse_duration():
+    assert parse_duration('5') == pytest.approx(0.005)
+    assert parse_duration('5ms') == pytest.approx(0.005)
+    assert parse_duration('200us') == pytest.approx(0.0002)
+    assert parse_duration('1.5s') == pytest.approx(1.5)
+
+
+@pytest.mark.parametrize('spec, mean', [('fixed:5ms', 0.005), ('uniform:2ms:8ms', 0.005), ('exp:5ms', 0.005),
+                                        ('normal:5ms:1ms', 0.005)])
+def test_latency_models_sample_around_their_mean(spec, mean):
+    model = LatencyModel.parse(spec, seed=1)
+    assert model.mean() == pytest.approx(mean)
+    samples = [model.sample() for _ in range(4000)]
+    assert min(samples) >= 0
+    assert sum(samples) / len(samples) == pytest.approx(mean, rel=0.1)
+
+
+def test_invalid_latency_spec():
+    with pytest.raises(ValueError):
+        LatencyModel.parse('fixed:1:2')
+
+
+def test_devices_answer_their_own_commands():
+    device = QTapDevice()
+    assert device.handle(b'i:', now=0)[0] == b'0\r\n'
+    assert device.handle(b'BR:1:', now=1)[0] == str(ERROR_CODE).encode() + b'\r\n'
+    assert device.handle(b'', now=2) == (None, 0.0)  # QBA's doubled newline
+    assert QBQDevice(reply_success_code=True).handle(b'#:', now=0)[0] == b'48\r\n'
+    assert device.stats['rejected'] == 1
+
+
+def test_tags_are_echoed():
+    assert DEVICE_TYPES['qba']().handle(b'@7:p:1:b1:1:200:2:200:', now=0)[0] == b'@7:0\r\n'
+
+
+def test_busy_device_answers_with_its_timeout_code():
+    device = QBQDevice(latency=LatencyModel('fixed', (0.01,)), busy_time=0.02)
+    assert device.handle(b'#:', now=0)[0] == b'0\r\n'
+    assert device.handle(b'#:', now=0.02)[0] == b'50\r\n'  # Ready again at 0.03
+    assert device.handle(b'#:', now=0.03)[0] == b'0\r\n'
+
+
+def test_fault_rates():
+    injector = FaultInjector(timeout_rate=0.2, drop_rate=0.1, seed=5)
+    picks = [injector.pick() for _ in range(5000)]
+    assert picks.count('timeout') / 5000 == pytest.approx(0.2, abs=0.02)
+    assert picks.count('drop') / 5000 == pytest.approx(0.1, abs=0.02)
+    assert picks.count('error') == 0
+    with pytest.raises(ValueError):
+        FaultInjector(timeout_rate=0.6, error_rate=0.6)
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='pty simulators need Linux/macOS')
+def test_pty_simulator_serves_a_real_port():
+    simulator = start_simulator('qtap', 'fixed:1ms')
+    try:
+        with serial.Serial(simulator.path, 115200, timeout=1) as conn:
+            conn.write(b'i:\n')
+            assert conn.readline() == b'0\r\n'
+    finally:
+        simulator.stop()
@@ -0,0 +1,132 @@
+import io
+import json
+import sys
+import time
+
+import pytest
+
+import tester_daemon
+from simulators import start_simulator
+
+pytestmark = pytest.mark.skipif(sys.platform == 'win32', reason='pty simulators need Linux/macOS')
+
+
+@pytest.fixture
+def simulator():
+    simulator = start_simulator('qtap', 'fixed:1ms')
+    yield simulator
+    simulator.stop()
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    monkeypatch.setattr(tester_daemon, 'CONNECT_SETTLE_DELAY', 0)
+    daemon = tester_daemon.TesterDaemon()
+    daemon.events = []
+    monkeypatch.setattr(daemon, 'emit', daemon.events.append)
+    yield daemon
+    daemon.shutdown()
+
+
+def run_request(job, port, cycles=3, priority=0):
+    return {'op': 'run', 'job': job, 'priority': priority,
+            'instance': {'id': job, 'hardware_type': 'qtap', 'port': port, 'baud_rate': 115200, 'num_cycles': cycles,
+                         'commands': json.dumps(['i:', 'r:']), 'command_delay': 0.0, 'project_name': 'test'}}
+
+
+def events_of(daemon, event, job=None):
+    return [record for record in list(daemon.events)
+            if record['event'] == event and (job is None or record.get('job') == job)]
+
+
+def wait_finished(daemon, *jobs):
+    deadline = time.monotonic() + 10
+    while any(not events_of(daemon, 'finished', job) for job in jobs):
+        assert time.monotonic() < deadline, daemon.events
+        time.sleep(0.01)
+
+
+def test_job_runs_on_a_warm_port(daemon, simulator):
+    daemon.handle(run_request('qtap_1', simulator.path))
+    wait_finished(daemon, 'qtap_1')
+    kinds = [record['event'] for record in daemon.events]
+    assert kinds[:3] == ['accepted', 'leased', 'started'] and kinds[-1] == 'finished'
+    assert [record['cycle'] for record in events_of(daemon, 'progress')] == [1, 2, 3]
+    finished, = events_of(daemon, 'finished')
+    assert (finished['commands'], finished['errors'], finished['timeouts']) == (6, 0, 0)
+    conn = daemon.pool.ports[simulator.path]
+
+    daemon.handle(run_request('qtap_2', simulator.path))
+    wait_finished(daemon, 'qtap_2')
+    assert daemon.pool.ports[simulator.path] is conn and conn.is_open
+    status = daemon.status()
+    assert status['jobs'] == [] and status['ttfc']['count'] == 2
+    assert status['ports'] == [{'port': simulator.path, 'baud_rate': 115200, 'in_use': False}]
+
+
+def test_jobs_queue_for_a_busy_port_by_priority(daemon, simulator):
+    daemon.handle(run_request('first', simulator.path, cycles=50))
+    daemon.handle(run_request('low', simulator.path, priority=0))
+    daemon.handle(run_request('high', simulator.path, priority=5))
+    assert [record['job'] for record in events_of(daemon, 'queued')] == ['low', 'high']
+    wait_finished(daemon, 'first', 'low', 'high')
+    assert [record['job'] for record in events_of(daemon, 'leased')] == ['first', 'high', 'low']
+
+
+def test_stopping_a_queued_job_cancels_it(daemon, simulator):
+    daemon.handle(run_request('first', simulator.path, cycles=1000))
+    daemon.handle(run_request('second', simulator.path))
+    daemon.handle({'op': 'stop', 'job': 'second'})
+    cancelled, = events_of(daemon, 'finished', 'second')
+    assert cancelled['cancelled'] and cancelled['ttfc_ms'] is None
+    daemon.handle({'op': 'pause', 'job': 'nope'})
+    assert events_of(daemon, 'error')[-1]['error'] == 'No running job found'
+    daemon.handle({'op': 'stop', 'job': 'first'})
+    wait_finished(daemon, 'first')
+    stopped, = events_of(daemon, 'finished', 'first')
+    assert stopped['commands'] < 2000
+    assert not events_of(daemon, 'leased', 'second')
+
+
+def test_stop_right_after_the_lease_is_not_lost(daemon, simulator, monkeypatch):
+    redirect = daemon.redirect_console_logging
+
+    def stop_while_setting_up(logger):
+        daemon.stop_job('qtap_1')  # Arrives while run_job is still setting the tester up
+        redirect(logger)
+
+    monkeypatch.setattr(daemon, 'redirect_console_logging', stop_while_setting_up)
+    daemon.handle(run_request('qtap_1', simulator.path, cycles=1000))
+    wait_finished(daemon, 'qtap_1')
+    finished, = events_of(daemon, 'finished', 'qtap_1')
+    assert finished['commands'] == 0 and finished['ttfc_ms'] is None
+
+
+def test_stop_issued_with_the_run_request(daemon, simulator):
+    daemon.handle(run_request('qtap_1', simulator.path, cycles=1000))
+    daemon.handle({'op': 'stop', 'job': 'qtap_1'})
+    wait_finished(daemon, 'qtap_1')
+    finished, = events_of(daemon, 'finished', 'qtap_1')
+    assert finished['commands'] < 2000
+
+
+def test_invalid_run_requests_are_rejected(daemon, simulator):
+    bad_type = run_request('bad_type', simulator.path)
+    bad_type['instance']['hardware_type'] = 'qfoo'
+    no_port = run_request('no_port', None)
+    bad_priority = run_request('bad_priority', simulator.path, priority='high')
+    for request in ({'op': 'run'}, bad_type, no_port, bad_priority):
+        daemon.handle(request)
+    assert [record['event'] for record in daemon.events] == ['rejected'] * 4
+    daemon.handle({'op': 'explode'})
+    assert daemon.events[-1] == {'event': 'error', 'error': 'Unknown op: explode'}
+
+
+def test_serve_reads_requests_until_shutdown(daemon, simulator):
+    lines = [json.dumps(run_request('qtap_1', simulator.path)), '', 'not json', json.dumps({'op': 'shutdown'}),
+             json.dumps({'op': 'status'})]
+    daemon.serve(io.StringIO('\n'.join(lines) + '\n'))
+    kinds = [record['event'] for record in daemon.events]
+    assert kinds[0] == 'ready' and kinds[-1] == 'finished' and 'status' not in kinds
+    assert events_of(daemon, 'error')[0]['error'].startswith('Invalid JSON')
+    assert daemon.pool.ports == {}
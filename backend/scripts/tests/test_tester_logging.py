@@ -0,0 +1,81 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+from tester_logging import LOG_INDEX_SUFFIX, IndexedFileHandler, QueuedLogHandler, install_log_handlers
+
+
+def make_logger(name, targets, mode, **options):
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger, install_log_handlers(logger, targets, mode, **options)
+
+
+@pytest.mark.parametrize('mode', ['sync', 'async'])
+def test_index_points_at_each_cycle_start(mode):
+    target = IndexedFileHandler(f'{mode}.log', mode='w')
+    target.setFormatter(logging.Formatter('%(message)s'))
+    logger, handler = make_logger(f'indexed_{mode}', [target], mode)
+    for cycle in (1, 2, 3):
+        logger.info(f"Starting cycle {cycle}/3", extra={'cycle': cycle})
+        logger.info("Sending command: i:")
+    handler.close()
+
+    with open(f'{mode}.log', 'rb') as f:
+        content = f.read()
+    with open(f'{mode}.log' + LOG_INDEX_SUFFIX) as f:
+        index = [json.loads(line) for line in f]
+    assert [entry['cycle'] for entry in index] == [1, 2, 3]
+    for entry in index:
+        assert content[entry['offset']:].startswith(f"Starting cycle {entry['cycle']}/3".encode())
+    assert handler.records == 6
+
+
+def test_async_mode_writes_everything_in_order():
+    stream = io.StringIO()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter('%(message)s'))
+    logger, handler = make_logger('ordered', [target], 'async')
+    for n in range(1000):
+        logger.info(f"{n}")
+    handler.flush()
+    assert stream.getvalue().split() == [str(n) for n in range(1000)]
+    handler.close()
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+
+    def write(self, text):
+        self.released.wait()
+        return super().write(text)
+
+
+def test_drop_policy_drops_info_and_says_so():
+    stream = BlockingStream()
+    target = logging.StreamHandler(stream)
+    target.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    logger, handler = make_logger('dropping', [target], 'async', queue_size=2, overflow='drop')
+    for n in range(50):
+        logger.info(f"info {n}")  # Never blocks, the writer is stuck
+    assert handler.dropped > 0
+    stream.released.set()
+    logger.warning("kept")
+    handler.close()
+    lines = stream.getvalue().splitlines()
+    assert "WARNING kept" in lines
+    assert any(line.startswith("WARNING Log queue full, dropped") for line in lines)
+    assert len([line for line in lines if line.startswith('INFO')]) == 50 - handler.dropped
+
+
+def test_invalid_options():
+    with pytest.raises(ValueError):
+        install_log_handlers(logging.getLogger('invalid'), [], 'fast')
+    with pytest.raises(ValueError):
+        QueuedLogHandler([], overflow='spill')
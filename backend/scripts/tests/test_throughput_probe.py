@@ -0,0 +1,55 @@
+import json
+
+from simulators import virtual_simulator
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+from throughput_probe import ThroughputProbe, save_defaults
+
+
+def make_probe(busy_time=0.1, max_failure_rate=0.0):
+    # A QTap that needs 100 ms to recover after each reply: anything sent sooner times out
+    clock = VirtualClock()
+    conn = virtual_simulator('qtap', 'fixed:5ms', busy_time=busy_time, clock=clock)
+    return ThroughputProbe('qtap', conn, normalize_commands(['i:', 'r:']), 5, max_failure_rate, clock=clock)
+
+
+def test_bisect_finds_the_recovery_time():
+    probe = make_probe()
+    knee = probe.bisect(0.5, 0.01)
+    assert 0.1 <= knee <= 0.11
+    report = probe.report(knee)
+    assert report['knee']['passed'] and report['knee']['failure_rate'] == 0.0
+    assert report['first_failing_delay'] < 0.1
+    assert [step['delay'] for step in report['curve']] == sorted(step['delay'] for step in probe.steps)
+    assert report['knee']['commands_per_sec'] == round(10 / (10 * (knee + 0.005)), 3)
+
+
+def test_bisect_gives_up_when_the_slowest_delay_fails():
+    probe = make_probe(busy_time=1.0)
+    assert probe.bisect(0.5, 0.01) is None
+    assert len(probe.steps) == 1 and probe.report(None)['knee'] is None
+
+
+def test_measured_delays_are_not_repeated():
+    probe = make_probe()
+    step = probe.measure(0.2)
+    assert probe.measure(0.20001) is step and len(probe.steps) == 1
+
+
+def test_aimd_closes_in_from_above():
+    probe = make_probe()
+    knee = probe.aimd(0.5, 0.05, 3)
+    assert 0.1 <= knee < 0.15
+    assert sum(1 for step in probe.steps if not step['passed']) == 3
+
+
+def test_save_defaults_keeps_other_types(tmp_path):
+    path = str(tmp_path / 'probe_defaults.json')
+    with open(path, 'w') as f:
+        json.dump({'qbq': {'commandDelay': 2.0}}, f)
+    probe = make_probe()
+    saved = save_defaults(path, probe.report(probe.bisect(0.5, 0.01)), 1.2)
+    with open(path) as f:
+        defaults = json.load(f)
+    assert defaults['qbq'] == {'commandDelay': 2.0} and defaults['qtap'] == saved
+    assert saved['commandDelay'] == round(saved['kneeDelay'] * 1.2, 3)
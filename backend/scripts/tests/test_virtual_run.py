@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from simulators import VirtualSerial
+from tester_clock import VirtualClock
+from tester_registry import normalize_commands
+from virtual_run import virtual_run
+
+
+def test_clock_only_moves_when_waited_on():
+    clock = VirtualClock()
+    clock.sleep(0.5)
+    clock.sleep(-1)
+    clock.advance_to(100)  # In the past
+    assert clock.perf_counter_ns() == 500_000_000 and clock.slept_ns == 500_000_000
+    clock.advance_to(600_000_000)
+    assert clock.monotonic() == 0.6 and clock.slept_ns == 500_000_000
+
+
+def test_virtual_serial_times_replies_and_timeouts(reply_device):
+    clock = VirtualClock()
+    conn = VirtualSerial(reply_device(b'0\r\n', latency=0.25), clock, timeout=1)
+    conn.write(b'i:\nr:\n')  # The device answers one command at a time
+    assert conn.readline() == b'0\r\n' and clock.monotonic() == 0.25
+    assert conn.in_waiting == 0
+    assert conn.readline() == b'0\r\n' and clock.monotonic() == 0.5
+    assert conn.readline() == b'' and clock.monotonic() == 1.5
+
+
+def test_long_run_takes_simulated_time_only():
+    started = time.perf_counter()
+    tester, device, clock = virtual_run('qtap', 500, normalize_commands(['i:', 'r:']), 3.0, 'qtap_virtual', 'test',
+                                        latency='fixed:5ms', checkpoint_interval=0)
+    assert time.perf_counter() - started < 30
+    assert (tester.count, tester.error, tester.timeout) == (1000, 0, 0)
+    assert clock.monotonic() == pytest.approx(1000 * 3.005)
+    assert device.stats['ok'] == 1000
+
+
+def test_rate_pacing_follows_the_virtual_schedule():
+    tester, _, clock = virtual_run('qba', 50, normalize_commands(['p:1:b1:1:200:2:200:', 'p:1:b2:1:200:2:200:']),
+                                   3.0, 'qba_virtual', 'test', latency='fixed:5ms', rate=10, checkpoint_interval=0)
+    assert tester.count == 100
+    assert clock.monotonic() == pytest.approx(99 / 10 + 0.005, abs=1e-6)  # Last slot plus its reply
+
+
+def test_dropped_replies_cost_the_feedback_timeout():
+    tester, device, clock = virtual_run('qtap', 5, normalize_commands(['i:']), 0.0, 'qtap_drops', 'test',
+                                        fault_rates={'drop_rate': 1.0}, feedback_timeouts={'i:': 0.5},
+                                        checkpoint_interval=0)
+    assert (tester.count, tester.timeout) == (5, 5)
+    assert clock.monotonic() == pytest.approx(2.5)
@@ -0,0 +1,207 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import serial
+
+from latency_histogram import LatencyHistogram
+from tester_clock import SYSTEM_CLOCK
+from tester_logging import target_handlers
+from tester_registry import DEFAULT_COMMANDS, DEFAULT_DELAYS, TESTER_CLASSES, load_tester_class, normalize_commands
+
+PROBE_METHODS = ('bisect', 'aimd')
+PROBE_DEFAULTS_FILE = 'probe_defaults.json'  # Read by server.js on startup, next to hardware_tests.db
+
+
+class ThroughputProbe:
+    # Runs short batches of cycles with the real tester class at different
+    # command delays over one open port and finds the shortest delay whose
+    # failure rate (errors + timeouts per command) stays under the threshold.
+
+    def __init__(self, hardware_type, serial_conn, commands, cycles_per_step, max_failure_rate, settle=0.5,
+                 instance_id=None, clock=SYSTEM_CLOCK):
+        self.hardware_type = hardware_type
+        self.tester_class = load_tester_class(hardware_type)
+        self.serial_conn = serial_conn
+        self.commands = commands
+        self.cycles_per_step = cycles_per_step
+        self.max_failure_rate = max_failure_rate
+        self.settle = settle
+        self.instance_id = instance_id or f'{hardware_type}_probe'
+        self.clock = clock  # A VirtualClock, with a VirtualSerial on it, probes a simulated device in simulated time
+        self.steps = []  # One entry per batch, in the order they ran
+        self.results = {}  # delay -> step, so bisect never repeats a batch
+
+    def measure(self, delay):
+        delay = round(delay, 4)
+        if delay in self.results:
+            return self.results[delay]
+
+        self.clock.sleep(self.settle)  # Let the device drain anything left over from the last step
+        self.serial_conn.reset_input_buffer()
+        tester = self.tester_class(
+            self.serial_conn.port, self.serial_conn.baudrate, self.cycles_per_step, self.commands, delay,
+            self.instance_id, 'probe', serial_conn=self.serial_conn, checkpoint_interval=0, clock=self.clock
+        )
+        # The log file keeps every line; timeouts are expected while probing, so the console only gets errors
+        for handler in target_handlers(tester.logger):
+            if type(handler) is logging.StreamHandler:
+                handler.setLevel(logging.ERROR)
+        tester.progress_channel.send = lambda record: None
+
+        started = self.clock.perf_counter()
+        tester.run()
+        elapsed = self.clock.perf_counter() - started
+        tester.log_handler.close()
+
+        latency = LatencyHistogram()
+        for histogram in tester.latency.histograms.values():
+            latency.merge(histogram)
+        failures = tester.error + tester.timeout
+        step = {
+            'delay': delay,
+            'commands': tester.count,
+            'failures': failures,
+            'failure_rate': round(failures / tester.count, 6) if tester.count else 1.0,
+            'commands_per_sec': round(tester.count / elapsed, 3) if elapsed > 0 else 0.0,
+            'latency_ms': latency.summary()
+        }
+        step['passed'] = tester.count > 0 and step['failure_rate'] <= self.max_failure_rate
+        self.steps.append(step)
+        self.results[delay] = step
+        print(f"delay {delay:.4f}s: {step['commands_per_sec']} commands/sec, failure rate {step['failure_rate']}, "
+              f"p50 {step['latency_ms']['p50']} ms, p99 {step['latency_ms']['p99']} ms -> "
+              f"{'pass' if step['passed'] else 'FAIL'}", file=sys.stderr)
+        return step
+
+    def bisect(self, max_delay, resolution):
+        # Assumes a longer delay never does worse: keep `fast` failing and `slow` passing
+        if not self.measure(max_delay)['passed']:
+            return None
+        if self.measure(0.0)['passed']:
+            return 0.0
+        fast, slow = 0.0, max_delay
+        while slow - fast > resolution:
+            middle = (fast + slow) / 2
+            if self.measure(middle)['passed']:
+                slow = middle
+            else:
+                fast = middle
+        return round(slow, 4)
+
+    def aimd(self, max_delay, step, max_backoffs):
+        # Additive decrease of the delay while batches pass, doubling it back off
+        # after a failure; stops after max_backoffs failures or at zero delay
+        delay, best, backoffs = max_delay, None, 0
+        while backoffs < max_backoffs:
+            result = self.measure(delay)
+            if result['passed']:
+                best = result['delay'] if best is None else min(best, result['delay'])
+                if delay <= 0:
+                    break
+                delay = max(0.0, delay - step)
+            else:
+                backoffs += 1
+                delay = min(max_delay, max(delay * 2, step))
+                if best is not None and delay >= best:
+                    # Backed off onto a delay already known to pass, close in below it instead
+                    step /= 2
+                    delay = max(0.0, best - step)
+        return best
+
+    def report(self, knee):
+        curve = sorted(self.steps, key=lambda s: s['delay'])
+        failing = [s['delay'] for s in curve if not s['passed'] and knee is not None and s['delay'] < knee]
+        return {
+            'hardware_type': self.hardware_type,
+            'commands': [command.strip() for command in self.commands],
+            'cycles_per_step': self.cycles_per_step,
+            'max_failure_rate': self.max_failure_rate,
+            'knee_delay': knee,  # Shortest delay that stayed under the failure threshold
+            'first_failing_delay': max(failing) if failing else None,
+            'knee': self.results.get(knee) if knee is not None else None,
+            'curve': curve
+        }
+
+
+def save_defaults(path, report, margin):
+    # Recommended delay per hardware type for server.js to use instead of its built-in default
+    try:
+        with open(path) as f:
+            defaults = json.load(f)
+    except FileNotFoundError:
+        defaults = {}
+    defaults[report['hardware_type']] = {
+        'commandDelay': round(report['knee_delay'] * margin, 3),
+        'kneeDelay': report['knee_delay'],
+        'commandsPerSec': report['knee']['commands_per_sec'],
+        'maxFailureRate': report['max_failure_rate'],
+        'probedAt': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(path + '.tmp', 'w') as f:
+        json.dump(defaults, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return defaults[report['hardware_type']]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find the shortest sustainable command delay for a device')
+    parser.add_argument('--type', type=str, required=True, choices=sorted(TESTER_CLASSES), help='Hardware type')
+    parser.add_argument('--port', type=str, required=True, help='Serial port')
+    parser.add_argument('--baud', type=int, default=115200, help='Baud rate')
+    parser.add_argument('--commands', type=str, nargs='+', default=None,
+                        help='Commands to execute (default: the type\'s default command set)')
+    parser.add_argument('--method', type=str, default='bisect', choices=PROBE_METHODS,
+                        help='bisect between 0 and --max-delay, or AIMD down from --max-delay')
+    parser.add_argument('--cycles', type=int, default=50, help='Cycles per probed delay')
+    parser.add_argument('--max-failure-rate', type=float, default=0.01,
+                        help='Highest errors + timeouts per command a delay may have to count as sustainable')
+    parser.add_argument('--max-delay', type=float, default=None,
+                        help='Slowest delay to try (default: the backend\'s current default for the type)')
+    parser.add_argument('--resolution', type=float, default=0.01, help='bisect: stop when the bracket is this narrow')
+    parser.add_argument('--step', type=float, default=None, help='aimd: delay decrease per passing batch')
+    parser.add_argument('--max-backoffs', type=int, default=3, help='aimd: failures before stopping')
+    parser.add_argument('--settle', type=float, default=0.5, help='Seconds of idle between batches')
+    parser.add_argument('--margin', type=float, default=1.2, help='Safety factor applied to the knee for --save')
+    parser.add_argument('--output', type=str, default=None, help='Write the full report as JSON')
+    parser.add_argument('--save', action='store_true',
+                        help=f'Store knee x margin as the backend default delay in {PROBE_DEFAULTS_FILE}')
+
+    args = parser.parse_args()
+    max_delay = args.max_delay if args.max_delay is not None else DEFAULT_DELAYS[args.type]
+    commands = normalize_commands(args.commands or DEFAULT_COMMANDS[args.type])
+
+    try:
+        serial_conn = serial.Serial(args.port, args.baud, timeout=1)
+    except serial.SerialException as e:
+        sys.exit(f"Failed to connect to {args.port}: {e}")
+    try:
+        time.sleep(0.5)
+        probe = ThroughputProbe(args.type, serial_conn, commands, args.cycles, args.max_failure_rate, args.settle)
+        if args.method == 'aimd':
+            knee = probe.aimd(max_delay, args.step or max_delay / 10, args.max_backoffs)
+        else:
+            knee = probe.bisect(max_delay, args.resolution)
+    finally:
+        serial_conn.close()
+
+    report = probe.report(knee)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"\n{'delay':>8}  {'cmd/s':>9}  {'fail rate':>9}  {'p50 ms':>8}  {'p99 ms':>8}")
+    for step in report['curve']:
+        marker = '  <- knee' if step['delay'] == knee else ''
+        print(f"{step['delay']:>8.4f}  {step['commands_per_sec']:>9.3f}  {step['failure_rate']:>9.4f}  "
+              f"{step['latency_ms']['p50']:>8.3f}  {step['latency_ms']['p99']:>8.3f}{marker}")
+    if knee is None:
+        print(f"\nNo delay up to {max_delay}s kept the failure rate under {args.max_failure_rate}")
+        sys.exit(1)
+    print(f"\nShortest sustainable delay: {knee}s ({report['knee']['commands_per_sec']} commands/sec)")
+    if args.save:
+        saved = save_defaults(PROBE_DEFAULTS_FILE, report, args.margin)
+        print(f"Saved {saved['commandDelay']}s as the {args.type} default delay in {PROBE_DEFAULTS_FILE}")
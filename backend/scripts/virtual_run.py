@@ -0,0 +1,106 @@
+import argparse
+import json
+import logging
+import time
+
+from command_scheduler import target_rate
+from pipeline import MATCH_MODES
+from serial_feedback import parse_feedback_timeouts
+from simulators import DEVICE_TYPES, virtual_simulator
+from simulators.latency import parse_duration
+from tester_clock import VirtualClock
+from tester_logging import target_handlers
+from tester_registry import DEFAULT_COMMANDS, DEFAULT_DELAYS, load_tester_class, normalize_commands
+
+PIPELINED_TYPES = ('qba', 'qbq')  # Testers with --window/--match
+
+
+def virtual_run(hardware_type, cycles, commands, delay, instance_id, project_name, latency='fixed:5ms', seed=None,
+                reply_success_code=False, busy_time=0.0, fault_rates=None, **options):
+    # Runs a tester against a simulated device with both on one VirtualClock.
+    # Returns (tester, device, clock); the tester's counters, histograms and
+    # schedule stats come out as if the run had taken clock.monotonic() seconds.
+    clock = VirtualClock()
+    conn = virtual_simulator(hardware_type, latency, seed, reply_success_code, busy_time, clock,
+                             **(fault_rates or {}))
+    tester = load_tester_class(hardware_type)(conn.port, conn.baudrate, cycles, commands, delay, instance_id,
+                                              project_name, serial_conn=conn, clock=clock, **options)
+    # The log file keeps every line, the console only gets errors and no progress records
+    for handler in target_handlers(tester.logger):
+        if type(handler) is logging.StreamHandler:
+            handler.setLevel(logging.ERROR)
+    tester.progress_channel.send = lambda record: None
+    tester.run()
+    return tester, conn.device, clock
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a tester against a simulated device in virtual time')
+    parser.add_argument('--type', type=str, required=True, choices=sorted(DEVICE_TYPES), help='Hardware type')
+    parser.add_argument('--cycles', type=int, default=100, help='Number of test cycles')
+    parser.add_argument('--delay', type=float, default=None,
+                        help='Delay between commands in seconds (default: the backend\'s default for the type)')
+    parser.add_argument('--commands', type=str, nargs='+', default=None,
+                        help='Commands to execute (default: the type\'s default command set)')
+    parser.add_argument('--id', type=str, default=None, help='Instance ID for logging (default: <type>_virtual)')
+    parser.add_argument('--project', type=str, default='virtual', help='Project Name for logging')
+    parser.add_argument('--feedback-timeouts', type=str, nargs='+', default=[],
+                        help='Per command type feedback timeouts, e.g. i:=0.5 r:=2 for QTap or #:=0.5 BR:=2 for QBQ (not QBA)')
+    parser.add_argument('--window', type=int, default=None, help='Pipelined commands outstanding (QBA and QBQ)')
+    parser.add_argument('--match', type=str, default=None, choices=MATCH_MODES, help='Pipelined reply matching')
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument('--rate', type=float, default=None, help='Pace commands at this many commands/sec')
+    pacing.add_argument('--cycles-per-hour', type=float, default=None, help='Pace commands to this many cycles per hour')
+    parser.add_argument('--latency', type=str, default='fixed:5ms',
+                        help='Reply latency: fixed:5ms, uniform:2ms:8ms, normal:5ms:1ms, lognormal:5ms:0.5 or exp:5ms')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='Fraction of commands answered with the timeout code')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of commands answered with an error code')
+    parser.add_argument('--drop-rate', type=float, default=0.0, help='Fraction of commands never answered')
+    parser.add_argument('--garbage-rate', type=float, default=0.0, help='Fraction of commands answered with undecodable bytes')
+    parser.add_argument('--reply-success-code', action='store_true',
+                        help='Reply with the device success code (48 for QBQ/QSwipe) instead of 0')
+    parser.add_argument('--busy-time', type=str, default='0',
+                        help='Recovery time after each reply (e.g. 20ms), commands sent sooner get the timeout code')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for latency and faults')
+    parser.add_argument('--output', type=str, default=None, help='Write the summary as JSON')
+
+    args = parser.parse_args()
+    if (args.window is not None or args.match is not None) and args.type not in PIPELINED_TYPES:
+        parser.error(f"--window and --match need one of {', '.join(PIPELINED_TYPES)}")
+    if args.feedback_timeouts and args.type == 'qba':
+        parser.error("QBA has a single readline timeout, --feedback-timeouts doesn't apply")
+    commands = normalize_commands(args.commands or DEFAULT_COMMANDS[args.type])
+    options = {'rate': target_rate(args.rate, args.cycles_per_hour, len(commands)), 'checkpoint_interval': 0}
+    if args.feedback_timeouts:
+        options['feedback_timeouts'] = parse_feedback_timeouts(args.feedback_timeouts)
+    if args.window is not None:
+        options['window'] = args.window
+    if args.match is not None:
+        options['match_mode'] = args.match
+    fault_rates = {'timeout_rate': args.timeout_rate, 'error_rate': args.error_rate,
+                   'drop_rate': args.drop_rate, 'garbage_rate': args.garbage_rate}
+
+    started = time.perf_counter()
+    tester, device, clock = virtual_run(
+        args.type, args.cycles, commands, args.delay if args.delay is not None else DEFAULT_DELAYS[args.type],
+        args.id or f'{args.type}_virtual', args.project, args.latency, args.seed, args.reply_success_code,
+        parse_duration(args.busy_time), fault_rates, **options
+    )
+    elapsed = time.perf_counter() - started
+
+    summary = {
+        'hardware_type': args.type,
+        'commands': tester.count,
+        'errors': tester.error,
+        'timeouts': tester.timeout,
+        'simulated_sec': round(clock.monotonic(), 3),
+        'real_sec': round(elapsed, 3),
+        'speedup': round(clock.monotonic() / elapsed, 1) if elapsed > 0 else None,
+        'latency_ms': tester.latency.summary(),
+        'device': dict(device.stats)
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    print(f"{summary['commands']} commands, {summary['errors']} errors, {summary['timeouts']} timeouts: "
+          f"{summary['simulated_sec']} s simulated in {summary['real_sec']} s ({summary['speedup']}x)")
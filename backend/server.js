@@ -4,6 +4,7 @@ const sqlite3 = require('sqlite3').verbose();
 const path = require('path');
 const cors = require('cors');
 const fs = require('fs').promises;
+const { readFileSync } = require('fs');
 const { SerialPort } = require('serialport');
 
 
@@ -47,8 +48,30 @@ const defaultConfigs = {
     }
 };
 
+// Delays found by scripts/throughput_probe.py --save replace the built-in ones
+const PROBE_DEFAULTS_PATH = path.join(__dirname, 'probe_defaults.json');
+fs.readFile(PROBE_DEFAULTS_PATH, 'utf8').then((content) => {
+    const probed = JSON.parse(content);
+    for (const [hardwareType, result] of Object.entries(probed)) {
+        if (defaultConfigs[hardwareType] && result.commandDelay > 0) {
+            defaultConfigs[hardwareType].commandDelay = result.commandDelay;
+            console.log(`Using probed ${hardwareType} command delay ${result.commandDelay}s (knee ${result.kneeDelay}s, ${result.probedAt})`);
+        }
+    }
+}).catch((err) => {
+    if (err.code !== 'ENOENT') {
+        console.error(`Failed to read ${PROBE_DEFAULTS_PATH}:`, err.message);
+    }
+});
+
 // Initialize SQLite database
-const db = new sqlite3.Database('hardware_tests.db');
+const DB_PATH = 'hardware_tests.db';
+const db = new sqlite3.Database(DB_PATH);
+
+// Testers write one row per command into command_results (scripts/results_store.py)
+// in the same database; RECORD_RESULTS=0 turns it off
+const RECORD_RESULTS = process.env.RECORD_RESULTS !== '0';
+const RESULTS_SCHEMA = path.join(__dirname, 'scripts', 'results_schema.sql');
 
 // Create tables 
 db.serialize(() => {
@@ -81,6 +104,9 @@ db.serialize(() => {
         UNIQUE(name, hardware_type)
     )`);
 
+    // Per-command results, written by the testers: same file as scripts/results_store.py
+    db.exec(readFileSync(RESULTS_SCHEMA, 'utf8'));
+
     // Create a function to safely insert default command sets
     const insertDefaultCommandSet = (set) => {
         return new Promise((resolve, reject) => {
@@ -199,6 +225,19 @@ const getNextId = (hardwareType) => {
 // Store running processes
 const runningProcesses = new Map();
 
+// Instance (other than exceptId) whose running or queued test holds a serial port,
+// so two instances can't open the same COM5 or /dev/ttyUSB0 at once. Windows port
+// names aren't case sensitive.
+const samePort = (a, b) => process.platform === 'win32'
+    ? String(a).toUpperCase() === String(b).toUpperCase()
+    : a === b;
+const portHolder = (port, exceptId) => {
+    for (const [id, proc] of runningProcesses) {
+        if (id !== exceptId && samePort(proc.port, port)) return id;
+    }
+    return null;
+};
+
 // Helper function to get script path
 const getScriptPath = (hardwareType) => {
     const scriptMap = {
@@ -210,17 +249,174 @@ const getScriptPath = (hardwareType) => {
     return path.join(__dirname, 'scripts', scriptMap[hardwareType]);
 };
 
-// Add this new endpoint to list available ports
+// Optional long-lived Python tester service (scripts/tester_daemon.py). Set
+// USE_TESTER_DAEMON=1 to run tests in one warm process instead of spawning
+// python per run, which skips interpreter startup and reopening the serial port.
+const USE_TESTER_DAEMON = process.env.USE_TESTER_DAEMON === '1';
+const TTFC_HISTORY = 1000;
+const DAEMON_STATUS_TIMEOUT_MS = 2000;
+let testerDaemon = null;
+const ttfcHistory = [];
+const daemonStatusWaiters = [];
+
+// Progress records arrive as NDJSON. Spawned testers write them to their own pipe
+// (fd 3) so log lines on stdout can't corrupt them, except on Windows where extra
+// pipes aren't inherited as file descriptors and they share stdout with the logs.
+const USE_PROGRESS_FD = process.platform !== 'win32';
+const PROGRESS_FD = 3;
+const PROGRESS_INTERVAL = process.env.PROGRESS_INTERVAL || '0';  // Seconds, testers coalesce records in between
+const latestProgress = new Map();
+
+// CAPTURE_FRAMES=64 runs testers with --capture 64: no per-command log lines,
+// raw serial frames around each failure go to a .qcap file next to the log instead
+const CAPTURE_FRAMES = parseInt(process.env.CAPTURE_FRAMES || '0', 10);
+
+// Endurance runs checkpoint every CHECKPOINT_INTERVAL seconds, so { "resume": true }
+// can pick them up after a crash. Runs expected to finish within
+// CHECKPOINT_MIN_RUN_SEC (cycles x commands x delay) aren't worth the fsyncs.
+const CHECKPOINT_INTERVAL = parseInt(process.env.CHECKPOINT_INTERVAL || '60', 10);
+const CHECKPOINT_MIN_RUN_SEC = 10 * 60;
+const checkpointInterval = (instance, resume) => {
+    const expectedSec = instance.num_cycles * JSON.parse(instance.commands).length * instance.command_delay;
+    return resume || expectedSec >= CHECKPOINT_MIN_RUN_SEC ? CHECKPOINT_INTERVAL : 0;
+};
+const progressStats = { records: 0, parseErrors: 0 };
+
+// Splits a stream into lines, keeping partial lines until the rest arrives
+const lineReader = (onLine) => {
+    let pending = '';
+    return (data) => {
+        pending += data.toString();
+        const lines = pending.split('\n');
+        pending = lines.pop();
+        lines.filter(line => line.trim()).forEach(onLine);
+    };
+};
+
+const handleProgress = (id, progress) => {
+    progressStats.records++;
+    latestProgress.set(id, { ...progress, receivedAt: Date.now() });
+    if (progress.cycle_completed === false) {
+        console.log(`Instance ${id} cycle ${progress.cycle} failed:`, progress);
+    }
+};
+
+const markInstanceIdle = (id) => {
+    runningProcesses.delete(id);
+    db.run('UPDATE hardware_instances SET status = ? WHERE id = ?', ['idle', id]);
+};
+
+const handleDaemonEvent = (event) => {
+    const id = event.job;
+    switch (event.event) {
+        case 'progress':
+            handleProgress(id, event);
+            break;
+        case 'queued':
+            console.log(`Instance ${id} queued for ${event.ports.join(', ')}, ${event.position} job(s) ahead`);
+            break;
+        case 'leased':
+            // Queued runs only start when the daemon's scheduler gives them their port
+            db.run('UPDATE hardware_instances SET status = ? WHERE id = ?', ['running', id]);
+            console.log(`Instance ${id} got ${event.port} after waiting ${event.wait_ms} ms`);
+            break;
+        case 'status':
+            daemonStatusWaiters.splice(0).forEach(resolve => resolve(event));
+            break;
+        case 'started':
+            ttfcHistory.push(event.ttfc_ms);
+            if (ttfcHistory.length > TTFC_HISTORY) ttfcHistory.shift();
+            console.log(`Instance ${id} sent its first command after ${event.ttfc_ms} ms`);
+            break;
+        case 'finished':
+        case 'rejected':
+            console.log(`Daemon job ${id} ${event.event}:`, event);
+            if (id) markInstanceIdle(id);
+            break;
+        default:
+            console.log('Tester daemon:', event);
+    }
+};
+
+const getTesterDaemon = () => {
+    if (testerDaemon) return testerDaemon;
+
+    testerDaemon = spawn('python', [path.join(__dirname, 'scripts', 'tester_daemon.py')]);
+
+    testerDaemon.stdout.on('data', lineReader(line => {
+        try {
+            handleDaemonEvent(JSON.parse(line));
+        } catch {
+            console.log('Output from tester daemon:', line);
+        }
+    }));
+
+    // Tester log lines are written to stderr by the daemon
+    testerDaemon.stderr.on('data', (data) => {
+        console.log('Output from tester daemon:', data.toString());
+    });
+
+    testerDaemon.on('close', (code) => {
+        console.log(`Tester daemon exited with code ${code}`);
+        testerDaemon = null;
+        for (const [id, proc] of runningProcesses) {
+            if (proc.daemonJob) markInstanceIdle(id);
+        }
+    });
+
+    return testerDaemon;
+};
+
+const sendToDaemon = (request) => {
+    getTesterDaemon().stdin.write(JSON.stringify(request) + '\n');
+};
+
+// Running testers read control requests (scripts/control.py) as JSON lines on
+// stdin: stop, pause and resume, and set for live delay/command set changes.
+// Everything but stop takes effect at the tester's next cycle boundary.
+const STOP_GRACE_MS = 15000;  // After a graceful stop request, kill a tester that still hasn't exited
+
+const sendControl = (id, request) => {
+    const proc = runningProcesses.get(id);
+    if (proc.daemonJob) {
+        sendToDaemon({ ...request, job: id });
+    } else {
+        proc.stdin.write(JSON.stringify(request) + '\n');
+    }
+};
+
+// Device fingerprints by USB serial number, written by scripts/port_discovery.py
+const FINGERPRINTS_PATH = path.join(__dirname, 'port_fingerprints.json');
+const DISCOVERY_TIMEOUT_MS = 60000;
+
+const readFingerprints = async () => {
+    try {
+        return JSON.parse(await fs.readFile(FINGERPRINTS_PATH, 'utf8'));
+    } catch (err) {
+        if (err.code !== 'ENOENT') {
+            console.error(`Failed to read ${FINGERPRINTS_PATH}:`, err.message);
+        }
+        return {};
+    }
+};
+
+// Add this new endpoint to list available ports. Adapters that port discovery has
+// seen before come with the hardware type and baud rate of the device behind them.
 app.get('/api/serial-ports', async (req, res) => {
     try {
-        const ports = await SerialPort.list();
-        const formattedPorts = ports.map(port => ({
-            path: port.path,
-            manufacturer: port.manufacturer || 'Unknown',
-            serialNumber: port.serialNumber || 'N/A',
-            vendorId: port.vendorId || 'N/A',
-            productId: port.productId || 'N/A'
-        }));
+        const [ports, fingerprints] = await Promise.all([SerialPort.list(), readFingerprints()]);
+        const formattedPorts = ports.map(port => {
+            const fingerprint = port.serialNumber && fingerprints[port.serialNumber];
+            return {
+                path: port.path,
+                manufacturer: port.manufacturer || 'Unknown',
+                serialNumber: port.serialNumber || 'N/A',
+                vendorId: port.vendorId || 'N/A',
+                productId: port.productId || 'N/A',
+                hardwareType: fingerprint ? fingerprint.hardware_type : null,
+                baudRate: fingerprint ? fingerprint.baud_rate : null
+            };
+        });
         res.json(formattedPorts);
     } catch (error) {
         console.error('Error listing serial ports:', error);
@@ -228,6 +424,36 @@ app.get('/api/serial-ports', async (req, res) => {
     }
 });
 
+// Probe every serial port not running a test and report the hardware type and baud
+// rate of the device on it. Adapters already fingerprinted are answered from the
+// cache without opening the port; { "refresh": true } probes them again.
+app.post('/api/serial-ports/discover', (req, res) => {
+    const refresh = Boolean(req.body && req.body.refresh);
+    const busyPorts = [...runningProcesses.values()].map(proc => proc.port).filter(Boolean);
+    const discovery = spawn('python', [
+        path.join(__dirname, 'scripts', 'port_discovery.py'),
+        '--json',
+        '--cache', FINGERPRINTS_PATH,
+        ...(refresh ? ['--refresh'] : []),
+        ...(busyPorts.length > 0 ? ['--skip', ...busyPorts] : [])
+    ]);
+    let output = '';
+    let errors = '';
+    const timer = setTimeout(() => discovery.kill('SIGKILL'), DISCOVERY_TIMEOUT_MS);
+    discovery.stdout.on('data', (data) => { output += data.toString(); });
+    discovery.stderr.on('data', (data) => { errors += data.toString(); });
+    discovery.on('close', (code) => {
+        clearTimeout(timer);
+        try {
+            if (code !== 0) throw new Error(errors.trim() || `exited with code ${code}`);
+            res.json({ ports: JSON.parse(output), skipped: busyPorts });
+        } catch (err) {
+            console.error('Port discovery failed:', err.message);
+            res.status(500).json({ error: `Port discovery failed: ${err.message}` });
+        }
+    });
+});
+
 // Add new endpoint to check project name availability
 app.post('/api/instances/check-name', (req, res) => {
     const { name, hardwareType } = req.body;
@@ -328,9 +554,15 @@ app.put('/api/instances/:id', (req, res) => {
     stmt.finalize();
 });
 
-// Start hardware test
+// Start hardware test. { "resume": true } continues from the instance's last
+// checkpoint (logs/checkpoints) instead of starting again from cycle 1; only
+// endurance runs write them (checkpointInterval()).
+// { "sprt": { "p0": 0.01, "p1": 0.05, "alpha": 0.05, "beta": 0.05, "min_cycles": 100 } }
+// stops the run as soon as a sequential test passes or fails it
 app.post('/api/instances/:id/start', (req, res) => {
     const { id } = req.params;
+    const resume = Boolean(req.body && req.body.resume);
+    const sprt = req.body && req.body.sprt;
     
     db.get('SELECT * FROM hardware_instances WHERE id = ?', [id], (err, instance) => {
         if (err) {
@@ -349,6 +581,36 @@ app.post('/api/instances/:id/start', (req, res) => {
             return;
         }
         
+        // The tester daemon leases ports itself and queues runs whose port is busy,
+        // a spawned tester would fight the running one for the port
+        const holder = portHolder(instance.port, id);
+        if (holder && !USE_TESTER_DAEMON) {
+            res.status(409).json({ error: `Port ${instance.port} is in use by instance ${holder}` });
+            return;
+        }
+        
+        const checkpointSec = checkpointInterval(instance, resume);
+        if (USE_TESTER_DAEMON) {
+            const options = {
+                resume,
+                ...(checkpointSec > 0 ? { checkpoint_interval: checkpointSec } : {}),
+                ...(RECORD_RESULTS ? { results_db: DB_PATH } : {}),
+                ...(sprt ? { early_stop: sprt } : {}),
+                ...(CAPTURE_FRAMES > 0 ? { capture_frames: CAPTURE_FRAMES } : {})
+            };
+            // { "priority": 5 } runs ahead of lower priority runs queued for the same port
+            const priority = Number((req.body && req.body.priority) || 0);
+            sendToDaemon({ op: 'run', job: id, instance, options, priority });
+            runningProcesses.set(id, {
+                daemonJob: true,
+                port: instance.port,
+                kill: () => sendToDaemon({ op: 'stop', job: id })
+            });
+            db.run('UPDATE hardware_instances SET status = ? WHERE id = ?', [holder ? 'queued' : 'running', id]);
+            res.json({ message: holder ? `Test queued until ${instance.port} is free` : 'Test started successfully' });
+            return;
+        }
+        
         const scriptPath = getScriptPath(instance.hardware_type);
         const commands = JSON.parse(instance.commands);
         
@@ -360,31 +622,63 @@ app.post('/api/instances/:id/start', (req, res) => {
             '--delay', instance.command_delay.toString(),
             '--id', id,
             '--project', instance.project_name,
+            '--control-fd', '0',
+            '--progress-interval', PROGRESS_INTERVAL,
+            ...(USE_PROGRESS_FD ? ['--progress-fd', PROGRESS_FD.toString()] : []),
+            ...(RECORD_RESULTS ? ['--results-db', DB_PATH] : []),
+            ...(resume ? ['--resume'] : []),
+            ...(checkpointSec > 0 ? ['--checkpoint-interval', checkpointSec.toString()] : []),
+            ...(CAPTURE_FRAMES > 0 ? ['--capture', CAPTURE_FRAMES.toString()] : []),
+            ...(sprt ? [
+                '--sprt', String(sprt.p0), String(sprt.p1),
+                ...(sprt.alpha !== undefined ? ['--sprt-alpha', String(sprt.alpha)] : []),
+                ...(sprt.beta !== undefined ? ['--sprt-beta', String(sprt.beta)] : []),
+                ...(sprt.min_cycles !== undefined ? ['--sprt-min-cycles', String(sprt.min_cycles)] : [])
+            ] : []),
             '--commands', ...commands
-        ]);
+        ], { stdio: USE_PROGRESS_FD ? ['pipe', 'pipe', 'pipe', 'pipe'] : 'pipe' });
         
+        process.port = instance.port;
         runningProcesses.set(id, process);
         
         // Update status in database
         db.run('UPDATE hardware_instances SET status = ? WHERE id = ?', ['running', id]);
         
         // Handle process output
-        process.stdout.on('data', (data) => {
+        const parseProgress = (line) => {
             try {
-                // Try to parse as JSON for progress updates
-                const progress = JSON.parse(data);
-                // Here you would emit this to connected WebSocket clients
-                console.log(`Progress for ${id}:`, progress);
+                handleProgress(id, JSON.parse(line));
             } catch {
+                progressStats.parseErrors++;
+                console.error(`Unparseable progress record from ${id}:`, line);
+            }
+        };
+        if (USE_PROGRESS_FD) {
+            process.stdio[PROGRESS_FD].on('data', lineReader(parseProgress));
+            process.stdout.on('data', (data) => {
                 // Regular log output
                 console.log(`Output from ${id}:`, data.toString());
-            }
-        });
+            });
+        } else {
+            process.stdout.on('data', lineReader(line => {
+                if (line.startsWith('{')) {
+                    parseProgress(line);
+                } else {
+                    // Regular log output
+                    console.log(`Output from ${id}:`, line);
+                }
+            }));
+        }
         
         process.stderr.on('data', (data) => {
             console.error(`Error from ${id}:`, data.toString());
         });
         
+        // Control requests racing the tester's exit would otherwise crash the server with EPIPE
+        process.stdin.on('error', (err) => {
+            console.error(`Control channel to ${id} failed:`, err.message);
+        });
+        
         process.on('close', (code) => {
             console.log(`Process ${id} exited with code ${code}`);
             runningProcesses.delete(id);
@@ -406,18 +700,185 @@ app.post('/api/instances/:id/stop', (req, res) => {
         return;
     }
     
-    process.kill();
-    runningProcesses.delete(id);
+    // The tester finishes its current command, writes its summary and exits; the
+    // instance goes idle when it does (close handler / daemon 'finished' event)
+    sendControl(id, { op: 'stop' });
+    if (!process.daemonJob) {
+        setTimeout(() => {
+            if (process.exitCode === null && process.signalCode === null) {
+                console.error(`Instance ${id} did not stop within ${STOP_GRACE_MS} ms, killing it`);
+                process.kill('SIGKILL');
+            }
+        }, STOP_GRACE_MS);
+    }
+    res.json({ message: 'Test stopping' });
+});
+
+// Pause or resume a running test before its next cycle
+const controlEndpoint = (op) => (req, res) => {
+    const { id } = req.params;
+    if (!runningProcesses.has(id)) {
+        res.status(404).json({ error: 'No running process found for this instance' });
+        return;
+    }
+    sendControl(id, { op });
+    res.json({ message: `Test ${op} requested, applies at the next cycle boundary` });
+};
+app.post('/api/instances/:id/pause', controlEndpoint('pause'));
+app.post('/api/instances/:id/resume', controlEndpoint('resume'));
+
+// Change the command delay and/or command set of a running test from its next cycle,
+// without restarting it. Body: { commandDelay, commands }. The stored instance
+// config is updated too, so the next start uses the same values.
+app.post('/api/instances/:id/control', (req, res) => {
+    const { id } = req.params;
+    const { commandDelay, commands } = req.body || {};
+    if (!runningProcesses.has(id)) {
+        res.status(404).json({ error: 'No running process found for this instance' });
+        return;
+    }
+    if (commandDelay === undefined && commands === undefined) {
+        res.status(400).json({ error: 'Provide commandDelay and/or commands' });
+        return;
+    }
+    if (commandDelay !== undefined && !(Number(commandDelay) >= 0)) {
+        res.status(400).json({ error: 'commandDelay must be a number >= 0' });
+        return;
+    }
+    if (commands !== undefined && (!Array.isArray(commands) || commands.length === 0)) {
+        res.status(400).json({ error: 'commands must be a non-empty array' });
+        return;
+    }
     
-    db.run('UPDATE hardware_instances SET status = ? WHERE id = ?', ['idle', id], (err) => {
+    sendControl(id, {
+        op: 'set',
+        ...(commandDelay !== undefined ? { delay: Number(commandDelay) } : {}),
+        ...(commands !== undefined ? { commands } : {})
+    });
+    const updates = [];
+    const values = [];
+    if (commandDelay !== undefined) {
+        updates.push('command_delay = ?');
+        values.push(Number(commandDelay));
+    }
+    if (commands !== undefined) {
+        updates.push('commands = ?');
+        values.push(JSON.stringify(commands));
+    }
+    db.run(`UPDATE hardware_instances SET ${updates.join(', ')} WHERE id = ?`, [...values, id], (err) => {
         if (err) {
             res.status(500).json({ error: err.message });
             return;
         }
-        res.json({ message: 'Test stopped successfully' });
+        res.json({ message: 'Change requested, applies at the next cycle boundary' });
     });
 });
 
+// Time-to-first-command statistics for runs started through the tester daemon
+app.get('/api/daemon/stats', (req, res) => {
+    const sorted = [...ttfcHistory].sort((a, b) => a - b);
+    const ttfc = sorted.length === 0 ? null : {
+        count: sorted.length,
+        meanMs: sorted.reduce((sum, value) => sum + value, 0) / sorted.length,
+        p50Ms: sorted[Math.floor((sorted.length - 1) / 2)],
+        maxMs: sorted[sorted.length - 1],
+        recentMs: ttfcHistory.slice(-20)
+    };
+    res.json({ enabled: USE_TESTER_DAEMON, running: testerDaemon !== null, ttfc });
+});
+
+// Port scheduler metrics from the tester daemon: queue depth, queued and running
+// jobs, wait times and per-port utilization
+app.get('/api/daemon/scheduler', (req, res) => {
+    if (!testerDaemon) {
+        res.json({ enabled: USE_TESTER_DAEMON, running: false });
+        return;
+    }
+    const timer = setTimeout(() => {
+        const index = daemonStatusWaiters.indexOf(respond);
+        if (index >= 0) daemonStatusWaiters.splice(index, 1);
+        res.status(504).json({ error: 'Tester daemon did not answer' });
+    }, DAEMON_STATUS_TIMEOUT_MS);
+    const respond = (status) => {
+        clearTimeout(timer);
+        res.json({ enabled: USE_TESTER_DAEMON, running: true, jobs: status.jobs, ...status.scheduler });
+    };
+    daemonStatusWaiters.push(respond);
+    sendToDaemon({ op: 'status' });
+});
+
+// Latest progress record for a running (or recently finished) instance
+app.get('/api/instances/:id/progress', (req, res) => {
+    const progress = latestProgress.get(req.params.id);
+    if (!progress) {
+        res.status(404).json({ error: 'No progress received for this instance' });
+        return;
+    }
+    res.json(progress);
+});
+
+app.get('/api/progress/stats', (req, res) => {
+    res.json({ ...progressStats, progressFd: USE_PROGRESS_FD, instances: latestProgress.size });
+});
+
+// ?cycles=<from>-<to>, <from> alone, or <from>- for every cycle from <from> on;
+// null when malformed
+const parseCycleRange = (text) => {
+    const match = /^(\d+)(?:-(\d*))?$/.exec(String(text).trim());
+    if (!match) return null;
+    const from = Number(match[1]);
+    const to = match[2] === undefined ? from : match[2] === '' ? Number.MAX_SAFE_INTEGER : Number(match[2]);
+    return to >= from ? { from, to } : null;
+};
+
+// Failure rates per run and per command for ?run=<run_id> (default: latest run).
+// Whole-run figures come from the test_runs/command_totals counters; ?cycles=<from>-<to>
+// aggregates command_results over that range through the (instance_id, cycle) index
+app.get('/api/instances/:id/results', (req, res) => {
+    const { id } = req.params;
+    const rate = (failures, total) => total ? Number((failures / total).toFixed(6)) : 0;
+    const range = req.query.cycles !== undefined ? parseCycleRange(req.query.cycles) : null;
+    if (req.query.cycles !== undefined && !range) {
+        res.status(400).json({ error: `Invalid cycle range: ${req.query.cycles}` });
+        return;
+    }
+
+    db.all(
+        `SELECT run_id, started_at, finished_at, commands, successes, timeouts, errors
+         FROM test_runs WHERE instance_id = ? ORDER BY run_id`,
+        [id],
+        (err, runs) => {
+            if (err) {
+                res.status(500).json({ error: err.message });
+                return;
+            }
+            runs.forEach(run => { run.failure_rate = rate(run.timeouts + run.errors, run.commands); });
+
+            const runId = req.query.run !== undefined ? Number(req.query.run) :
+                (runs.length ? runs[runs.length - 1].run_id : null);
+            let query = `SELECT command_index AS "index", command, total, timeouts, errors
+                         FROM command_totals WHERE run_id = ? ORDER BY command_index`;
+            let params = [runId];
+            if (range) {
+                query = `SELECT command_index AS "index", command, COUNT(*) AS total,
+                                SUM(outcome = 'timeout') AS timeouts, SUM(outcome = 'error') AS errors
+                         FROM command_results WHERE instance_id = ? AND cycle BETWEEN ? AND ? AND run_id = ?
+                         GROUP BY command_index ORDER BY command_index`;
+                params = [id, range.from, range.to, runId];
+            }
+
+            db.all(query, params, (err, commands) => {
+                if (err) {
+                    res.status(500).json({ error: err.message });
+                    return;
+                }
+                commands.forEach(c => { c.failure_rate = rate(c.timeouts + c.errors, c.total); });
+                res.json({ instance: id, run_id: runId, runs, commands });
+            });
+        }
+    );
+});
+
 // Get all instances
 app.get('/api/instances', (req, res) => {
     db.all('SELECT * FROM hardware_instances', (err, rows) => {
@@ -466,6 +927,121 @@ app.delete('/api/instances/:id', (req, res) => {
     });
 });
 
+// Log slices. Testers keep a sidecar index (<log>.idx) with one JSON line
+// {"cycle": N, "offset": <byte offset>} per cycle start, so live viewers can poll
+// with ?since=<next_offset> and only pay for new bytes.
+const LOG_SLICE_LIMIT = 1024 * 1024;
+const LOG_INDEX_SUFFIX = '.idx';
+
+const readLogBytes = async (logPath, start, end) => {
+    const handle = await fs.open(logPath, 'r');
+    try {
+        const buffer = Buffer.alloc(Math.max(0, end - start));
+        const { bytesRead } = await handle.read(buffer, 0, buffer.length, start);
+        return buffer.subarray(0, bytesRead);
+    } finally {
+        await handle.close();
+    }
+};
+
+// Offset just past the first newline at or after `from`, or null if the log ends first
+const findLineEnd = async (logPath, from, size) => {
+    const handle = await fs.open(logPath, 'r');
+    try {
+        const buffer = Buffer.alloc(64 * 1024);
+        let position = from;
+        while (position < size) {
+            const { bytesRead } = await handle.read(buffer, 0, Math.min(buffer.length, size - position), position);
+            if (bytesRead === 0) break;
+            const newline = buffer.subarray(0, bytesRead).indexOf(0x0a);
+            if (newline !== -1) return position + newline + 1;
+            position += bytesRead;
+        }
+        return null;
+    } finally {
+        await handle.close();
+    }
+};
+
+const readCycleOffsets = async (logPath) => {
+    const offsets = new Map();
+    let content;
+    try {
+        content = await fs.readFile(logPath + LOG_INDEX_SUFFIX, 'utf8');
+    } catch {
+        return offsets;  // No index (older log or pipelined run without cycle markers)
+    }
+    content.split('\n').forEach(line => {
+        if (!line.trim()) return;
+        try {
+            const entry = JSON.parse(line);
+            offsets.set(entry.cycle, entry.offset);  // Later runs appended to the same log win
+        } catch {
+            // Partially written last line
+        }
+    });
+    return offsets;
+};
+
+const readLogSlice = async (logPath, query) => {
+    const { size } = await fs.stat(logPath);
+    const limit = Math.min(parseInt(query.limit, 10) || LOG_SLICE_LIMIT, LOG_SLICE_LIMIT);
+    let start;
+    let end = size;
+    let reset = false;
+
+    if (query.cycles !== undefined) {
+        const { from, to } = parseCycleRange(query.cycles);
+        const offsets = await readCycleOffsets(logPath);
+        if (!offsets.has(from)) {
+            return { size, start: size, next_offset: size, reset, content: '', error: `Cycle ${from} not found in log index` };
+        }
+        start = offsets.get(from);
+        // The slice ends where the first indexed cycle after `to` starts
+        for (const [cycle, offset] of offsets) {
+            if (cycle > to && offset > start) end = Math.min(end, offset);
+        }
+    } else if (query.since !== undefined) {
+        start = parseInt(query.since, 10) || 0;
+        if (start > size) {
+            // Log was truncated or replaced, start over
+            start = 0;
+            reset = true;
+        }
+    } else {
+        start = Math.max(0, size - (parseInt(query.tail, 10) || LOG_SLICE_LIMIT));
+    }
+
+    end = Math.min(end, start + limit);
+    let bytes = await readLogBytes(logPath, start, end);
+    // Only hand out whole lines so the next ?since= never splits one
+    if (query.tail !== undefined && query.since === undefined && query.cycles === undefined && start > 0) {
+        const firstNewline = bytes.indexOf(0x0a);
+        start += firstNewline + 1;
+        bytes = bytes.subarray(firstNewline + 1);
+    }
+    const lastNewline = bytes.lastIndexOf(0x0a);
+    let nextOffset = start + lastNewline + 1;
+    let truncated = false;
+    if (lastNewline === -1 && bytes.length === limit) {
+        // One line longer than the limit: send its first `limit` bytes and skip
+        // the rest, or nothing yet if it's still being written
+        const lineEnd = await findLineEnd(logPath, start + bytes.length, size);
+        truncated = lineEnd !== null;
+        nextOffset = truncated ? lineEnd : start;
+    }
+    if (!truncated) bytes = bytes.subarray(0, lastNewline + 1);
+
+    return {
+        size,
+        start,
+        next_offset: nextOffset,
+        reset,
+        truncated,
+        content: bytes.toString('utf8')
+    };
+};
+
 // for displaying logs 
 app.get('/api/logs/:date/:instanceId', async (req, res) => {
     try {
@@ -488,6 +1064,14 @@ app.get('/api/logs/:date/:instanceId', async (req, res) => {
         console.log(`Attempting to read log file at: ${logPath}`);
         
         try {
+          // ?since=<offset>, ?tail=<bytes> and ?cycles=<from>-<to> return a JSON slice,
+          // no query keeps the old behaviour of sending the whole file
+          if (req.query.since !== undefined || req.query.tail !== undefined || req.query.cycles !== undefined) {
+            if (req.query.cycles !== undefined && !parseCycleRange(req.query.cycles)) {
+              return res.status(400).json({ error: `Invalid cycle range: ${req.query.cycles}` });
+            }
+            return res.json(await readLogSlice(logPath, req.query));
+          }
           const content = await fs.readFile(logPath, 'utf8');
           res.send(content);
         } catch (readError) {
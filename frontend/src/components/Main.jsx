@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Button,
@@ -32,23 +32,43 @@ import HardwareConfig from './HardwareConfig';
 const API_BASE_URL = 'http://localhost:3001/api';
 
 // Log Reader Component
+const LOG_TAIL_BYTES = 256 * 1024;  // How much of an existing log to show when the reader opens
+const LOG_VIEW_LIMIT = 2 * 1024 * 1024;  // Characters kept on screen, older output is trimmed
+
 const LogReader = ({ instanceId, isRunning }) => {
   const [logContent, setLogContent] = useState('');
+  const nextOffset = useRef(null);
+  const inFlight = useRef(false);
 
   useEffect(() => {
+    nextOffset.current = null;
+
     const fetchLogs = async () => {
+      if (inFlight.current) return;  // A slow poll must finish before the next offset is known
+      inFlight.current = true;
       try {
         const currentDate = new Date().toISOString().split('T')[0];
-        const response = await fetch(`${API_BASE_URL}/logs/${currentDate}/${instanceId}`);
+        // First poll fetches the tail of the log, later polls only the bytes written since
+        const query = nextOffset.current === null ? `tail=${LOG_TAIL_BYTES}` : `since=${nextOffset.current}`;
+        const response = await fetch(`${API_BASE_URL}/logs/${currentDate}/${instanceId}?${query}`);
         if (response.ok) {
-          const text = await response.text();
-          setLogContent(text);
+          const slice = await response.json();
+          const fresh = nextOffset.current === null || slice.reset;
+          nextOffset.current = slice.next_offset;
+          if (fresh) {
+            setLogContent(slice.content);
+          } else if (slice.content) {
+            setLogContent(prev => (prev + slice.content).slice(-LOG_VIEW_LIMIT));
+          }
         } else {
+          nextOffset.current = null;
           setLogContent(`No log file for this instance.`);
         }
       } catch (error) {
         console.error('Error fetching logs:', error);
         setLogContent('Error: Unable to fetch logs.');
+      } finally {
+        inFlight.current = false;
       }
     };
 